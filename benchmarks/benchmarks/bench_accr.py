@@ -0,0 +1,64 @@
+"""
+    This benchmark is intended to measure the computation of the
+    Cramer-Rao lower bounds of state space models (crlbss) with many
+    parameters and of batches of high order ARMA models (crlbarma).
+"""
+# Imports
+import numpy as np
+try:
+    from pysid.identification.accr import crlbarma, crlbss
+except ImportError:
+    pass
+
+
+def random_ss(n, p, nt):
+    sym = lambda X: X @ X.T
+    F = np.random.randn(n, n)
+    F = 0.8*F/max(abs(np.linalg.eigvals(F)))
+    C = np.random.randn(p, n)
+    der = lambda shape, f=lambda X: X: [f(np.random.randn(*shape)) for i in range(nt)]
+    return (F, C, sym(np.random.randn(n, n)) + np.eye(n), sym(np.random.randn(p, p)) + np.eye(p),
+            0.1*np.random.randn(n, p), nt, der((n, n)), der((p, n)), der((n, n), sym),
+            der((p, p), sym), der((n, p)))
+
+
+def random_poly(n):
+    # Stable polynomial of order 2n
+    r = 0.9*np.random.rand(n)*np.exp(2j*np.pi*np.random.rand(n))
+    return np.real(np.poly(np.r_[r, r.conj()]))
+
+
+class CRLBSS:
+    params = [
+    [4, 8],
+    [10, 60]
+    ]
+
+    param_names = ['n', 'nt']
+
+    def setup(self, n, nt):
+        np.random.seed(0)
+        self.args = random_ss(n, 2, nt)
+
+    def time_crlbss(self, n, nt):
+        crlbss(*self.args)
+
+    def peakmem_crlbss(self, n, nt):
+        crlbss(*self.args)
+
+
+class CRLBARMA:
+    params = [
+    [2, 20],
+    [1, 100]
+    ]
+
+    param_names = ['n', 'models']
+
+    def setup(self, n, nb):
+        np.random.seed(0)
+        self.A = np.array([random_poly(n) for i in range(nb)])
+        self.C = np.array([random_poly(n) for i in range(nb)])
+
+    def time_crlbarma(self, n, nb):
+        crlbarma(self.A, self.C)
@@ -9,6 +9,7 @@ try:
     from pysid import arx
 except ImportError:
     pass
+from .common import mimo_data
     
 
 # Define the class to be tested
@@ -27,10 +28,8 @@ class Arx:
     # Setting for the benchmark
     def setup(self, na, nb, nk, N):
         
-        # Complex number
-        j = np.complex(0, 1)
         # Sample System
-        A = np.poly([0.88, 0.99, 0.6 + 0.5*j, 0.6 - 0.5*j, 0.77, 0.87])
+        A = np.poly([0.88, 0.99, 0.6 + 0.5j, 0.6 - 0.5j, 0.77, 0.87])
         B = np.poly([0.4, 0.66, 0.65, 0.44, 0.52])
         # Generate the input 
         self.u = np.random.randn(N, 1)
@@ -39,9 +38,29 @@ class Arx:
         
         
     def time_arx_siso(self, na, nb, nk, N):
-        A, B = arx(na, nb, nk, self.u, self.y)
-    #def time_arx_simo(self):
+        arx(na, nb, nk, self.u, self.y)
 
-    #def time_arx_miso(self):
 
-    #def time_arx_mimo(self):
+class ArxMIMO:
+    params = [
+    ['simo', 'miso', 'mimo'],
+    [100, 1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['system', 'N']
+
+    timeout = 600
+
+    def setup(self, system, N):
+        ny, nu = {'simo': (2, 1), 'miso': (1, 2), 'mimo': (2, 2)}[system]
+        self.u, self.y = mimo_data(N, ny, nu)
+        # Second order diagonal A, second order B and unit delays
+        self.na = 2*np.eye(ny, dtype=int)
+        self.nb = 2*np.ones((ny, nu), dtype=int)
+        self.nk = np.ones((ny, nu), dtype=int)
+
+    def time_arx(self, system, N):
+        arx(self.na, self.nb, self.nk, self.u, self.y)
+
+    def peakmem_arx(self, system, N):
+        arx(self.na, self.nb, self.nk, self.u, self.y)
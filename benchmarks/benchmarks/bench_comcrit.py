@@ -0,0 +1,31 @@
+"""
+    This benchmark is intended to measure the time and the peak memory of
+    the ARX order selection by information criteria (aicarx), from 1e2 to
+    1e6 samples.
+"""
+# Imports
+try:
+    from pysid.identification.comcrit import aicarx
+except ImportError:
+    pass
+from .common import siso_data
+
+
+class AICARX:
+    params = [
+    ['aic', 'aicn', 'aicc'],
+    [100, 1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['criterion', 'N']
+
+    timeout = 600
+
+    def setup(self, criterion, N):
+        self.u, self.y = siso_data(N)
+
+    def time_aicarx(self, criterion, N):
+        aicarx(3, 2, 2, self.u, self.y, criterion)
+
+    def peakmem_aicarx(self, criterion, N):
+        aicarx(3, 2, 2, self.u, self.y, criterion)
@@ -0,0 +1,57 @@
+"""
+    This benchmark is intended to measure the sample based correlations
+    (smpl_acorr and smpl_ccorr), from 1e2 to 1e6 samples, and the
+    theoretical correlations of ARMA processes (arma_acorr and arma_ccorr).
+"""
+# Imports
+import numpy as np
+from scipy.signal import lfilter
+try:
+    from pysid.correlation import arma_acorr, arma_ccorr, smpl_acorr, smpl_ccorr
+except ImportError:
+    pass
+
+
+class SampleCorrelation:
+    params = [
+    [10, 100],
+    [100, 1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['maxlag', 'N']
+
+    timeout = 600
+
+    def setup(self, maxlag, N):
+        if N <= maxlag:
+            raise NotImplementedError
+        np.random.seed(0)
+        self.w = np.random.randn(N)
+        self.y = lfilter([1, 0.4], [1, -0.6], self.w)
+
+    def time_smpl_acorr(self, maxlag, N):
+        smpl_acorr(self.y, maxlag)
+
+    def time_smpl_ccorr(self, maxlag, N):
+        smpl_ccorr(self.y, self.w, maxlag)
+
+    def peakmem_smpl_ccorr(self, maxlag, N):
+        smpl_ccorr(self.y, self.w, maxlag)
+
+
+class ARMACorrelation:
+    params = [10, 100, 1000]
+    param_names = ['maxlag']
+
+    def setup(self, maxlag):
+        # Polynomials in q
+        self.A = np.array([1, -1.2, 0.5])
+        self.C = np.array([1, 0.4, 0])
+        self.D = np.array([1, -0.6, 0])
+        self.B = np.array([0, 1, 0.3])
+
+    def time_arma_acorr(self, maxlag):
+        arma_acorr(self.C, self.A, 1, maxlag)
+
+    def time_arma_ccorr(self, maxlag):
+        arma_ccorr(self.B, self.A, self.D, self.C, 1, maxlag)
@@ -0,0 +1,52 @@
+"""
+    This benchmark is intended to measure the evaluation of the frequency
+    response of MIMO polynomial models on dense frequency grids.
+"""
+# Imports
+import numpy as np
+try:
+    from pysid.identification.models import polymodel
+except ImportError:
+    pass
+
+
+def random_model(ny, nu, n):
+    def polys(shape, lead):
+        P = np.empty(shape, dtype=object)
+        for i in np.ndindex(shape):
+            P[i] = np.append([lead(i)], 0.5*np.random.rand(n)/n)
+        return P
+    A = polys((ny, ny), lambda i: float(i[0] == i[1]))
+    B = polys((ny, nu), lambda i: 0.)
+    C = polys((ny, 1), lambda i: 1.)
+    D = polys((ny, 1), lambda i: 1.)
+    F = polys((ny, nu), lambda i: 1.)
+    return polymodel('pem', A, B, C, D, F, np.ones((ny, nu)), 0, None, nu, ny, 1)
+
+
+class FreqResp:
+    params = [
+    [1, 4, 8],
+    [512, 4096]
+    ]
+
+    param_names = ['ny', 'nw']
+
+    def setup(self, ny, nw):
+        np.random.seed(0)
+        self.m = random_model(ny, ny, 4)
+        self.w = np.linspace(0, np.pi, nw)
+
+    def time_freqresp_uniform(self, ny, nw):
+        self.m.freqresp(nw=nw)
+
+    def time_freqresp_grid(self, ny, nw):
+        self.m.freqresp(self.w)
+
+    def time_polyval_loop(self, ny, nw):
+        # Entry by entry evaluation, for reference
+        z = np.exp(-1j*self.w)
+        m = self.m
+        for P in m:
+            for p in P.flat:
+                np.polyval(p[::-1], z)
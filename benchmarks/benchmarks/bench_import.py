@@ -0,0 +1,31 @@
+"""
+    This benchmark is intended to measure the import time of pysid and of
+    its subpackages. Each measurement is done in a fresh interpreter.
+"""
+
+
+class Import:
+    timeout = 120
+
+    def timeraw_import_pysid(self):
+        return "import pysid"
+
+    def timeraw_import_identification(self):
+        return "import pysid.identification"
+
+    def timeraw_import_io(self):
+        return "import pysid.io"
+
+    def timeraw_import_correlation(self):
+        return "import pysid.correlation"
+
+    def timeraw_first_arx(self):
+        # Import and fit a small model, as done by short-lived workers
+        return """
+        from pysid import arx
+        arx(2, 1, 1, u, y)
+        """, """
+        from numpy.random import randn
+        u = randn(200, 1)
+        y = randn(200, 1)
+        """
@@ -0,0 +1,80 @@
+"""
+    This benchmark is intended to measure the throughput of the csv readers
+    and writers of pysid.io on large files.
+"""
+# Imports
+import os
+import tempfile
+import numpy as np
+try:
+    from pysid.io.csv_data import load_data, load_chunks, save_data, csvwriter
+except ImportError:
+    pass
+
+
+class CsvIO:
+    params = [
+    [100000, 1000000, 10000000],
+    [10000, 100000]
+    ]
+
+    param_names = ['N', 'chunksize']
+
+    timeout = 1200
+
+    # Files are created once for all the benchmarks
+    def setup_cache(self):
+        path = tempfile.mkdtemp()
+        for N in self.params[0]:
+            with csvwriter(os.path.join(path, 'data_{}.csv'.format(N)), fmt='%.8g') as w:
+                for k in range(0, N, 1000000):
+                    w.write(np.random.randn(min(1000000, N - k), 2))
+        return path
+
+    def setup(self, path, N, chunksize):
+        self.filename = os.path.join(path, 'data_{}.csv'.format(N))
+        self.out = os.path.join(path, 'out_{}.csv'.format(N))
+        self.data = np.random.randn(min(N, 1000000), 2)
+
+    def time_load_chunks(self, path, N, chunksize):
+        for u, y in load_chunks(self.filename, 1, chunksize):
+            pass
+
+    def track_load_chunks_throughput(self, path, N, chunksize):
+        import time
+        t = time.perf_counter()
+        for u, y in load_chunks(self.filename, 1, chunksize):
+            pass
+        return N/(time.perf_counter() - t)
+    track_load_chunks_throughput.unit = 'rows/s'
+
+    def peakmem_load_chunks(self, path, N, chunksize):
+        for u, y in load_chunks(self.filename, 1, chunksize):
+            pass
+
+    def time_csvwriter(self, path, N, chunksize):
+        with csvwriter(self.out, fmt='%.8g') as w:
+            for k in range(0, N, chunksize):
+                w.write(self.data[0:min(chunksize, N - k)])
+
+
+class CsvLoadData:
+    params = [100000, 1000000]
+    param_names = ['N']
+
+    timeout = 600
+
+    def setup(self, N):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'data.csv')
+        self.data = np.random.randn(N, 2)
+        save_data(self.data, self.filename)
+
+    def time_load_data(self, N):
+        load_data(self.filename)
+
+    def peakmem_load_data(self, N):
+        load_data(self.filename)
+
+    def time_save_data(self, N):
+        save_data(self.data, os.path.join(self.path, 'out.csv'))
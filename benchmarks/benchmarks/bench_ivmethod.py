@@ -0,0 +1,42 @@
+"""
+    This benchmark is intended to measure the time and the peak memory of
+    the instrumental variables methods (iv and riv), from 1e2 to 1e6
+    samples.
+"""
+# Imports
+import numpy as np
+from scipy.signal import lfilter
+try:
+    from pysid.identification.ivmethod import iv, riv
+except ImportError:
+    pass
+
+
+class InstrumentalVariables:
+    params = [
+    ['iv', 'riv'],
+    [100, 1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['method', 'N']
+
+    timeout = 600
+
+    def setup(self, method, N):
+        np.random.seed(0)
+        self.u = np.random.randn(N, 1)
+        # Noise free output, used as the instrument of iv
+        self.x = lfilter([0, 0.5, 0.3], [1, -1.2, 0.5], self.u, axis=0)
+        self.y = self.x + lfilter([1, 0.4], [1, -0.6], 0.1*np.random.randn(N, 1), axis=0)
+
+    def time_estimate(self, method, N):
+        if method == 'iv':
+            iv(2, 1, 1, self.u, self.y, self.x)
+        else:
+            riv(1, 2, 1, self.u, self.y)
+
+    def peakmem_estimate(self, method, N):
+        if method == 'iv':
+            iv(2, 1, 1, self.u, self.y, self.x)
+        else:
+            riv(1, 2, 1, self.u, self.y)
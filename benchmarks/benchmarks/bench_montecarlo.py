@@ -0,0 +1,30 @@
+"""
+    This benchmark is intended to measure the time of the Monte Carlo
+    estimates of the parameter uncertainty (montecarlo), sequential and in a
+    process pool, from 1e3 to 1e5 samples.
+"""
+# Imports
+try:
+    from pysid.identification.montecarlo import montecarlo
+    from pysid.identification.pemethod import oe
+except ImportError:
+    pass
+from .common import siso_data
+
+
+class MonteCarlo:
+    params = [
+    ['bootstrap', 'simulate'],
+    [1, 4],
+    [1000, 10000, 100000]
+    ]
+
+    param_names = ['method', 'workers', 'N']
+
+    timeout = 600
+
+    def setup(self, method, workers, N):
+        self.m = oe(1, 2, 1, *siso_data(N))
+
+    def time_montecarlo(self, method, workers, N):
+        montecarlo(self.m, replicates=32, method=method, workers=workers)
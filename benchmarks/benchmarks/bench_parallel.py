@@ -0,0 +1,37 @@
+"""
+    This benchmark is intended to measure the scaling of the per-output
+    optimizations of the MIMO oe, bj and armax estimators with the number
+    of worker threads (16 outputs, 2 inputs).
+"""
+# Imports
+import numpy as np
+try:
+    from pysid.identification.pemethod import armax, bj, oe
+except ImportError:
+    pass
+from .common import mimo_data
+
+
+class ParallelOutputs:
+    params = [
+    [1, 2, 4, 8, 16, 32],
+    [2000, 20000]
+    ]
+
+    param_names = ['workers', 'N']
+
+    def setup(self, workers, N):
+        ny, nu = 16, 2
+        self.u, self.y = mimo_data(N, ny, nu, noise=0.05)
+        self.one = np.ones((ny, nu), dtype=int)
+        self.n = np.ones((ny, 1), dtype=int)
+        self.na = np.eye(ny, dtype=int)
+
+    def time_oe(self, workers, N):
+        oe(self.one, self.one, self.one, self.u, self.y, workers=workers)
+
+    def time_bj(self, workers, N):
+        bj(self.one, self.n, self.n, self.one, self.one, self.u, self.y, workers=workers)
+
+    def time_armax(self, workers, N):
+        armax(self.na, self.one, self.n, self.one, self.u, self.y, workers=workers)
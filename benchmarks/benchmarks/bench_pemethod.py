@@ -0,0 +1,81 @@
+"""
+    This benchmark is intended to measure the time, the peak memory and the
+    number of evaluations of the prediction error methods (fir, armax, oe,
+    bj and pem) on SISO data, from 1e2 to 1e6 samples.
+"""
+# Imports
+try:
+    from pysid.identification.pemethod import armax, bj, fir, oe, pem
+    from pysid.identification.trace import trace
+except ImportError:
+    pass
+from .common import siso_data
+
+# Second order system with first order ARMA noise
+NOISE = {'C': [1, 0.4], 'D': [1, -0.6]}
+
+
+# Estimators with the orders of the true system
+ESTIMATORS = {
+    'armax': lambda u, y, **kw: armax(2, 1, 1, 1, u, y, **kw),
+    'oe': lambda u, y, **kw: oe(1, 2, 1, u, y, **kw),
+    'bj': lambda u, y, **kw: bj(1, 1, 1, 2, 1, u, y, **kw),
+    'pem': lambda u, y, **kw: pem([1], [0, 0.4, 0.2], [1, 0.3], [1, -0.5], [1, -1, 0.4], u, y,
+                                  **kw),
+}
+
+
+class Fir:
+    params = [
+    [10, 50],
+    [100, 1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['nb', 'N']
+
+    timeout = 600
+
+    def setup(self, nb, N):
+        # Not enough samples for the regressors
+        if N < 10*nb:
+            raise NotImplementedError
+        self.u, self.y = siso_data(N, **NOISE)
+
+    def time_fir(self, nb, N):
+        fir(nb, 1, self.u, self.y)
+
+    def peakmem_fir(self, nb, N):
+        fir(nb, 1, self.u, self.y)
+
+
+class PredictionError:
+    params = [
+    list(ESTIMATORS),
+    [100, 1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['method', 'N']
+
+    timeout = 600
+
+    def setup(self, method, N):
+        self.u, self.y = siso_data(N, **NOISE)
+        self.fit = ESTIMATORS[method]
+
+    def time_estimate(self, method, N):
+        self.fit(self.u, self.y)
+
+    def peakmem_estimate(self, method, N):
+        self.fit(self.u, self.y)
+
+    def track_nfev(self, method, N):
+        t = trace()
+        self.fit(self.u, self.y, trace=t)
+        return sum(s['nfev'] for s in t.solves)
+    track_nfev.unit = 'evaluations'
+
+    def track_njev(self, method, N):
+        t = trace()
+        self.fit(self.u, self.y, trace=t)
+        return sum(s['njev'] for s in t.solves)
+    track_njev.unit = 'jacobians'
@@ -0,0 +1,57 @@
+"""
+    This benchmark is intended to measure the per-sample latency of the
+    stateful predictors (model.predictor) against the re-filtering of the
+    whole history with model.predict.
+"""
+# Imports
+import numpy as np
+try:
+    from pysid.identification.models import polymodel
+except ImportError:
+    pass
+
+
+def random_model(ny, nu, n):
+    # Stable Box-Jenkins like model with n-th order polynomials
+    def polys(shape, lead, scale):
+        P = np.empty(shape, dtype=object)
+        for i in np.ndindex(shape):
+            P[i] = np.append([lead(i)], scale*np.random.rand(n)/n)
+        return P
+    A = polys((ny, ny), lambda i: float(i[0] == i[1]), 0.5/ny)
+    B = polys((ny, nu), lambda i: 0., 1.)
+    C = polys((ny, 1), lambda i: 1., 0.5)
+    D = polys((ny, 1), lambda i: 1., 0.5)
+    F = polys((ny, nu), lambda i: 1., 0.5)
+    return polymodel('pem', A, B, C, D, F, np.ones((ny, nu)), 0, None, nu, ny, 1)
+
+
+class Predictor:
+    params = [
+    ['siso', 'mimo8x8'],
+    [1, 5]
+    ]
+
+    param_names = ['model', 'k']
+
+    def setup(self, model, k):
+        np.random.seed(0)
+        n = 8 if model == 'mimo8x8' else 1
+        self.m = random_model(n, n, 2)
+        self.u = np.random.randn(1000, n)
+        self.y = self.m.simulate(self.u, np.random.randn(1000, n))
+        self.p = self.m.predictor(k)
+        self.p(self.u, self.y)
+        self.zi = self.m.initstate(k)
+
+    def time_step(self, model, k):
+        self.p.step(self.u[0], self.y[0])
+
+    def time_forecast(self, model, k):
+        self.p.forecast(self.u[0])
+
+    def time_predict_one_sample(self, model, k):
+        self.m.predict(self.u[0:1], self.y[0:1], k, self.zi)
+
+    def time_predict_history(self, model, k):
+        self.m.predict(self.u, self.y, k)
@@ -0,0 +1,54 @@
+"""
+    This benchmark is intended to measure the time, the peak memory and the
+    number of iterations of the recursive estimators (els and rls), from
+    1e2 to 1e6 samples.
+"""
+# Imports
+try:
+    from pysid.identification.recursive import els, rls
+    from pysid.identification.trace import trace
+except ImportError:
+    pass
+from .common import siso_data
+
+
+class Recursive:
+    params = [
+    ['els', 'rls'],
+    [100, 1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['method', 'N']
+
+    timeout = 600
+
+    def setup(self, method, N):
+        # rls updates the estimate sample by sample in Python
+        if method == 'rls' and N > 100000:
+            raise NotImplementedError
+        self.u, self.y = siso_data(N, C=[1, 0.4], D=[1, -1.2, 0.5])
+        self.fit = {'els': lambda **kw: els(2, 1, 1, 1, self.u, self.y, **kw),
+                    'rls': lambda **kw: rls(2, 1, 1, self.u, self.y, **kw)}[method]
+
+    def time_estimate(self, method, N):
+        self.fit()
+
+    def peakmem_estimate(self, method, N):
+        self.fit()
+
+
+class ELSConvergence:
+    params = [100, 1000, 10000, 100000, 1000000]
+    param_names = ['N']
+
+    timeout = 600
+
+    def setup(self, N):
+        self.u, self.y = siso_data(N, C=[1, 0.4], D=[1, -1.2, 0.5])
+
+    def track_iterations(self, N):
+        # One cost per output and iteration
+        t = trace()
+        els(2, 1, 1, 1, self.u, self.y, trace=t)
+        return len(t.costs)
+    track_iterations.unit = 'iterations'
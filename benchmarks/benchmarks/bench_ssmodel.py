@@ -0,0 +1,40 @@
+"""
+    This benchmark is intended to measure the simulation and one step
+    ahead prediction of state space models (steady state Kalman
+    predictors) over long records.
+"""
+# Imports
+import numpy as np
+try:
+    from pysid.identification.accr import kalman
+except ImportError:
+    pass
+
+
+class SSModel:
+    params = [
+    [4, 16],
+    [10000, 1000000]
+    ]
+
+    param_names = ['n', 'N']
+
+    def setup(self, n, N):
+        np.random.seed(0)
+        A = np.random.randn(n, n)
+        A = 0.9*A/max(abs(np.linalg.eigvals(A)))
+        B = np.random.randn(n, 2)
+        C = np.random.randn(2, n)
+        self.m = kalman(A, B, C, None, np.eye(n), np.eye(2))
+        self.u = np.random.randn(N, 2)
+        self.y = self.m.simulate(self.u, np.random.randn(N, 2))
+        self.m.predict(self.u[0:1], self.y[0:1])
+
+    def time_kalman(self, n, N):
+        kalman(self.m.A, self.m.B, self.m.C, None, np.eye(n), np.eye(2))
+
+    def time_simulate(self, n, N):
+        self.m.simulate(self.u)
+
+    def time_predict(self, n, N):
+        self.m.predict(self.u, self.y)
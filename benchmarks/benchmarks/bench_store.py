@@ -0,0 +1,58 @@
+"""
+    This benchmark is intended to measure the cold start of a prediction
+    service that opens a model store with thousands of models and loads
+    a few of them, against loading the models one by one.
+"""
+# Imports
+import os
+import tempfile
+import numpy as np
+try:
+    from pysid.identification.models import polymodel
+    from pysid.identification.store import load_model, modelstore, save_model, save_store
+except ImportError:
+    pass
+
+
+def random_model(ny, nu, n):
+    def polys(shape, lead):
+        P = np.empty(shape, dtype=object)
+        for i in np.ndindex(shape):
+            P[i] = np.append([lead(i)], 0.5*np.random.rand(n)/n)
+        return P
+    A = polys((ny, ny), lambda i: float(i[0] == i[1]))
+    B = polys((ny, nu), lambda i: 0.)
+    C = polys((ny, 1), lambda i: 1.)
+    D = polys((ny, 1), lambda i: 1.)
+    F = polys((ny, nu), lambda i: 1.)
+    return polymodel('pem', A, B, C, D, F, np.ones((ny, nu)), 0, None, nu, ny, 1)
+
+
+class ModelStore:
+    params = [1000, 5000]
+    param_names = ['models']
+
+    def setup(self, n):
+        np.random.seed(0)
+        self.dir = tempfile.mkdtemp()
+        self.store = os.path.join(self.dir, 'models.pmd')
+        models = [random_model(2, 2, 4) for i in range(n)]
+        save_store(models, self.store)
+        self.npz = os.path.join(self.dir, 'model.npz')
+        save_model(models[0], self.npz)
+        self.u = np.random.randn(100, 2)
+
+    def teardown(self, n):
+        for f in os.listdir(self.dir):
+            os.remove(os.path.join(self.dir, f))
+        os.rmdir(self.dir)
+
+    def time_open_store(self, n):
+        modelstore(self.store)
+
+    def time_open_store_and_predict(self, n):
+        s = modelstore(self.store)
+        s[n // 2].simulate(self.u)
+
+    def time_load_model(self, n):
+        load_model(self.npz)
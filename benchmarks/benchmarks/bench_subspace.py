@@ -0,0 +1,38 @@
+"""
+    This benchmark is intended to measure the time and the peak memory of
+    the subspace identification (n4sid) with many outputs, from 1e3 to 1e6
+    samples.
+"""
+# Imports
+import numpy as np
+try:
+    from pysid.identification.models import ssmodel
+    from pysid.identification.subspace import n4sid
+except ImportError:
+    pass
+
+
+class Subspace:
+    params = [
+    [2, 12],
+    [1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['ny', 'N']
+
+    timeout = 600
+
+    def setup(self, ny, N):
+        np.random.seed(0)
+        n, nu = 6, 2
+        m = ssmodel(np.diag(np.linspace(0.3, 0.9, n)), np.random.randn(n, nu),
+                    np.random.randn(ny, n), K=0.1*np.random.randn(n, ny))
+        self.u = np.random.randn(N, nu)
+        self.y = m.simulate(self.u, 0.1*np.random.randn(N, ny))
+        self.f = 10 if ny == 2 else 5
+
+    def time_n4sid(self, ny, N):
+        n4sid(6, self.u, self.y, f=self.f)
+
+    def peakmem_n4sid(self, ny, N):
+        n4sid(6, self.u, self.y, f=self.f)
@@ -0,0 +1,80 @@
+"""
+    This benchmark is intended to measure the time, the peak memory and the
+    number of evaluations of the time series estimators (ar, arma and ma)
+    with each of their methods, from 1e2 to 1e6 samples.
+"""
+# Imports
+import numpy as np
+from scipy.signal import lfilter
+try:
+    from pysid.identification.tseries import ar, arma, ma
+    from pysid.identification.trace import trace
+except ImportError:
+    pass
+
+
+# Estimators and methods, with the orders of the series of their setup
+# ('hannan' of arma and 'vrm' of ma are not benchmarked, they do not run)
+ESTIMATORS = {
+    'ar-yw': lambda y, **kw: ar(2, y, 'yw', **kw),
+    'ar-burg': lambda y, **kw: ar(2, y, 'burg', **kw),
+    'ar-pem': lambda y, **kw: ar(2, y, 'pem', **kw),
+    'arma-pem': lambda y, **kw: arma(2, 1, y, 'pem', **kw),
+    'ma-durbin': lambda y, **kw: ma(2, y, 'durbin', **kw),
+    'ma-pem': lambda y, **kw: ma(2, y, 'pem', **kw),
+}
+
+
+def series(method, N):
+    np.random.seed(0)
+    e = np.random.randn(N, 1)
+    if method.startswith('ar-'):
+        return lfilter([1], [1, -1.2, 0.5], e, axis=0)
+    if method.startswith('ma-'):
+        return lfilter([1, 0.4, 0.2], [1], e, axis=0)
+    return lfilter([1, 0.4], [1, -1.2, 0.5], e, axis=0)
+
+
+class TimeSeries:
+    params = [
+    list(ESTIMATORS),
+    [100, 1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['method', 'N']
+
+    timeout = 600
+
+    def setup(self, method, N):
+        # The high order AR models of arma and ma need more samples
+        if N < 1000 and method in ('arma-pem', 'ma-pem'):
+            raise NotImplementedError
+        self.y = series(method, N)
+        self.fit = ESTIMATORS[method]
+
+    def time_estimate(self, method, N):
+        self.fit(self.y)
+
+    def peakmem_estimate(self, method, N):
+        self.fit(self.y)
+
+
+class TimeSeriesConvergence:
+    params = [
+    ['ar-pem', 'arma-pem', 'ma-pem'],
+    [1000, 10000, 100000, 1000000]
+    ]
+
+    param_names = ['method', 'N']
+
+    timeout = 600
+
+    def setup(self, method, N):
+        self.y = series(method, N)
+        self.fit = ESTIMATORS[method]
+
+    def track_nfev(self, method, N):
+        t = trace()
+        self.fit(self.y, trace=t)
+        return t.solves[0]['nfev']
+    track_nfev.unit = 'evaluations'
@@ -0,0 +1,36 @@
+"""
+    Data shared by the benchmarks.
+"""
+# Imports
+import numpy as np
+from scipy.signal import lfilter
+
+
+def siso_data(N, C=(1,), D=(1,), noise=0.1):
+    """
+    Returns the input and output (N x 1) of the second order system
+        y(t) = (0.5 q^-1 + 0.3 q^-2)/(1 - 1.2 q^-1 + 0.5 q^-2) u(t)
+               + C(q)/D(q) noise e(t)
+    """
+    np.random.seed(0)
+    u = np.random.randn(N, 1)
+    y = lfilter([0, 0.5, 0.3], [1, -1.2, 0.5], u, axis=0) +\
+        lfilter(C, D, noise*np.random.randn(N, 1), axis=0)
+    return u, y
+
+
+def mimo_data(N, ny, nu, noise=0.1):
+    """
+    Returns the input (N x nu) and output (N x ny) of a system with first
+    order paths and ARMA noise:
+        y_i(t) = sum_j (0.5 q^-1 + 0.2 j/nu q^-2)/(1 - (0.6 + 0.3 i/ny) q^-1) u_j(t)
+                 + (1 + 0.3 q^-1)/(1 - 0.7 q^-1) noise e_i(t)
+    """
+    np.random.seed(0)
+    u = -1 + 2*np.random.rand(N, nu)
+    y = np.zeros((N, ny))
+    for i in range(ny):
+        for j in range(nu):
+            y[:, i] += lfilter([0, 0.5, 0.2*j/nu], [1, -0.6 - 0.3*i/ny], u[:, j])
+        y[:, i] += lfilter([1, 0.3], [1, -0.7], noise*np.random.randn(N))
+    return u, y
@@ -6,4 +6,8 @@ from .pemethod import *
 from .tseries import *
 from .accr import *
 from .comcrit import *
+from .montecarlo import *
 from .recursive import *
+from .store import *
+from .subspace import *
+from .trace import *
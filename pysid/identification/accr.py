@@ -5,15 +5,19 @@ This module provides tools for accuracy analysis of parameter estimators.
 author: @edumapurunga
 """
 #%% Import Necessary libraries
-from numpy import block, eye, kron, shape, trace, vstack, zeros
-from numpy.linalg import inv
-from scipy.linalg import toeplitz, solve_discrete_are, solve_discrete_lyapunov
+from numpy import arange, asarray, atleast_2d, block, broadcast_to, concatenate, einsum, eye,\
+    float64, shape, zeros
+from numpy.fft import irfft, rfft
+from numpy.linalg import inv, solve
+from scipy.linalg import solve_discrete_are
 # Internal imports
 from .pemethod import *
 from .ivmethod import *
 from .tseries import *
+from .solvers import arcov, dlyap
+from .models import ssmodel
 #%% Define functions to call
-__all__ = ['crlbss', 'crlbarma']
+__all__ = ['crlbss', 'crlbarma', 'kalman']
 
 def crlbss(F, C, R1, R2, R12, nt, Fis, Cis, R1is, R2is, R12is):
     """
@@ -43,7 +47,8 @@ def crlbss(F, C, R1, R2, R12, nt, Fis, Cis, R1is, R2is, R12is):
     nt : integer
         Number of unknown Parameters
     Fis: list
-        List containing the derivatives of F with repesct to the parameters
+        List containing the derivatives of F with repesct to the parameters.
+        The lists of derivatives may also be given as nt x . x . arrays.
     Cis: list
         List containing the derivatives of C with repesct to the parameters
     R1is: list
@@ -58,115 +63,186 @@ def crlbss(F, C, R1, R2, R12, nt, Fis, Cis, R1is, R2is, R12is):
     CRLB: numpy.ndarray
         The Cramer Rao Lower Bound.
 
+    Notes
+    -----
+    The sensitivities of the Riccati solution and all the covariances of
+    the gradients are computed with batched Lyapunov/Stein solves sharing
+    the Schur decompositions of F-KC and of the predictor system (see
+    solvers.dlyap), instead of one dense Lyapunov equation of order
+    n(nt+2).
+
     """
     # Find the dimenson of F, number of nodes/states
     n = shape(F)[0]
     p = shape(C)[0]
     # Find the Innovations Representation using the Kalman Filter
-    P = solve_discrete_are(F.T, C.T, R1, R2, s=R12)
-    Q = C @ P @ C.T + R2
+    m = kalman(F, None, C, None, R1, R2, R12)
+    P, Q, K = m.X, m.Re, m.K
     S = inv(Q)
-    K = (F @ P @ C.T + R12) @ S
-    # Sensitivity Matrices
-    Pis = []
-    Qis = []
-    Kis = []
-    # Solve Discrete Lyapunov
-    for i in range(nt):
-        # Auxiliary
-        aux = (R1is[i] - K@R12is[i].T - R12is[i]@K.T + K@R2is[i]@K.T) + (Fis[i]-K@Cis[i])@P@(F-K@C).T + (F - K@C)@P@(Fis[i] - K@Cis[i]).T
-        # Solve Discrete Lyapynov
-        Pis.append(solve_discrete_lyapunov((F - K@C), aux))
-        # Update Q
-        Qis.append(Cis[i]@P@C.T + C@P@Cis[i].T + C@Pis[i]@C.T + R2is[i])
-        # Update K
-        Kis.append((Fis[i]-K@Cis[i])@P@C.T@S + (F - K@C)@Pis[i]@C.T@S + R12is[i]@S + (F - K@C)@P@Cis[i].T@S - K@R2is[i]@S)
-    # Form the augmented state space system
-    Fb = vstack(tuple(Fis))
-    Cb = vstack(tuple(Cis))
-    Kb = vstack(tuple(Kis))
-    # stack K*Ci and KiC
-    KbCis = []
-    KCbis = []
-    for i in range(nt):
-        KbCis.append(Kis[i].dot(C))
-        KCbis.append(K.dot(Cis[i]))
-    # Stack
-    KbCi = vstack(tuple(KbCis))
-    KCbi = vstack(tuple(KCbis))
-    # State Matrices
-    # This is probably wrong for  "Fc - Kb.dot(C)- K.dot(Cb)"
-    cF = block([[F, zeros((n, n)), zeros((n, n*nt))], [K.dot(C), F-K.dot(C), zeros((n, n*nt))], [Kb.dot(C), Fb-Kb.dot(C)-KCbi, kron(eye(nt), F-K.dot(C))]])
-    cK = block([[eye(n), zeros((n, p))], [zeros((n, n)), K], [zeros((n*nt, n)), Kb]])
-    cC = block([[zeros((nt*p, n)), -Cb, kron(-eye(nt), C)]])
-    # Covariance of the augmented systems
+    Fk = F - K @ C
+    # Derivatives stacked along the first axis (nt x . x .)
+    Fi, Ci, R1i, R2i, R12i = (asarray(X, dtype=float64).reshape((nt,) + shape(X0))
+                              for X, X0 in ((Fis, F), (Cis, C), (R1is, R1), (R2is, R2), (R12is, R12)))
+    tr = lambda X: X.swapaxes(1, 2)
+    Gi = Fi - K @ Ci
+    # Sensitivity of P: one Lyapunov equation per parameter, solved together
+    W = Gi @ (P @ Fk.T)
+    aux = R1i - K @ tr(R12i) - R12i @ K.T + K @ R2i @ K.T + W + tr(W)
+    Pis = dlyap(Fk, aux)
+    # Sensitivities of Q and K
+    V = Ci @ (P @ C.T)
+    Qis = V + tr(V) + C @ Pis @ C.T + R2i
+    Kis = (Gi @ (P @ C.T) + Fk @ Pis @ C.T + R12i + Fk @ P @ tr(Ci) - K @ R2i) @ S
+    # Augmented system of the state and of the predictor, a = [x; xp]
+    #   a(k+1) = Fa a(k) + Ka w(k), w = [v; e]
+    Fa = block([[F, zeros((n, n))], [K @ C, Fk]])
+    Ka = block([[eye(n), zeros((n, p))], [zeros((n, n)), K]])
     covv = block([[R1, R12], [R12.T, R2]])
-    # Solve the Lyapunov Equation for the augmented state space system
-    cP = solve_discrete_lyapunov(cF, cK.dot(covv.dot(cK.T)))
-    # Get  E[psispi] as:
-    PP = cC.dot(cP.dot(cC.T))
-    # Compute Pbar and EpsiWpsi
-    Pb = zeros((nt, nt))
-    pwp = zeros((nt, nt))
-    for i in range(nt):
-        for j in range(nt):
-            # Pbar
-            Pb[i, j] = 0.5*trace(S@Qis[i]@S@Qis[j])
-            # Weighted version of Epsipsi
-            pwp[i, j] = trace(PP[j, i]*S)
+    Paa = dlyap(Fa, Ka @ covv @ Ka.T)
+    # Gradients of the predictor, xi_i(k+1) = Fk xi_i + Li a + Mi w, and
+    # psi_i = Hi a + C xi_i (up to the sign)
+    L = concatenate((Kis @ C, Gi - Kis @ C), axis=2)
+    M = concatenate((zeros((nt, n, n)), Kis), axis=2)
+    H = concatenate((zeros((nt, p, n)), Ci), axis=2)
+    # The augmented system is block triangular: solve for E[xi_i a^T] (one
+    # Stein equation per parameter) and E[xi_i xi_j^T] (nt x nt equations)
+    # with the Schur decompositions of Fk and Fa
+    pairs = lambda X, Y: einsum('ikl,jml->ijkm', X, Y)
+    Pia = dlyap(Fk, L @ (Paa @ Fa.T) + M @ (covv @ Ka.T), Fa)
+    X = pairs(Fk @ Pia, L)
+    Pij = dlyap(Fk, X + X.transpose((1, 0, 3, 2)) + pairs(L @ Paa, L) + pairs(M @ covv, M))
+    # E[psi_i psi_j^T] as nt x nt blocks of p x p
+    Z = pairs(C @ Pia, H)
+    PP = pairs(H @ Paa, H) + Z + Z.transpose((1, 0, 3, 2)) + C @ Pij @ C.T
+    # Weighted version of Epsipsi, trace(E[psi_j psi_i^T] S)
+    pwp = einsum('ijab,ab->ij', PP, S)
+    # Pbar, 0.5 trace(S Qi S Qj)
+    SQ = S @ Qis
+    Pb = 0.5*SQ.reshape((nt, p*p)) @ tr(SQ).reshape((nt, p*p)).T
     # Compute the CRLB
     return inv(pwp + Pb)
 
-def crlbarma(A, C, sig):
+def crlbarma(A, C, sig=1):
     """
     Returns the Cramer-Rao Lower Bound for an ARMA process:
         y(t) = C(q)/A(q) e(t)
 
     Parameters
     ----------
-    A : TYPE
-        DESCRIPTION.
-    C : TYPE
-        DESCRIPTION.
-    sig : TYPE
-        DESCRIPTION.
+    A : array_like
+        Coefficients [1, a1, ..., an] of A(q), or a nb x (n+1) array with
+        one polynomial per row, for a batch of models.
+    C : array_like
+        Coefficients [1, c1, ..., cm] of C(q), or a nb x (m+1) array.
+    sig : float, optional
+        Variance of e(t). The bound per sample does not depend on it.
 
     Returns
     -------
-    CRLB : TYPE
-        DESCRIPTION.
+    CRLB : numpy.ndarray
+        The (n+m) x (n+m) bound (per sample) of the parameters [a, c], or
+        a nb x (n+m) x (n+m) array for a batch of models.
+
+    Notes
+    -----
+    The information matrix is made of Toeplitz blocks of the covariances
+    of x = e/A and z = e/C. With v = e/(AC), x = C v and z = A v, so all
+    the covariances follow from the autocovariance of one AR process,
+    computed with the Levinson recursion (solvers.arcov), instead of the
+    inverses of the Gohberg-Semencul forms (A1 A1^T - A2 A2^T)^-1.
+    A(q) and C(q) must have all their roots inside the unit circle.
 
     References
     ----------
-    [1]
+    [1] I. Gohberg and A. Semencul, On the inversion of finite Toeplitz
+    matrices and their continuous analogs. Mat. Issled., v. 7, p. 201-223,
+    1972.
 
     """
-    # Verify max
-    n = len(A)-1
-    m = len(C)-1
-    # Max
-    df = n-m
-    # Fill with zeros
-    if df < 0:
-        q = m
-        A += [0]*(df*-1)
-    else:
-        q = n
-        C += [0]*(df)
-    # Build the Matrices of Parameters
-    A1 = toeplitz(A[0:-1], [A[0]] + [0]*(q-1))
-    A2 = toeplitz(A[1:][::-1], [A[-1]] + [0]*(q-1))
-    C1 = toeplitz(C[0:-1], [C[0]] + [0]*(q-1))
-    C2 = toeplitz(C[1:][::-1], [C[-1]] + [0]*(q-1))
-    # Explicit Formulae
-    bRxx = inv(A1@A1.T - A2@A2.T)
-    bRzz = inv(C1@C1.T - C2@C2.T)
-    bRzx = inv(A1@C1.T - C2@A2.T)
-    # Recovery of the CRLB
-    M = block([[bRxx[0:n, 0:n], -bRzx.T[0:n, 0:m]], [-bRzx[0:m, 0:n], bRzz[0:m, 0:m]]])
-    CRLB = inv(M)
-    return CRLB
+    batch = asarray(A).ndim > 1 or asarray(C).ndim > 1
+    CRLB = inv(_armainfo(A, C))
+    return CRLB if batch else CRLB[0]
+
+def _xcorr(a, b):
+    """Returns w(l) = sum_i a_i b_(i+l), l = -na, ..., nb, for batches of polynomials."""
+    na, nc = a.shape[1] - 1, b.shape[1] - 1
+    bp = zeros((b.shape[0], nc + 2*na + 1))
+    bp[:, na:na+nc+1] = b
+    return (a[:, None, :] @ bp[:, arange(na + 1)[:, None] + arange(na + nc + 1)])[:, 0]
+
+def _armainfo(A, C):
+    """Returns the (nb x n+m x n+m) information matrices of crlbarma."""
+    A = atleast_2d(asarray(A, dtype=float64))
+    C = atleast_2d(asarray(C, dtype=float64))
+    nb = max(A.shape[0], C.shape[0])
+    A = broadcast_to(A, (nb, A.shape[1]))
+    C = broadcast_to(C, (nb, C.shape[1]))
+    n = A.shape[1] - 1
+    m = C.shape[1] - 1
+    # Autocovariance of v = e/(AC), for the lags -L, ..., L
+    L = max(n + m - 1, 0)
+    r = arcov(_xcorr(A[:, ::-1], C), L)
+    r = concatenate((r[:, :0:-1], r), axis=1)
+    # The correlations with r are computed in the frequency domain
+    nfft = 1 << (2*L + n + m + 2).bit_length()
+    Rf = rfft(r, nfft)
+    def cov(a, b, k0, k1):
+        # E[a(q)v(t) b(q)v(t-k)] = sum_l w(l) r(k+l), for k = k0, ..., k1
+        c = irfft(rfft(_xcorr(a, b), nfft).conj()*Rf, nfft)
+        s = L + k0 + 1 - a.shape[1]
+        return c[:, s:s+k1-k0+1]
+    # Toeplitz blocks, E[x(t-i) x(t-j)], E[z(t-i) z(t-j)] and E[x(t-j) z(t-i)]
+    toep = lambda c, p, q, k0: c[:, k0 + arange(p)[:, None] - arange(q)]
+    Rxx = toep(cov(C, C, 1 - n, n - 1), n, n, n - 1)
+    Rzz = toep(cov(A, A, 1 - m, m - 1), m, m, m - 1)
+    Rzx = toep(cov(C, A, 1 - n, m - 1), m, n, n - 1)
+    M = concatenate((concatenate((Rxx, -Rzx.swapaxes(1, 2)), axis=2),
+                     concatenate((-Rzx, Rzz), axis=2)), axis=1)
+    return M
 
 # Kalman Filtering
-def kalman(A, B, C, D):
-    return NotImplemented
+def kalman(A, B, C, D, Q, R, S=None, ts=1):
+    """
+    Returns the steady state Kalman predictor of the system
+        x(t+1) = A x(t) + B u(t) + w(t)
+          y(t) = C x(t) + D u(t) + v(t)
+    as a state space model in the innovations form (see models.ssmodel)
+        x(t+1) = A x(t) + B u(t) + K e(t)
+          y(t) = C x(t) + D u(t) + e(t)
+    The Riccati equation is solved once and the model keeps the gain, the
+    Riccati solution and the innovation covariance. Its compiled predictor
+    filter is built on the first call of predict and reused afterwards.
+
+    Parameters
+    ----------
+    A : numpy.ndarray
+        State matrix, n x n.
+    B : numpy.ndarray
+        Input matrix, n x nu, None for time series.
+    C : numpy.ndarray
+        Output matrix, p x n.
+    D : numpy.ndarray
+        Feedthrough matrix, p x nu, None if it is zero.
+    Q : numpy.ndarray
+        Covariance of w(t).
+    R : numpy.ndarray
+        Covariance of v(t).
+    S : numpy.ndarray, optional
+        Cross covariance E[w(t) v(t)^T]. Default is zero.
+    ts : float, optional
+        Sample time. Default is 1.
+
+    Returns
+    -------
+    m : ssmodel
+        Innovations form, with the Kalman gain m.K, the solution of the
+        Riccati equation m.X and the innovation covariance m.Re.
+
+    """
+    A = atleast_2d(asarray(A, dtype=float64))
+    C = atleast_2d(asarray(C, dtype=float64))
+    X = solve_discrete_are(A.T, C.T, Q, R, s=S)
+    Re = C @ X @ C.T + R
+    AXC = A @ X @ C.T if S is None else A @ X @ C.T + S
+    K = solve(Re, AXC.T).T
+    return ssmodel(A, B, C, D, K, Re, X, ts, 'kalman')
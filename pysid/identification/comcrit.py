@@ -5,13 +5,14 @@ traditional information criteria, such as Akaike information criterion
 model orders.
 """
 #
-from numpy import dot, empty, log, amin, where
-from scipy.signal import lfilter
+from numpy import asarray, concatenate, dot, empty, log, amin, where, zeros
+from numpy.linalg import det
 
-from .pemethod import arx
+from .pemethod import armax, arx, bj, oe
 from ..io.check import chckin
+from ..io.iddata import iddata
 
-__all__ = ['aicarx']
+__all__ = ['aicarx', 'orderarmax', 'orderoe', 'orderbj']
 
 def aiccrit(J, N, p):
     """Retun the AIC criterion"""
@@ -25,7 +26,79 @@ def aicccrit(J, N, p):
     """Return the corrected AIC criterion"""
     return N*log(J) + 2*p + 2*p*(p + 1)/(N - p - 1)
 
-def aicarx(na_max, nb_max, nk_max, u, y, criterion='aicn'):
+def biccrit(J, N, p):
+    """Return the Bayesian information criterion"""
+    return N*log(J) + p*log(N)
+
+def fpecrit(J, N, p):
+    """Return Akaike's final prediction error"""
+    return J*(N + p)/(N - p)
+
+CRITERIA = {'aic': aiccrit, 'aicn': aicncrit, 'aicc': aicccrit, 'bic': biccrit, 'fpe': fpecrit}
+
+def _pad(theta, low, high):
+    """
+    Returns the parameters theta of a model with the blocks of sizes low,
+    zero padded to the sizes high (the nested model of higher order).
+    """
+    out = []
+    k = 0
+    for nl, nh in zip(low, high):
+        out += [theta[k:k+nl], zeros(nh - nl)]
+        k += nl
+    return concatenate(out)
+
+def _search(fit, sizes, omin, omax, N, criterion, patience):
+    """
+    Walks the lattice of orders omin <= o <= omax by levels of total order.
+    The model of the orders o is warm started (fit(o, init)) from the best
+    fitted model of the orders o - e_k (the lowest cost), zero padded, so
+    that its cost is never higher. The children o + e_k of a model are only
+    visited while the criterion improves: a model that does not improve on
+    its parent adds one to the count of the parent, and its children are
+    pruned when the count exceeds patience. sizes(o) gives the sizes of
+    the parameter blocks of the orders o. Returns the best model and the
+    criterion of all the visited orders.
+    """
+    crit = CRITERIA.get(criterion)
+    if crit is None:
+        raise ValueError('criterion must be one of ' + ', '.join(CRITERIA))
+    omin, omax = tuple(omin), tuple(omax)
+    if any(a > b for a, b in zip(omin, omax)):
+        raise ValueError('The maximum orders must not be lower than the minimum ones')
+    models = {}
+    J = {}
+    stall = {}
+    level = [omin]
+    while level:
+        children = set()
+        for o in level:
+            # Best visited parent
+            parents = [tuple(o[i] - (i == k) for i in range(len(o))) for k in range(len(o))]
+            parents = [q for q in parents if q in models]
+            init = None
+            if parents:
+                q = min(parents, key=lambda q: models[q].costfunction)
+                init = _pad(asarray(models[q].parameters, dtype=float), sizes(q), sizes(o))
+            m = fit(o, init)
+            models[o] = m
+            J[o] = crit(det(m.ecov), N, m.nparam)
+            stall[o] = 0
+            if parents:
+                q = min(parents, key=lambda q: J[q])
+                stall[o] = 0 if J[o] < J[q] else stall[q] + 1
+            if stall[o] <= patience:
+                for k in range(len(o)):
+                    if o[k] < omax[k]:
+                        children.add(tuple(o[i] + (i == k) for i in range(len(o))))
+        level = sorted(children)
+    best = min(J, key=J.get)
+    m = models[best]
+    getattr(m, 'set' + criterion)(det(m.ecov), N, m.nparam)
+    m.search = J
+    return m
+
+def aicarx(na_max, nb_max, nk_max, u, y=None, criterion='aicn'):
     """
     author: @lima84
 
@@ -43,12 +116,13 @@ def aicarx(na_max, nb_max, nk_max, u, y, criterion='aicn'):
         maximum value for the na parameter -- nb = [0, 1, ..., nb_max]
     nk_max : int
         maximum value for the na parameter -- nk = [0, 1, ..., nk_max]
-    u : ndarray
-        input data array
-    y : ndarray
+    u : ndarray or iddata
+        input data array or an iddata object with input and output data
+    y : ndarray, optional
         output data array
     criterion: string (optional)
-        critrion to be evaluated.
+        critrion to be evaluated: 'aic', 'aicn' (default), 'aicc', 'bic' or
+        'fpe'.
     Returns
     -------
     m : polymodel
@@ -58,6 +132,8 @@ def aicarx(na_max, nb_max, nk_max, u, y, criterion='aicn'):
     """
     # Check input arguments
     _, _, _, _, _, _, u, y = chckin(na_max, nb_max, 0, 0, 0, nk_max, u, y)
+    # Validate the data only once for all the candidate models
+    data = iddata(u, y)
 
     # Number of samples and outputs
     N, ny = y.shape
@@ -65,14 +141,13 @@ def aicarx(na_max, nb_max, nk_max, u, y, criterion='aicn'):
     m_aic = empty((na_max, nb_max + 1, nk_max + 1), dtype='object')
     J_aic = empty((na_max, nb_max + 1, nk_max + 1), dtype='object')
 
-    criteria = {'aic': aiccrit, 'aicn': aicncrit, 'aicc': aicccrit}
-    crit = criteria.get(criterion)
+    crit = CRITERIA.get(criterion)
 
     for na in range(1,na_max+1):
         for nb in range(0,nb_max+1):
             for nk in range(0,nk_max+1):
                 # Computes ARX polynomials for current (na, nb, nk)
-                m = arx(na, nb, nk, u, y)
+                m = arx(na, nb, nk, data)
 
                 # Number of parameters
                 p = na + nb + 1
@@ -91,11 +166,128 @@ def aicarx(na_max, nb_max, nk_max, u, y, criterion='aicn'):
 
     m = m_aic[min_index][0]
 
-    if criterion == 'aicn':
-        m.setaicn()
-    elif criterion == 'aic':
-        m.setaic()
-    elif criterion == 'aicc':
-        m.setaicc()
+    getattr(m, 'set' + criterion)()
 
     return m
+
+def orderarmax(na_max, nb_max, nc_max, nk, u, y=None, criterion='aic', patience=1):
+    """
+    Selects the orders of the SISO ARMAX model
+        A(q)y(t) = B(q)u(t) + C(q)e(t)
+    by an information criterion, searching the orders 1 <= na <= na_max,
+    0 <= nb <= nb_max and 1 <= nc <= nc_max incrementally: each model is
+    warm started from the optimum of a neighbouring lower order (see
+    pemethod.armax, init), zero padded, and the search stops increasing an
+    order when the criterion stops improving.
+
+    Parameters
+    ----------
+    na_max : int
+        Maximum order of A(q).
+    nb_max : int
+        Maximum order of B(q).
+    nc_max : int
+        Maximum order of C(q).
+    nk : int
+        Time delay.
+    u : ndarray or iddata
+        Input data array or an iddata object with input and output data.
+    y : ndarray, optional
+        Output data array.
+    criterion : string, optional
+        'aic', 'aicn', 'aicc', 'bic' or 'fpe', computed from the determinant
+        of the covariance of the prediction errors. Default is 'aic'.
+    patience : int, optional
+        Number of successive orders without improvement of the criterion
+        before a branch of the search is pruned. Default is 1.
+    Returns
+    -------
+    m : polymodel
+        Model with the lowest criterion, with the criterion set (e.g. m.Jaic)
+        and the criterion of all the visited orders (na, nb, nc) in m.search.
+    """
+    _, _, _, _, _, _, u, y = chckin(na_max, nb_max, nc_max, 0, 0, nk, u, y)
+    data = iddata(u, y)
+    fit = lambda o, init: armax(o[0], o[1], o[2], nk, data, init=init)
+    sizes = lambda o: (o[0], o[1] + 1, o[2])
+    return _search(fit, sizes, (1, 0, 1), (na_max, nb_max, nc_max), y.shape[0], criterion,
+                   patience)
+
+def orderoe(nb_max, nf_max, nk, u, y=None, criterion='aic', patience=1):
+    """
+    Selects the orders of the SISO OE model
+        y(t) = [B(q)/F(q)]u(t) + e(t)
+    by an information criterion, searching the orders 0 <= nb <= nb_max and
+    1 <= nf <= nf_max incrementally, with warm starts and pruning (see
+    orderarmax).
+
+    Parameters
+    ----------
+    nb_max : int
+        Maximum order of B(q).
+    nf_max : int
+        Maximum order of F(q).
+    nk : int
+        Time delay.
+    u : ndarray or iddata
+        Input data array or an iddata object with input and output data.
+    y : ndarray, optional
+        Output data array.
+    criterion : string, optional
+        'aic', 'aicn', 'aicc', 'bic' or 'fpe'. Default is 'aic'.
+    patience : int, optional
+        Number of successive orders without improvement of the criterion
+        before a branch of the search is pruned. Default is 1.
+    Returns
+    -------
+    m : polymodel
+        Model with the lowest criterion, with the criterion of all the
+        visited orders (nb, nf) in m.search.
+    """
+    _, _, _, _, _, _, u, y = chckin(0, nb_max, 0, 0, nf_max, nk, u, y)
+    data = iddata(u, y)
+    fit = lambda o, init: oe(o[0], o[1], nk, data, init=init)
+    sizes = lambda o: (o[0] + 1, o[1])
+    return _search(fit, sizes, (0, 1), (nb_max, nf_max), y.shape[0], criterion, patience)
+
+def orderbj(nb_max, nc_max, nd_max, nf_max, nk, u, y=None, criterion='aic', patience=1):
+    """
+    Selects the orders of the SISO BJ model
+        y(t) = [B(q)/F(q)]u(t) + [C(q)/D(q)]e(t)
+    by an information criterion, searching the orders 0 <= nb <= nb_max,
+    1 <= nc <= nc_max, 1 <= nd <= nd_max and 1 <= nf <= nf_max
+    incrementally, with warm starts and pruning (see orderarmax).
+
+    Parameters
+    ----------
+    nb_max : int
+        Maximum order of B(q).
+    nc_max : int
+        Maximum order of C(q).
+    nd_max : int
+        Maximum order of D(q).
+    nf_max : int
+        Maximum order of F(q).
+    nk : int
+        Time delay.
+    u : ndarray or iddata
+        Input data array or an iddata object with input and output data.
+    y : ndarray, optional
+        Output data array.
+    criterion : string, optional
+        'aic', 'aicn', 'aicc', 'bic' or 'fpe'. Default is 'aic'.
+    patience : int, optional
+        Number of successive orders without improvement of the criterion
+        before a branch of the search is pruned. Default is 1.
+    Returns
+    -------
+    m : polymodel
+        Model with the lowest criterion, with the criterion of all the
+        visited orders (nb, nc, nd, nf) in m.search.
+    """
+    _, _, _, _, _, _, u, y = chckin(0, nb_max, nc_max, nd_max, nf_max, nk, u, y)
+    data = iddata(u, y)
+    fit = lambda o, init: bj(o[0], o[1], o[2], o[3], nk, data, init=init)
+    sizes = lambda o: (o[0] + 1, o[1], o[2], o[3])
+    return _search(fit, sizes, (0, 1, 1, 1), (nb_max, nc_max, nd_max, nf_max), y.shape[0],
+                   criterion, patience)
@@ -0,0 +1,434 @@
+"""
+    Compiled filter form of the polynomial models, used by the simulate and
+    predict methods of the models.
+
+    The model
+        A(q) y(t) = B(q)/F(q) u(t) + C(q)/D(q) e(t)
+    is compiled once into banks of filters that process all the channels of
+    a signal, and a whole batch of trajectories, at once. Inside this module
+    the signals are (N x n x nb) arrays: time in the first axis, channels in
+    the second one and the (flattened) batch in the last one. State space
+    models are filtered with ssbank.
+"""
+
+# Imports
+from numpy import arange, array_equal, asarray, concatenate, cos, empty, eye,\
+float64, ndindex, ones, outer, pi, prod, sin, zeros
+from numpy.fft import fft, ifft, rfft
+from numpy.linalg import det
+
+# Variables
+__all__ = ['polymatrix', 'polyadj', 'polyfreq', 'firbank', 'iirbank', 'ssbank', 'modelfilters']
+
+
+# functions
+def polymatrix(P):
+    """
+    Converts an object array of polynomials in q^{-1} (rows x cols) into the
+    coefficients (L x rows x cols) of the equivalent matrix polynomial
+        P(q) = P0 + P1 q^{-1} + ... + P(L-1) q^{-L+1}
+    """
+    P = asarray(P, dtype=object)
+    polys = [asarray(P[i], dtype=float64).ravel() for i in ndindex(P.shape)]
+    M = zeros((max(p.size for p in polys),) + P.shape)
+    for p, i in zip(polys, ndindex(P.shape)):
+        M[(slice(0, p.size),) + i] = p
+    return M
+
+
+def polyadj(M):
+    """
+    Computes the determinant and the adjugate of a square matrix polynomial,
+    such that adj(M) M = det(M) I. The matrix is evaluated on a FFT grid with
+    enough points to recover the coefficients of the products, and all the
+    minors are computed in one batched determinant.
+
+    Parameters
+    ----------
+    M : ndarray
+        Coefficients (L x n x n) of the matrix polynomial.
+    Returns
+    -------
+    d : ndarray
+        Coefficients of det(M), n*(L-1) + 1 elements.
+    adj : ndarray
+        Coefficients of adj(M), ((n-1)*(L-1) + 1) x n x n.
+    """
+    L, n, _ = M.shape
+    nd = n*(L - 1) + 1
+    na = (n - 1)*(L - 1) + 1
+    nfft = 1 << (nd - 1).bit_length()
+    Mw = fft(M, nfft, axis=0)
+    d = ifft(det(Mw)).real[0:nd]
+    if n == 1:
+        return d, ones((1, 1, 1))
+    # Rows and columns of the minor (j, i), obtained by removing row j and column i
+    idx = arange(n)
+    keep = [idx[idx != k] for k in range(n)]
+    R = asarray(keep)[:, None, :, None]
+    C = asarray(keep)[None, :, None, :]
+    minors = det(Mw[:, R, C])
+    sign = (-1.)**(idx[:, None] + idx[None, :])
+    adj = ifft(sign*minors.transpose((0, 2, 1)), axis=0).real[0:na]
+    return d, adj
+
+
+def polyfreq(Ms, w=None, nw=512, ts=1):
+    """
+    Evaluates a set of matrix polynomials in q^{-1} on a frequency grid,
+    that is, at q = exp(j w ts). All the coefficients are stacked and
+    evaluated at once, with a single product by the (nw x L) matrix of
+    exp(-j w ts l). For the default uniform grid
+        w = pi/ts [0, 1/nw, ..., (nw-1)/nw]
+    and long polynomials, one FFT of the zero padded coefficients is used
+    instead.
+
+    Parameters
+    ----------
+    Ms : list
+        Coefficients (L x rows x cols) of the matrix polynomials.
+    w : array_like, optional
+        Frequencies in rad/s. Default is the uniform grid.
+    nw : int, optional
+        Number of points of the uniform grid. Default is 512.
+    ts : float, optional
+        Sample time. Default is 1.
+    Returns
+    -------
+    w : ndarray
+        Frequency grid (nw).
+    Ps : list
+        Frequency responses (nw x rows x cols) of the polynomials.
+    """
+    L = max(M.shape[0] for M in Ms)
+    K = [int(prod(M.shape[1:])) for M in Ms]
+    coef = zeros((L, sum(K)))
+    Pw = None
+    k = 0
+    for M, n in zip(Ms, K):
+        coef[0:M.shape[0], k:k+n] = M.reshape((M.shape[0], n))
+        k += n
+    if w is None:
+        w = pi*arange(nw)/(nw*ts)
+        # The FFT is cheaper than the product for long polynomials only
+        if 2*nw >= L > 2*(2*nw).bit_length():
+            Pw = rfft(coef.T, 2*nw).T[0:nw]
+    else:
+        w = asarray(w, dtype=float64).ravel()
+    if Pw is None:
+        wl = outer(ts*w, arange(L))
+        Pw = empty((w.size, coef.shape[1]), dtype=complex)
+        Pw.real = cos(wl) @ coef
+        Pw.imag = -sin(wl) @ coef
+    Ps = []
+    k = 0
+    for M, n in zip(Ms, K):
+        Ps.append(Pw[:, k:k+n].reshape((w.size,) + M.shape[1:]))
+        k += n
+    return w, Ps
+
+
+def _batch(x, n, name):
+    """Returns x as a (N x n x nb) array and the shape of its batch axes."""
+    x = asarray(x, dtype=float64)
+    if x.ndim == 1:
+        x = x.reshape((x.shape[0], 1))
+    if x.ndim < 2 or x.shape[1] != n:
+        raise ValueError(name + ' must have ' + str(n) + ' channels in its second axis')
+    return x.reshape((x.shape[0], n, int(prod(x.shape[2:])))), x.shape[2:]
+
+
+# classes
+class firbank():
+    """
+    Bank of FIR filters given by a matrix polynomial, such that
+        out(t) = M0 x(t) + M1 x(t-1) + ... + M(L-1) x(t-L+1)
+    The state is made of the last L-1 samples of the input.
+
+    Parameters
+    ----------
+    M : ndarray
+        Coefficients (L x nout x nin) of the matrix polynomial.
+    """
+
+    def __init__(self, M):
+        self.M = M
+        self.L, self.nout, self.nin = M.shape
+        # Only the non-zero coefficients are used (e.g. time delays)
+        self.lags = [l for l in range(self.L) if M[l].any()]
+
+    def zeros(self, nb=1):
+        return zeros((self.L - 1, self.nin, nb))
+
+    def __call__(self, x, zi=None):
+        if zi is None:
+            zi = self.zeros(x.shape[2])
+        N, L = x.shape[0], self.L
+        xe = concatenate((zi, x), axis=0)
+        out = zeros((N, self.nout, x.shape[2]))
+        for l in self.lags:
+            out += self.M[l] @ xe[L-1-l:L-1-l+N]
+        return out, xe[N:]
+
+
+class iirbank():
+    """
+    Bank of single-input single-output filters b(q)/a(q), such that the
+    channel i of the output is
+        out_i(t) = sum_j b_ij(q)/a_ij(q) x_j(t)
+    over the (i, j) pairs of the bank. The states follow the lfilter
+    convention (direct form II transposed). When the bank is the same filter
+    applied to each channel, the signal is filtered with one lfilter call.
+
+    Parameters
+    ----------
+    nout : int
+        Number of channels of the output.
+    entries : list
+        List of tuples (i, j, b, a).
+    """
+
+    def __init__(self, nout, entries):
+        self.nout = nout
+        self.entries = []
+        for i, j, b, a in entries:
+            b = asarray(b, dtype=float64).ravel()
+            a = asarray(a, dtype=float64).ravel()
+            if not b.any():
+                continue
+            n = max(b.size, a.size, 2)
+            bn = zeros(n)
+            an = zeros(n)
+            bn[0:b.size] = b/a[0]
+            an[0:a.size] = a/a[0]
+            self.entries.append((i, j, bn, an))
+        e = self.entries
+        self.common = len(e) == nout and nout > 0 \
+            and all(i == k and j == k for k, (i, j, _, _) in enumerate(e)) \
+            and all(array_equal(b, e[0][2]) and array_equal(a, e[0][3]) for _, _, b, a in e)
+
+    def zeros(self, nb=1):
+        if self.common:
+            return zeros((self.entries[0][2].size - 1, self.nout, nb))
+        return [zeros((b.size - 1, nb)) for _, _, b, _ in self.entries]
+
+    def __call__(self, x, zi=None):
+        from scipy.signal import lfilter
+        if zi is None:
+            zi = self.zeros(x.shape[2])
+        if self.common:
+            _, _, b, a = self.entries[0]
+            return lfilter(b, a, x, axis=0, zi=zi)
+        out = zeros((x.shape[0], self.nout, x.shape[2]))
+        zf = []
+        for (i, j, b, a), z in zip(self.entries, zi):
+            xf, z = lfilter(b, a, x[:, j], axis=0, zi=z)
+            out[:, i] += xf
+            zf.append(z)
+        return out, zf
+
+
+class ssbank():
+    """
+    State space filter
+        x(t+1) = A x(t) + B w(t)
+        out(t) = C x(t) + D w(t)
+    applied to blocks of L samples. The state is only propagated from one
+    block to the next,
+        x(kL+L) = A^L x(kL) + [A^(L-1)B ... AB B] w(kL:kL+L)
+    and the outputs of all the blocks are computed at once, with one matrix
+    product by the observability matrix [C; CA; ...; CA^(L-1)] and one by
+    the block Toeplitz matrix of the Markov parameters [D, CB, CAB, ...].
+    The state is a (n x nb) array.
+
+    Parameters
+    ----------
+    A, B, C, D : ndarray
+        State space matrices.
+    L : int, optional
+        Number of samples of the blocks. Default is 64.
+    """
+
+    def __init__(self, A, B, C, D, L=64):
+        n, nin = B.shape
+        nout = C.shape[0]
+        self.n, self.nin, self.nout, self.L = n, nin, nout, L
+        # Powers of A, Ap[l] = A^l
+        Ap = empty((L + 1, n, n))
+        Ap[0] = eye(n)
+        for l in range(1, L + 1):
+            Ap[l] = A @ Ap[l-1]
+        self.Ap = Ap
+        self.O = (C @ Ap[0:L]).reshape((L*nout, n))
+        # Markov parameters and their block Toeplitz matrix T[i, j] = h[i-j]
+        h = zeros((L, nout, nin))
+        h[0] = D
+        h[1:] = C @ Ap[0:L-1] @ B
+        lag = arange(L)[:, None] - arange(L)
+        T = h[lag.clip(0)]*(lag >= 0)[:, :, None, None]
+        self.T = T.transpose((0, 2, 1, 3)).reshape((L*nout, L*nin))
+        # Effect of the inputs of a block on the state at its end
+        self.G = (Ap[L-1::-1] @ B).transpose((1, 0, 2)).reshape((n, L*nin))
+
+    def zeros(self, nb=1):
+        return zeros((self.n, nb))
+
+    def __call__(self, x, zi=None):
+        N, nb = x.shape[0], x.shape[2]
+        L, n, nin, nout = self.L, self.n, self.nin, self.nout
+        z = self.zeros(nb) if zi is None else zi
+        out = empty((N, nout, nb))
+        nblk = N//L
+        M = nblk*L
+        if nblk > 0:
+            # Blocks as columns, (L nin x nblk nb)
+            W = x[0:M].reshape((nblk, L*nin, nb)).transpose((1, 0, 2)).reshape((L*nin, nblk*nb))
+            GW = (self.G @ W).reshape((n, nblk, nb))
+            X = empty((n, nblk, nb))
+            AL = self.Ap[L]
+            for k in range(nblk):
+                X[:, k] = z
+                z = AL @ z + GW[:, k]
+            Y = self.O @ X.reshape((n, nblk*nb)) + self.T @ W
+            out[0:M] = Y.reshape((L*nout, nblk, nb)).transpose((1, 0, 2)).reshape((M, nout, nb))
+        if N > M:
+            # Last (incomplete) block
+            r = N - M
+            w = x[M:].reshape((r*nin, nb))
+            out[M:] = (self.O[0:r*nout] @ z + self.T[0:r*nout, 0:r*nin] @ w).reshape((r, nout, nb))
+            z = self.Ap[r] @ z + self.G[:, (L-r)*nin:] @ w
+        return out, z
+
+
+class modelfilters():
+    """
+    Compiled filter form of a polynomial model
+        A(q) y(t) = B(q)/F(q) u(t) + C(q)/D(q) e(t)
+    made of the input path G = B/F, the noise path H = C/D (and its
+    inverse), the FIR bank of A and the stages of inv(A). When A is not
+    diagonal, inv(A) = adj(A)/det(A) is applied as a FIR bank followed by
+    a filter with the common denominator det(A).
+
+    Parameters
+    ----------
+    model : polymodel or compactmodel
+        Model to be compiled.
+    """
+
+    def __init__(self, model):
+        A, B, C, D, F = model
+        ny, nu = model.ny, model.nu
+        self.ny, self.nu = ny, nu
+        # Input path
+        self.G = None
+        if B is not None:
+            if F is None or all(asarray(F[i], dtype=float64).size == 1 for i in ndindex(F.shape)):
+                MB = polymatrix(B)
+                if F is not None:
+                    MB = MB/polymatrix(F)[0]
+                self.G = firbank(MB)
+            else:
+                self.G = iirbank(ny, [(i, j, B[i, j], F[i, j]) for i in range(ny) for j in range(nu)])
+        # Noise path
+        c = [1]*ny if C is None else [C.flat[i] for i in range(ny)]
+        d = [1]*ny if D is None else [D.flat[i] for i in range(ny)]
+        self.H = self.Hinv = None
+        if C is not None or D is not None:
+            self.H = iirbank(ny, [(i, i, c[i], d[i]) for i in range(ny)])
+            self.Hinv = iirbank(ny, [(i, i, d[i], c[i]) for i in range(ny)])
+        # A(q) and its inverse
+        self.A = None
+        self.Ainv = []
+        if A is not None:
+            MA = polymatrix(A)
+            self.A = firbank(MA)
+            if not (MA*(1 - eye(ny))).any():
+                self.Ainv = [iirbank(ny, [(i, i, [1], MA[:, i, i]) for i in range(ny)])]
+            else:
+                dA, adjA = polyadj(MA)
+                self.Ainv = [firbank(adjA), iirbank(ny, [(i, i, [1], dA) for i in range(ny)])]
+        self._hk = {}
+
+    # Zero initial states
+    def simzeros(self, nb=1):
+        stages = [self.G, self.H] + self.Ainv
+        return [None if s is None else s.zeros(nb) for s in stages]
+
+    def predzeros(self, k=1, nb=1):
+        stages = [self.A, self.G, self.Hinv]
+        z = [None if s is None else s.zeros(nb) for s in stages]
+        return z + [zeros((k - 1, self.ny, nb))]
+
+    def _simulate(self, u, e, zi):
+        """Simulates the (N x n x nb) signals u and e (either may be None)."""
+        N, nb = (u if u is not None else e).shape[0::2]
+        zf = list(zi)
+        w = zeros((N, self.ny, nb))
+        if self.G is not None and u is not None:
+            x, zf[0] = self.G(u, zi[0])
+            w += x
+        if e is not None:
+            if self.H is not None:
+                e, zf[1] = self.H(e, zi[1])
+            w += e
+        for k, s in enumerate(self.Ainv):
+            w, zf[2+k] = s(w, zi[2+k])
+        return w, zf
+
+    def markov(self, k):
+        """Returns the first k Markov parameters (k x ny x ny) of inv(A) C/D."""
+        e = zeros((k, self.ny, self.ny))
+        e[0] = eye(self.ny)
+        return self._simulate(None, e, self.simzeros(self.ny))[0]
+
+    def simulate(self, u, e=None, zi=None):
+        batch = None
+        if u is not None and self.G is not None:
+            u, batch = _batch(u, self.nu, 'u')
+        else:
+            u = None
+        if e is not None:
+            e, b = _batch(e, self.ny, 'e')
+            if batch is not None and (u.shape[0], batch) != (e.shape[0], b):
+                raise ValueError('u and e must have the same number of samples and batch shape')
+            batch = b
+        if batch is None:
+            raise ValueError('An input (u) or noise (e) signal must be provided')
+        nb = int(prod(batch))
+        y, zf = self._simulate(u, e, self.simzeros(nb) if zi is None else zi)
+        y = y.reshape(y.shape[0:2] + batch)
+        return y if zi is None else (y, zf)
+
+    def predict(self, u, y, k=1, zi=None):
+        if k < 1:
+            raise ValueError('The prediction horizon k must be at least 1')
+        y, batch = _batch(y, self.ny, 'y')
+        if self.G is not None:
+            u, b = _batch(u, self.nu, 'u')
+            if (u.shape[0], b) != (y.shape[0], batch):
+                raise ValueError('u and y must have the same number of samples and batch shape')
+        nb = int(prod(batch))
+        if zi is None:
+            z = self.predzeros(k, nb)
+        else:
+            z = zi
+        zf = list(z)
+        # Innovations e = D/C (A y - B/F u)
+        e = y
+        if self.A is not None:
+            e, zf[0] = self.A(y, z[0])
+        if self.G is not None:
+            x, zf[1] = self.G(u, z[1])
+            e = e - x
+        if self.Hinv is not None:
+            e, zf[2] = self.Hinv(e, z[2])
+        # k-step ahead prediction, y - (h0 + h1 q^{-1} + ... + h(k-1) q^{-k+1}) e
+        if k == 1:
+            yp = y - e
+        else:
+            if k not in self._hk:
+                self._hk[k] = firbank(self.markov(k))
+            eh, zf[3] = self._hk[k](e, z[3])
+            yp = y - eh
+        yp = yp.reshape(yp.shape[0:2] + batch)
+        return yp if zi is None else (yp, zf)
@@ -7,71 +7,263 @@ Module for Instrumental Variables methods
 """
 
 #%% imports
-from numpy import arange, array, append, copy, count_nonzero, ones,\
-delete, dot, empty, sum, size, amax, matrix, concatenate, shape, zeros, kron,\
-eye, reshape, convolve, sqrt, where, nonzero, correlate, equal, ndarray, pi, \
-absolute, exp, log, real
-from scipy.linalg import qr, solve, toeplitz
+from numpy import absolute, amax, array, asarray, concatenate, empty, float64, ones, poly, real,\
+    roots, shape, sum, where, zeros
 from numpy.linalg import matrix_rank
-from scipy.signal import lfilter, periodogram
-from scipy.optimize import leastsq, least_squares
-import numpy.fft as fft
+from scipy.linalg import inv, qr, solve
+from ..io.check import chckin
+from ..io.iddata import lagview
+from .models import polymodel
+from .solvers import ls, qrsol
+from .trace import count, lfilter
 #%% functions
-__all__ = ['iv']
+__all__ = ['iv', 'riv']
 #%% Implementations
-def iv(na, nb, nk, u, y, y2):
-    '''
-    :param na: number of zeros from A;
-    :param nb: number of poles from B;
-    :param u: input signal;
-    :param y: output signal;
-    :param y2:
-    :param nk: output signal delay;
-    :return: coefficients of A and B in this order;
-    '''
-    # Number of samples
-    N = size(y)
+def iv(na, nb, nk, u, y=None, y2=None, check=True):
+    """
+    Estimates an ARX model structure
+        A(q) y(t) = B(q) u(t) + e(t)
+    with the instrumental variables method, using the instrument signal
+    y2(t) (e.g. the output of an auxiliary model) in place of the outputs
+    in the instruments. Each output i is estimated from the regressors
+        phi_i(t) = [-y_j(t-1), ..., -y_j(t-na_ij), u_j(t-nk_ij), ..., u_j(t-nk_ij-nb_ij)]
+    and the instruments z_i(t), the same regressors with y2 instead of y.
+    With the QR factorization Z_i = Q_i R_i of the instrument matrix, the
+    IV equations Z_i^T Phi_i theta_i = Z_i^T y_i are solved as
+        (Q_i^T Phi_i) theta_i = Q_i^T y_i
+
+    Parameters
+    ----------
+    na : array_like
+        Array of integers (ny x ny) with the orders of A(q).
+    nb : array_like
+        Array of integers (ny x nu) with the orders of B(q).
+    nk : array_like
+        Array of integers (ny x nu) with the time delays.
+    u : array_like or iddata
+        Input data array or an iddata object with the input and output data.
+    y : array_like, optional
+        Output data array. Not used when u is an iddata object.
+    y2 : array_like
+        Instrument signal (N x ny).
+    check : bool, optional
+        If True (default), raises an error when the experiment is not
+        informative (rank deficient IV equations). It may be disabled when
+        the data is known to be informative, to skip two small SVDs per
+        output.
+    Returns
+    -------
+    m : polymodel
+        Estimated model, with the asymptotic covariance of the parameters.
+    """
+    if y2 is None:
+        raise ValueError('The instrument y2 must be provided')
+    # Transform everything in array for use with numpy
+    na, nb, _, _, _, nk, u, y = chckin(na, nb, [], [], [], nk, u, y)
+    Ny, ny = shape(y)
+    Nu, nu = shape(u)
+    y2 = asarray(y2, dtype=float64).reshape((-1, ny))
     # Vetors u, y and y2 must have same amount of samples
-    if (N != size(u)) or (N != size(y2)):
+    if (Ny != Nu) or (Ny != y2.shape[0]):
         raise ValueError('Y, Y2 and U must have same length!')
-    # Number of coefficients to be estimated
-    # (a_1, a_2, a_3,..., a_na, b_0, b_1, b_2, b_nb)
-    M = na + nb + 1
-    # Delay maximum needed
-    n_max = amax([na, nb + nk])
-    # In order to estimate the coeffiecients, we will need to delay the samples.
+    # Maximum lag
+    L = amax([amax(na), amax(nb + nk)])
     # If the maximum order is greater than the number of samples,
     # then it will not be possible!
-    if not (N - n_max > 0):
-        raise ValueError('Number of samples should be greater' &
-                         'than the maximum order!')
-    # Build matrix phi in which will contain y and u shifted in time
-    phi = zeros((N - n_max, M))
-    # Build matrix csi in which will contain y2 and u shifted in time
-    csi = zeros((N - n_max, M))
-    k = 0
-    # Fill phi/csi with y/y2 shifted in time from 0 to nb
-    for i in range(1, na + 1):
-        phi[:, k] = -y[n_max - i:N - i]
-        csi[:, k] = -y2[n_max - i:N - i]
-        k = k + 1
-    # Fill phi/csi with u shifted in time from 0 to nb
-    for i in range(nk, nb + nk + 1):
-        phi[:, k] = u[n_max - i:N - i]
-        csi[:, k] = u[n_max - i:N - i]
-        k = k + 1
-    # Crop y from n_max to N
-    y = y[n_max:N]
-    # Find theta
-    R = dot(csi.T, phi)
-    # If the experiment is not informative:
-    if (matrix_rank(R) < M):
-        raise ValueError('Experiment is not informative')
-    S = dot(csi.T, y)
-    theta = solve(R, S)
-    # Split theta in vectors a and b
-    a = theta[0:na]
-    b = theta[na:na + nb + 1]
-    return [a, b]
+    if not (Ny - L > 0):
+        raise ValueError('Number of samples should be greater than the maximum order!')
+    A = empty((ny, ny), dtype='object')
+    B = empty((ny, nu), dtype='object')
+    da = sum(na)
+    db = sum(nb + 1)
+    a = []
+    b = []
+    P = zeros((da + db, da + db))
+    e = zeros((Ny - L, ny))
+    ka, kb = 0, da
+    for i in range(ny):
+        # Regressors and instruments, from strided lag views
+        ylags = [(j, lagview(y[:, j], L, na[i, j], 1), lagview(y2[:, j], L, na[i, j], 1))
+                 for j in range(ny) if na[i, j] > 0]
+        ulags = [lagview(u[:, j], L, nb[i, j]+1, nk[i, j]) for j in range(nu) if nb[i, j] > -1]
+        phi = concatenate([-x for _, x, _ in ylags] + ulags, axis=1)
+        csi = concatenate([-x for _, _, x in ylags] + ulags, axis=1)
+        d = phi.shape[1]
+        theta, QP = _ivsolve(phi, csi, y[L:, i], check)
+        e[:, i] = y[L:, i] - phi @ theta
+        # Asymptotic covariance, sig (Z^T Phi)^-1 Z^T Z (Phi^T Z)^-1
+        G = inv(QP)
+        nai = sum(na[i])
+        rows = list(range(ka, ka + nai)) + list(range(kb, kb + d - nai))
+        P[array(rows)[:, None], array(rows)] = (e[:, i] @ e[:, i])/(Ny - L)*(G @ G.T)
+        # Polynomials
+        k = 0
+        for j in range(ny):
+            A[i, j] = concatenate(([float(i == j)], theta[k:k+na[i, j]]))
+            k += na[i, j]
+        for j in range(nu):
+            B[i, j] = concatenate((zeros(nk[i, j]), theta[k:k+nb[i, j]+1]))
+            k += nb[i, j] + 1
+        a += theta[0:nai].tolist()
+        b += theta[nai:].tolist()
+        ka += nai
+        kb += d - nai
+    # Model
+    m = polymodel('iv', A, B, None, None, None, nk, da+db, (u, y), nu, ny, 1)
+    m.setcov(sum(e**2)/Ny, P, (e.T @ e)/Ny)
+    m.setparameters(array(a + b))
+    return m
+
+def riv(nb, nf, nk, u, y=None, nd=0, maxiter=20, tol=1e-6, check=True):
+    """
+    Estimates the transfer function model
+        y_i(t) = sum_j B_ij(q)/F_ij(q) u_j(t) + 1/D_i(q) e_i(t)
+    with the refined instrumental variable method. Starting from a least
+    squares estimate, each iteration
+        - simulates the noise-free output x_ij = B_ij/F_ij u_j of each path,
+          used as instrument;
+        - prefilters the output (without the other paths), the input and the
+          instrument with the current D_i/F_ij;
+        - solves the IV equations of the path (see iv) and, if nd > 0,
+          fits the AR noise model D_i to the output error.
+    The paths of an output are updated one at a time (backfitting) and the
+    iterations stop when the parameters change less than tol. With nd = 0
+    this is the simplified refined IV (SRIV) method for output error models.
+    The regressor and instrument matrices are one buffer, filled in place
+    by all the paths and iterations.
+
+    Parameters
+    ----------
+    nb : array_like
+        Array of integers (ny x nu) with the orders of B(q).
+    nf : array_like
+        Array of integers (ny x nu) with the orders of F(q).
+    nk : array_like
+        Array of integers (ny x nu) with the time delays.
+    u : array_like or iddata
+        Input data array or an iddata object with the input and output data.
+    y : array_like, optional
+        Output data array. Not used when u is an iddata object.
+    nd : int or array_like, optional
+        Order of the AR noise model of each output. Default is 0 (white
+        output error).
+    maxiter : int, optional
+        Maximum number of iterations. Default is 20.
+    tol : float, optional
+        Tolerance on the largest (relative) change of the parameters.
+        Default is 1e-6.
+    check : bool, optional
+        Raises an error when the IV equations are rank deficient. Default
+        is True.
+    Returns
+    -------
+    m : polymodel
+        Estimated model, with the covariance of the parameters [b, f, d].
+    """
+    # Transform everything in array for use with numpy
+    _, nb, _, _, nf, nk, u, y = chckin([], nb, [], [], nf, nk, u, y)
+    Ny, ny = shape(y)
+    Nu, nu = shape(u)
+    nd = asarray(nd, dtype=int).ravel()*ones(ny, dtype=int)
+    L = int(amax([amax(nf), amax(nb + nk), amax(nd)]))
+    d = nf + nb + 1
+    # Regressor and instrument buffers
+    phi = empty((Ny - L, amax(d)))
+    csi = empty((Ny - L, amax(d)))
+    B = empty((ny, nu), dtype='object')
+    F = empty((ny, nu), dtype='object')
+    D = empty((ny, 1), dtype='object')
+    e = zeros((Ny, ny))
+    blocks = []
+    for i in range(ny):
+        # Initial estimate, least squares for each path
+        yn = y[:, i:i+1].copy()
+        x = zeros((Ny, nu))
+        for j in range(nu):
+            a, b = ls(nf[i, j], nb[i, j], nk[i, j], u[:, j:j+1], yn)
+            F[i, j] = _stable(concatenate(([1], a)))
+            B[i, j] = concatenate((zeros(nk[i, j]), b))
+            x[:, j] = lfilter(B[i, j], F[i, j], u[:, j])
+            yn[:, 0] -= x[:, j]
+        D[i, 0] = array([1.])
+        for it in range(maxiter):
+            change = 0
+            for j in range(nu):
+                k, dij = nf[i, j], d[i, j]
+                # Prefiltered output of the path, input and instrument
+                yf, uf, xf = lfilter(D[i, 0], F[i, j], (y[:, i] - x.sum(axis=1) + x[:, j], u[:, j], x[:, j]))
+                phi[:, 0:k] = -lagview(yf, L, k, 1)
+                csi[:, 0:k] = -lagview(xf, L, k, 1)
+                phi[:, k:dij] = lagview(uf, L, nb[i, j]+1, nk[i, j])
+                csi[:, k:dij] = phi[:, k:dij]
+                theta = _ivsolve(phi[:, 0:dij], csi[:, 0:dij], yf[L:], check)[0]
+                f = _stable(concatenate(([1], theta[0:k])))
+                b = concatenate((zeros(nk[i, j]), theta[k:]))
+                new = concatenate((f, b))
+                old = concatenate((F[i, j], B[i, j]))
+                change = max(change, amax(absolute(new - old))/max(1, amax(absolute(old))))
+                F[i, j], B[i, j] = f, b
+                x[:, j] = lfilter(b, f, u[:, j])
+            # Noise model
+            if nd[i] > 0:
+                v = y[:, i] - x.sum(axis=1)
+                dd = _stable(concatenate(([1], qrsol(-lagview(v, nd[i], nd[i], 1), v[nd[i]:, None])[0])))
+                change = max(change, amax(absolute(dd - D[i, 0]))) if D[i, 0].size == dd.size else 1
+                D[i, 0] = dd
+            if change < tol:
+                break
+        # Innovations and instruments of the final estimate
+        v = y[:, i] - x.sum(axis=1)
+        e[:, i] = lfilter(D[i, 0], [1], v)
+        zb, zf = [], []
+        for j in range(nu):
+            uf, xf = lfilter(D[i, 0], F[i, j], (u[:, j], x[:, j]))
+            zb.append(lagview(uf, L, nb[i, j]+1, nk[i, j]))
+            zf.append(-lagview(xf, L, nf[i, j], 1))
+        zd = [-lagview(v, L, nd[i], 1)]
+        blocks.append((concatenate(zb + zf, axis=1), concatenate(zd, axis=1)))
+    # Covariance of the parameters [b, f, d]: sig (Z^T Z)^-1 for each output
+    db, df, dd = sum(nb + 1), sum(nf), sum(nd)
+    P = zeros((db + df + dd, db + df + dd))
+    kb, kf, kd = 0, db, db + df
+    for i, (Z, V) in enumerate(blocks):
+        sig = (e[L:, i] @ e[L:, i])/(Ny - L)
+        nbi, nfi = sum(nb[i] + 1), sum(nf[i])
+        rows = array(list(range(kb, kb + nbi)) + list(range(kf, kf + nfi)), dtype=int)
+        P[rows[:, None], rows] = sig*inv(Z.T @ Z)
+        if nd[i] > 0:
+            P[kd:kd+nd[i], kd:kd+nd[i]] = sig*inv(V.T @ V)
+        kb, kf, kd = kb + nbi, kf + nfi, kd + nd[i]
+    # Model
+    m = polymodel('riv', None, B, None, D if dd > 0 else None, F, nk, db+df+dd, (u, y), nu, ny, 1)
+    m.setcov(sum(e**2)/Ny, P, (e.T @ e)/Ny)
+    m.setparameters(array([c for i in range(ny) for j in range(nu) for c in B[i, j][nk[i, j]:]] +
+                          [c for i in range(ny) for j in range(nu) for c in F[i, j][1:]] +
+                          [c for i in range(ny) for c in D[i, 0][1:]]))
+    return m
 
 #%% Auxiliary Functions
+def _ivsolve(phi, csi, y, check=True):
+    """
+    Solves the IV equations csi^T phi theta = csi^T y through the QR
+    factorization csi = Q R, as (Q^T phi) theta = Q^T y. Returns theta and
+    Q^T phi.
+    """
+    d = phi.shape[1]
+    Q, R = qr(csi, mode='economic')
+    count('qr')
+    QP = Q.T @ phi
+    # If the experiment is not informative: Z^T Phi = R^T Q^T Phi is singular
+    if check and (matrix_rank(R) < d or matrix_rank(QP) < d):
+        raise ValueError('Experiment is not informative')
+    return solve(QP, Q.T @ y), QP
+
+def _stable(p):
+    """Reflects the roots of the monic polynomial p outside the unit circle."""
+    if p.size < 2:
+        return p
+    r = roots(p)
+    if (absolute(r) < 1).all():
+        return p
+    r = where(absolute(r) > 1, 1/r.conj(), r)
+    return real(poly(r))
@@ -3,46 +3,26 @@
 """
 #%%
 # Imports
-from numpy import log
+from numpy import absolute, angle, arange, array, asarray, concatenate, empty, eye, float64,\
+log, ndindex, ones, prod, unwrap, zeros
+from numpy.linalg import solve
 from pysid.io.print import print_model
+from pysid.io.iddata import iddata
+from .filters import _batch, modelfilters, polyfreq, polymatrix, ssbank
+from .predictor import predictor
 # Classes
-class polymodel():
+class basemodel():
     """
-    This model represents a general linear polynomial model as follows
-        A(q) y(t) = B(q) / F(q) u(t) + C(q)/ D(q) e(t) 
+    Methods shared by the polynomial models (polymodel and compactmodel).
+    The models must provide the polynomials A, B, C, D and F, the number
+    of samples N used in the estimation and the attributes set by setcov.
     """
-
-    # Initialization
-    def __init__(self, name, A, B, C, D, F, delay, nparam, data, nu, ny, ts):
-        self.name = name
-        self.A = A
-        self.B = B
-        self.C = C
-        self.D = D
-        self.F = F
-        self.delay = delay
-        self.nparam = nparam
-        self.data = data
-        self.nu = nu
-        self.ny = ny
-        self.ts = ts
-
-        # TODO: Ensure that setcov() is always called in pemethod.py
-        self.parameters = None
-        self.ecov = None
-        self.residuals = None
-        self.M = None
+    __slots__ = ()
 
     # Iterable
     def __iter__(self):
         return (i for i in (self.A, self.B, self.C, self.D, self.F))
 
-    def __repr__(self):
-        polymodelname = type(self).__name__
-        s = '{}({!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r})'\
-            .format(polymodelname, self.name, self.A, self.B, self.C, self.D, self.F, self.delay, 'data', self.nu, self.ny, self.ts)
-        return s
-
     def __str__(self):
         print('A ' + self.name + ' model')
         print_model(self,only_polynomials=True)
@@ -68,7 +48,7 @@ class polymodel():
         if J is None:
             J = self.costfunction
         if N is None:
-            N = len(self.data[0])
+            N = self.N
         if p is None:
             p = self.nparam
         self.Jaic = N*log(J) + 2*p
@@ -78,7 +58,7 @@ class polymodel():
         if J is None:
             J = self.costfunction
         if N is None:
-            N = len(self.data[0])
+            N = self.N
         if p is None:
             p = self.nparam
         self.Jaicn = log(J) + 2*p/N
@@ -88,11 +68,197 @@ class polymodel():
         if J is None:
             J = self.costfunction
         if N is None:
-            N = len(self.data[0])
+            N = self.N
         if p is None:
             p = self.nparam
         self.Jaicc =  N*log(J) + 2*p + 2*p*(p + 1)/(N - p - 1)
 
+    def setbic(self, J=None, N=None, p=None):
+        """Sets the Bayesian information criterion"""
+        if J is None:
+            J = self.costfunction
+        if N is None:
+            N = self.N
+        if p is None:
+            p = self.nparam
+        self.Jbic = N*log(J) + p*log(N)
+
+    def setfpe(self, J=None, N=None, p=None):
+        """Sets Akaike's final prediction error"""
+        if J is None:
+            J = self.costfunction
+        if N is None:
+            N = self.N
+        if p is None:
+            p = self.nparam
+        self.Jfpe = J*(N + p)/(N - p)
+
+    def filters(self):
+        """
+        Returns the compiled filter form of the model (see filters.py). It is
+        built on the first call and reused afterwards, so the polynomials
+        should not be changed once the model is used for simulation.
+        """
+        if getattr(self, '_filters', None) is None:
+            self._filters = modelfilters(self)
+        return self._filters
+
+    def initstate(self, k=None, batch=()):
+        """
+        Returns the zero initial state of simulate (k = None) or of the
+        k-step ahead predict, for a batch of trajectories with shape batch.
+        """
+        nb = int(prod(batch))
+        if k is None:
+            return self.filters().simzeros(nb)
+        return self.filters().predzeros(k, nb)
+
+    def simulate(self, u, e=None, zi=None):
+        """
+        Simulates the model
+            A(q) y(t) = B(q)/F(q) u(t) + C(q)/D(q) e(t)
+        for one or a batch of input (and noise) trajectories. All the
+        outputs and trajectories are computed in one pass over the data.
+
+        Parameters
+        ----------
+        u : array_like or iddata
+            Input signal (N x nu), or a batch of input signals (N x nu x ...).
+            Not used by time series models.
+        e : array_like, optional
+            Noise signal (N x ny), or a batch (N x ny x ...). Default is no noise.
+        zi : list, optional
+            Initial state, as returned by initstate or by a previous call.
+            Default is zero initial state.
+        Returns
+        -------
+        y : ndarray
+            Simulated output (N x ny x ...).
+        zf : list
+            Final state, only returned if zi is given.
+        """
+        if isinstance(u, iddata):
+            u = u.u
+        return self.filters().simulate(u, e, zi)
+
+    def predict(self, u, y=None, k=1, zi=None):
+        """
+        Computes the k-step ahead prediction of the output
+            y(t|t-k) = y(t) - (h0 + h1 q^{-1} + ... + h(k-1) q^{-k+1}) e(t)
+        where hl are the Markov parameters of the noise model inv(A) C/D and
+        e(t) = D/C (A y(t) - B/F u(t)) are the innovations.
+
+        Parameters
+        ----------
+        u : array_like or iddata
+            Input signal (N x nu), or a batch (N x nu x ...), or an iddata
+            object with the input and output signals. Not used by time
+            series models.
+        y : array_like, optional
+            Output signal (N x ny), or a batch (N x ny x ...). Not used when
+            u is an iddata object.
+        k : int, optional
+            Prediction horizon. Default is 1.
+        zi : list, optional
+            Initial state, as returned by initstate(k) or by a previous call.
+            Default is zero initial state.
+        Returns
+        -------
+        yp : ndarray
+            Predicted output (N x ny x ...).
+        zf : list
+            Final state, only returned if zi is given.
+        """
+        if isinstance(u, iddata):
+            u, y = u.u, u.y
+        return self.filters().predict(u, y, k, zi)
+
+    def save(self, filename):
+        """Saves the model in a .npz file, see store.save_model."""
+        # Deferred import, store.py depends on this module
+        from .store import save_model
+        save_model(self, filename)
+
+    def predictor(self, k=1):
+        """
+        Returns a stateful k-step ahead predictor object of the model, that
+        advances one sample at a time (see predictor.py).
+        """
+        return predictor(self, k)
+
+    def freqresp(self, w=None, nw=512):
+        """
+        Evaluates the frequency responses of the model
+            G(q) = inv(A(q)) B(q)/F(q),   H(q) = inv(A(q)) C(q)/D(q)
+        at q = exp(j w ts). The polynomials are evaluated all at once (see
+        polyfreq) and inv(A) is applied with a batched solve over the grid.
+
+        Parameters
+        ----------
+        w : array_like, optional
+            Frequencies in rad/s. Default is a uniform grid of nw points in
+            [0, pi/ts), evaluated with the FFT.
+        nw : int, optional
+            Number of points of the default grid. Default is 512.
+        Returns
+        -------
+        w : ndarray
+            Frequency grid (nw).
+        G : ndarray
+            Complex response (nw x ny x nu) from the inputs to the outputs,
+            None for time series models.
+        H : ndarray
+            Complex response (nw x ny x ny) from the noise to the outputs.
+        """
+        ny = self.ny
+        Ms = [None if P is None else polymatrix(P) for P in self]
+        w, Ps = polyfreq([M for M in Ms if M is not None], w, nw, self.ts)
+        A, B, C, D, F = [None if M is None else Ps.pop(0) for M in Ms]
+        # Diagonal noise model C/D
+        h = ones((w.size, ny), dtype=complex)
+        if C is not None:
+            h *= C[:, :, 0]
+        if D is not None:
+            h /= D[:, :, 0]
+        H = zeros((w.size, ny, ny), dtype=complex)
+        H[:, arange(ny), arange(ny)] = h
+        G = None
+        if B is not None:
+            G = B if F is None else B/F
+        if A is not None and not (Ms[0]*(1 - eye(ny))).any():
+            # Diagonal A(q)
+            a = A[:, arange(ny), arange(ny)].reshape((-1, ny, 1))
+            H = H/a
+            if G is not None:
+                G = G/a
+        elif A is not None:
+            # One batched solve for both responses
+            if G is None:
+                H = solve(A, H)
+            else:
+                GH = solve(A, concatenate((G, H), axis=2))
+                G, H = GH[:, :, 0:self.nu], GH[:, :, self.nu:]
+        return w, G, H
+
+    def bode(self, w=None, nw=512):
+        """
+        Returns the magnitude and the (unwrapped) phase, in radians, of the
+        frequency response G(q) of the model (see freqresp).
+
+        Returns
+        -------
+        w : ndarray
+            Frequency grid (nw).
+        mag : ndarray
+            Magnitude (nw x ny x nu).
+        phase : ndarray
+            Phase (nw x ny x nu).
+        """
+        w, G, _ = self.freqresp(w, nw)
+        if G is None:
+            raise ValueError('The model has no inputs')
+        return w, absolute(G), unwrap(angle(G), axis=0)
+
     def gen_poly_string(self, P, dim, name):
         """
         Generates a string for displaying a MIMO polynomial model.
@@ -199,4 +365,355 @@ class polymodel():
 
         model_str = model_str + "\n________________________________________________________\n"
 
-        return model_str
\ No newline at end of file
+        return model_str
+
+
+class polymodel(basemodel):
+    """
+    This model represents a general linear polynomial model as follows
+        A(q) y(t) = B(q) / F(q) u(t) + C(q)/ D(q) e(t) 
+    """
+
+    # Initialization
+    def __init__(self, name, A, B, C, D, F, delay, nparam, data, nu, ny, ts, N=None):
+        self.name = name
+        self.A = A
+        self.B = B
+        self.C = C
+        self.D = D
+        self.F = F
+        self.delay = delay
+        self.nparam = nparam
+        self.data = data
+        self.nu = nu
+        self.ny = ny
+        self.ts = ts
+        # Number of samples, used by the information criteria
+        if N is None and data is not None:
+            N = len(data[0])
+        self.N = N
+
+        # TODO: Ensure that setcov() is always called in pemethod.py
+        self.parameters = None
+        self.ecov = None
+        self.residuals = None
+        self.M = None
+        # Records of the estimation (see trace.trace), if it was traced
+        self.trace = None
+
+    def __repr__(self):
+        polymodelname = type(self).__name__
+        s = '{}({!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r})'\
+            .format(polymodelname, self.name, self.A, self.B, self.C, self.D, self.F, self.delay, 'data', self.nu, self.ny, self.ts)
+        return s
+
+    def compact(self, keepdata=False):
+        """
+        Returns a compactmodel with the same polynomials and accuracy
+        information. The training data is only kept if keepdata is True.
+        """
+        m = compactmodel(self.name, self.A, self.B, self.C, self.D, self.F,
+                         self.delay, self.nparam, self.nu, self.ny, self.ts, self.N,
+                         self.data if keepdata else None)
+        for attr in ('parameters', 'ecov', 'P', 'costfunction', 'Jaic', 'Jaicn', 'Jaicc', 'Jbic',
+                     'Jfpe'):
+            if hasattr(self, attr):
+                setattr(m, attr, getattr(self, attr))
+        return m
+
+
+
+class compactmodel(basemodel):
+    """
+    Memory efficient representation of the polynomial model
+        A(q) y(t) = B(q) / F(q) u(t) + C(q)/ D(q) e(t)
+    The coefficients of all the polynomials are stored in one flat float
+    array (coef), and _ptr holds the offsets of each polynomial into coef,
+    such that the polynomials of A, B, C, D and F (row major) are
+        coef[_ptr[k]:_ptr[k+1]], k = 0, 1, ...
+    The attributes A, B, C, D and F are rebuilt on access as object arrays
+    of read-only views of coef. The instances have no __dict__ and do not
+    keep the training data unless it is explicitly given. It is usually
+    created from an estimated model with polymodel.compact().
+
+    Parameters
+    ----------
+    name : string
+        Model structure name.
+    A, B, C, D, F : ndarray of ndarray
+        Polynomials of the model, None for the ones not in the structure.
+    delay : ndarray
+        Time delays of the model.
+    nparam : int
+        Number of estimated parameters.
+    nu : int
+        Number of inputs.
+    ny : int
+        Number of outputs.
+    ts : float
+        Sample time.
+    N : int
+        Number of samples used in the estimation.
+    data : tuple, optional
+        Training data (u, y). Default is None, the data is not retained.
+    """
+    __slots__ = ('name', 'coef', '_ptr', '_shape', 'delay', 'nparam', 'data',
+                 'nu', 'ny', 'ts', 'N', 'parameters', 'ecov', 'P', 'costfunction',
+                 'Jaic', 'Jaicn', 'Jaicc', 'Jbic', 'Jfpe', '_filters')
+
+    # Initialization
+    def __init__(self, name, A, B, C, D, F, delay, nparam, nu, ny, ts, N, data=None):
+        self.name = name
+        polys = []
+        shape = []
+        for X in (A, B, C, D, F):
+            if X is None:
+                shape.append(None)
+                continue
+            X = asarray(X, dtype=object)
+            shape.append(X.shape)
+            polys += [asarray(X[i], dtype=float64).ravel() for i in ndindex(X.shape)]
+        self._shape = tuple(shape)
+        self._ptr = array([0] + [p.size for p in polys]).cumsum()
+        self.coef = concatenate(polys) if polys else empty(0)
+        self.coef.flags.writeable = False
+        self.delay = delay
+        self.nparam = nparam
+        self.data = data
+        self.nu = nu
+        self.ny = ny
+        self.ts = ts
+        self.N = N
+        self.parameters = None
+        self.ecov = None
+
+    @classmethod
+    def fromarrays(cls, name, coef, ptr, shape, delay, nparam, nu, ny, ts, N):
+        """
+        Creates a model from its flat representation without copying coef
+        (e.g. a view of a memory-mapped file). shape is a (5 x 2) integer
+        array with the shapes of A, B, C, D and F, -1 for the missing ones.
+        """
+        m = cls.__new__(cls)
+        m.name = name
+        m._shape = tuple(None if s[0] < 0 else tuple(int(d) for d in s if d >= 0) for s in shape)
+        m._ptr = ptr
+        m.coef = coef
+        if m.coef.flags.writeable:
+            m.coef.flags.writeable = False
+        m.delay = delay
+        m.nparam = nparam
+        m.data = None
+        m.nu = nu
+        m.ny = ny
+        m.ts = ts
+        m.N = N
+        m.parameters = None
+        m.ecov = None
+        return m
+
+    def __repr__(self):
+        return '{}({!r}, nparam={}, nu={}, ny={}, ts={}, N={})'\
+            .format(type(self).__name__, self.name, self.nparam, self.nu, self.ny, self.ts, self.N)
+
+    def _poly(self, k):
+        """Rebuilds the k-th polynomial matrix (A, B, C, D, F) as views of coef."""
+        shape = self._shape[k]
+        if shape is None:
+            return None
+        # Position of the first polynomial of the matrix in _ptr
+        start = sum(int(prod(s)) for s in self._shape[0:k] if s is not None)
+        P = empty(shape, dtype=object)
+        for n, i in enumerate(ndindex(shape)):
+            P[i] = self.coef[self._ptr[start+n]:self._ptr[start+n+1]]
+        return P
+
+    A = property(lambda self: self._poly(0))
+    B = property(lambda self: self._poly(1))
+    C = property(lambda self: self._poly(2))
+    D = property(lambda self: self._poly(3))
+    F = property(lambda self: self._poly(4))
+
+
+class ssmodel():
+    """
+    Linear state space model in the innovations form
+        x(t+1) = A x(t) + B u(t) + K e(t)
+          y(t) = C x(t) + D u(t) + e(t)
+    where e(t) is white noise with covariance Re. Its one step ahead
+    predictor is the steady state Kalman filter
+        x(t+1|t) = (A - KC) x(t|t-1) + (B - KD) u(t) + K y(t)
+        y(t|t-1) = C x(t|t-1) + D u(t)
+    Both are compiled once into block state space filters (ssbank), so
+    that long records and batches of trajectories are filtered with a few
+    matrix products. The models of a system with process and measurement
+    noises are built with accr.kalman.
+
+    Parameters
+    ----------
+    A : ndarray
+        State matrix (n x n).
+    B : ndarray
+        Input matrix (n x nu), None for time series.
+    C : ndarray
+        Output matrix (ny x n).
+    D : ndarray, optional
+        Feedthrough matrix (ny x nu). Default is zero.
+    K : ndarray, optional
+        Kalman gain (n x ny). Default is zero (output error model).
+    Re : ndarray, optional
+        Covariance of the innovations (ny x ny).
+    X : ndarray, optional
+        Solution of the Riccati equation, the covariance of the error of
+        x(t|t-1).
+    ts : float, optional
+        Sample time. Default is 1.
+    name : string, optional
+        Model structure name. Default is 'ss'.
+    """
+
+    def __init__(self, A, B, C, D=None, K=None, Re=None, X=None, ts=1, name='ss'):
+        self.name = name
+        self.A = asarray(A, dtype=float64).reshape((len(A), -1))
+        self.nx = self.A.shape[0]
+        self.C = asarray(C, dtype=float64).reshape((-1, self.nx))
+        self.ny = self.C.shape[0]
+        self.B = zeros((self.nx, 0)) if B is None else asarray(B, dtype=float64).reshape((self.nx, -1))
+        self.nu = self.B.shape[1]
+        self.D = zeros((self.ny, self.nu)) if D is None else asarray(D, dtype=float64).reshape((self.ny, self.nu))
+        self.K = zeros((self.nx, self.ny)) if K is None else asarray(K, dtype=float64).reshape((self.nx, self.ny))
+        self.Re = Re
+        self.X = X
+        self.ts = ts
+        self._filters = None
+
+    def __repr__(self):
+        return '{}({!r}, nx={}, nu={}, ny={}, ts={})'\
+            .format(type(self).__name__, self.name, self.nx, self.nu, self.ny, self.ts)
+
+    def filters(self):
+        """
+        Returns the compiled simulation and predictor filters of the model.
+        They are built on the first call and reused afterwards, so the
+        matrices should not be changed once the model is used.
+        """
+        if self._filters is None:
+            A, B, C, D, K = self.A, self.B, self.C, self.D, self.K
+            ny = self.ny
+            sim = ssbank(A, concatenate((B, K), axis=1), C, concatenate((D, eye(ny)), axis=1))
+            pred = ssbank(A - K @ C, concatenate((B - K @ D, K), axis=1), C,
+                          concatenate((D, zeros((ny, ny))), axis=1))
+            self._filters = (sim, pred)
+        return self._filters
+
+    def initstate(self, batch=()):
+        """Returns the zero initial state (n x nb) for a batch with shape batch."""
+        return zeros((self.nx, int(prod(batch))))
+
+    def polys(self):
+        """
+        Returns the polynomials [A, B, C, D, F] of the model in the general
+        form of pemethod.pem
+            A(q) y(t) = B(q)/F(q) u(t) + C(q)/D(q) e(t)
+        with A = I, e.g. to refine a subspace estimate with pem(*m.polys(), u, y).
+        All the paths have the characteristic polynomial of the state matrix
+        as denominator (F_ij = D_i = det(I - A q^-1)), and the noise model
+        keeps the diagonal of H(q) = I + C (qI - A)^-1 K, exact for single
+        output models.
+        """
+        # Deferred imports
+        from scipy.signal import ss2tf
+        ny, nu = self.ny, self.nu
+        P = [empty((ny, ny), dtype=object), empty((ny, nu), dtype=object),
+             empty((ny, 1), dtype=object), empty((ny, 1), dtype=object),
+             empty((ny, nu), dtype=object)]
+        for j in range(nu):
+            num, den = ss2tf(self.A, self.B, self.C, self.D, input=j)
+            for i in range(ny):
+                P[1][i, j] = num[i]
+                # Exact delay of the paths without feedthrough
+                if self.D[i, j] == 0:
+                    P[1][i, j][0] = 0
+                P[4][i, j] = den
+        for i in range(ny):
+            num, den = ss2tf(self.A, self.K, self.C, eye(ny), input=i)
+            P[2][i, 0] = num[i]
+            P[2][i, 0][0] = 1
+            P[3][i, 0] = den
+            for j in range(ny):
+                P[0][i, j] = array([float(i == j)])
+        return P
+
+    def _signals(self, u, x, nx, name):
+        # Stacks u and x as the (N x nu+nx x nb) input of the filters
+        x, batch = _batch(x, nx, name)
+        if self.nu == 0:
+            return concatenate((zeros((x.shape[0], 0, x.shape[2])), x), axis=1), batch
+        u, b = _batch(u, self.nu, 'u')
+        if (u.shape[0], b) != (x.shape[0], batch):
+            raise ValueError('u and ' + name + ' must have the same number of samples and batch shape')
+        return concatenate((u, x), axis=1), batch
+
+    def simulate(self, u, e=None, zi=None):
+        """
+        Simulates the model for one or a batch of input (and noise) trajectories.
+
+        Parameters
+        ----------
+        u : array_like or iddata
+            Input signal (N x nu), or a batch (N x nu x ...). Not used by
+            time series models.
+        e : array_like, optional
+            Innovations (N x ny), or a batch (N x ny x ...). Default is no noise.
+        zi : ndarray, optional
+            Initial state, as returned by initstate or by a previous call.
+            Default is zero initial state.
+        Returns
+        -------
+        y : ndarray
+            Simulated output (N x ny x ...).
+        zf : ndarray
+            Final state, only returned if zi is given.
+        """
+        if isinstance(u, iddata):
+            u = u.u
+        if e is None:
+            if self.nu == 0:
+                raise ValueError('An input (u) or noise (e) signal must be provided')
+            u = asarray(u, dtype=float64)
+            e = zeros(u.shape[0:1] + (self.ny,) + u.shape[2:])
+        w, batch = self._signals(u, e, self.ny, 'e')
+        y, zf = self.filters()[0](w, zi)
+        y = y.reshape(y.shape[0:2] + batch)
+        return y if zi is None else (y, zf)
+
+    def predict(self, u, y=None, zi=None):
+        """
+        Computes the one step ahead prediction y(t|t-1) of the output with
+        the steady state Kalman filter of the model.
+
+        Parameters
+        ----------
+        u : array_like or iddata
+            Input signal (N x nu), or a batch (N x nu x ...), or an iddata
+            object with the input and output signals. Not used by time
+            series models.
+        y : array_like, optional
+            Output signal (N x ny), or a batch (N x ny x ...). Not used when
+            u is an iddata object.
+        zi : ndarray, optional
+            Initial state, the prediction x(0|-1), as returned by initstate
+            or by a previous call. Default is zero.
+        Returns
+        -------
+        yp : ndarray
+            Predicted output (N x ny x ...).
+        zf : ndarray
+            Final state, only returned if zi is given.
+        """
+        if isinstance(u, iddata):
+            u, y = u.u, u.y
+        w, batch = self._signals(u, y, self.ny, 'y')
+        yp, zf = self.filters()[1](w, zi)
+        yp = yp.reshape(yp.shape[0:2] + batch)
+        return yp if zi is None else (yp, zf)
@@ -0,0 +1,239 @@
+"""
+    Monte Carlo estimates of the uncertainty of the parameters. The model is
+    refitted with the same estimator and orders on replicate datasets,
+    generated by resampling its residuals (bootstrap) or by simulating its
+    noise model, and the empirical distribution of the estimates
+    complements the asymptotic covariance m.P.
+"""
+
+# Imports
+from concurrent.futures import Executor
+from functools import partial
+from numpy import array, asarray, atleast_2d, cov, empty, float64, ndarray, percentile, size,\
+    sqrt, zeros
+from numpy.linalg import cholesky
+from numpy.random import default_rng
+from ..io.iddata import iddata
+from .models import compactmodel
+from .multistart import _map
+from .pemethod import armax, arx, bj, fir, oe
+
+# Variables
+__all__ = ['montecarlo', 'mcresult']
+
+
+# Functions
+def _orders(X, lead=1):
+    """Returns the orders of the polynomials X (object array), their lengths minus lead."""
+    X = asarray(X, dtype=object)
+    n = empty(X.shape, dtype=int)
+    for i in range(X.shape[0]):
+        for j in range(X.shape[1]):
+            n[i, j] = size(X[i, j]) - lead
+    return n
+
+
+def _estimator(m, warm=True):
+    """
+    Returns the estimator of the model m with its orders and delays, as a
+    picklable callable fit(u, y). The orders are read from the lengths of
+    the polynomials. The iterative estimators (armax, oe and bj) are warm
+    started from the parameters of m if warm is True.
+    """
+    nk = asarray(m.delay)
+    init = {'init': m.parameters} if warm else {}
+    if m.name == 'fir':
+        return partial(fir, _orders(m.B) - nk, nk)
+    if m.name == 'arx':
+        return partial(arx, _orders(m.A), _orders(m.B) - nk, nk)
+    if m.name == 'armax':
+        return partial(armax, _orders(m.A), _orders(m.B) - nk, _orders(m.C), nk, **init)
+    if m.name == 'oe':
+        return partial(oe, _orders(m.B) - nk, _orders(m.F), nk, **init)
+    if m.name == 'boxjenkins':
+        return partial(bj, _orders(m.B) - nk, _orders(m.C), _orders(m.D), _orders(m.F), nk,
+                       **init)
+    raise ValueError('montecarlo supports the fir, arx, armax, oe and bj models, '
+                     'not {}'.format(m.name))
+
+
+def _replicates(model, fit, method, L, seed, reps, u, e):
+    """
+    Refits the replicates reps and returns their parameters (len(reps) x p).
+    The output of the replicate r is simulated by model from u and the
+    noise drawn by a generator seeded with (seed, r): the rows of the
+    residuals e sampled with replacement ('bootstrap'), or white noise
+    with the covariance L L^T ('simulate').
+    """
+    N = u.shape[0]
+    theta = empty((len(reps), model.nparam))
+    for k, r in enumerate(reps):
+        rng = default_rng([seed, r])
+        if method == 'bootstrap':
+            v = e[rng.integers(0, N, N)]
+        else:
+            v = rng.standard_normal((N, L.shape[0])) @ L.T
+        theta[k] = fit(u, model.simulate(u, v)).parameters
+    return theta
+
+
+def _shared(name, shape, nu, model, fit, method, L, seed, reps):
+    """
+    _replicates in a worker process, on the input and residuals stored in
+    the shared memory block name (N x (nu + ne) float64 array).
+    """
+    # Deferred imports
+    from multiprocessing.shared_memory import SharedMemory
+    shm = SharedMemory(name=name)
+    data = ndarray(shape, dtype=float64, buffer=shm.buf)
+    try:
+        return _replicates(model, fit, method, L, seed, reps, data[:, 0:nu], data[:, nu:])
+    finally:
+        # The views must be released before the block is closed
+        data = None
+        shm.close()
+
+
+def montecarlo(m, u=None, y=None, replicates=100, method='bootstrap', seed=0, workers=1,
+               batch=8, warm=True):
+    """
+    Estimates the distribution of the parameters of the model m by Monte
+    Carlo: replicate datasets with the input u are generated from m,
+        y_r(t) = B/(A F) u(t) + C/(A D) e_r(t),  r = 0, ..., replicates-1
+    and m is refitted on each one with the same estimator, orders and
+    delays (fir, arx, armax, oe or bj). The noise e_r(t) is:
+        - 'bootstrap': the residuals of m on the data (u, y), centered and
+          resampled with replacement (the outputs of a sample are kept
+          together, so the correlation between the outputs is preserved);
+        - 'simulate': white gaussian noise with the covariance m.ecov, as
+          in io.gen_data.
+    The noise of the replicate r is drawn from a generator seeded with
+    (seed, r), so the result only depends on seed, not on the workers.
+    With a process pool, u and the residuals are stored once in shared
+    memory, and each task only receives the model and batch replicate
+    numbers.
+
+    Parameters
+    ----------
+    m : polymodel or compactmodel
+        Estimated model, with its parameters.
+    u : array_like or iddata, optional
+        Input data array (N x nu) or an iddata object with the input and
+        output data. Default is the training data of m.
+    y : array_like, optional
+        Output data array (N x ny), used by 'bootstrap' for the residuals.
+        Not used when u is an iddata object.
+    replicates : int, optional
+        Number of replicate datasets, at least 2. Default is 100.
+    method : string, optional
+        'bootstrap' (default) or 'simulate'.
+    seed : int, optional
+        Seed of the noise of the replicates. Default is 0.
+    workers : int or Executor, optional
+        Number of worker processes, or an executor of concurrent.futures.
+        Default is 1, the replicates are refitted sequentially.
+    batch : int, optional
+        Number of replicates of each task of the workers. Default is 8.
+    warm : bool, optional
+        Starts the minimizations of armax, oe and bj from the parameters
+        of m. Default is True.
+    Returns
+    -------
+    r : mcresult
+        Parameters of the replicates and their statistics.
+    """
+    if method not in ('bootstrap', 'simulate'):
+        raise ValueError("method must be 'bootstrap' or 'simulate'")
+    if replicates < 2:
+        raise ValueError('At least 2 replicates are needed for the covariance')
+    if isinstance(u, iddata):
+        u, y = u.u, u.y
+    elif u is None:
+        if m.data is None:
+            raise ValueError('The model has no training data, u and y must be given')
+        u, y = m.data
+    u = array(u, dtype=float64, ndmin=2)
+    if u.shape[0] == 1:
+        u = u.T
+    fit = _estimator(m, warm)
+    # Model without the training data, sent to the workers
+    model = compactmodel(m.name, m.A, m.B, m.C, m.D, m.F, m.delay, m.nparam, m.nu, m.ny, m.ts,
+                         m.N)
+    N, nu = u.shape
+    L = None
+    if method == 'bootstrap':
+        if y is None:
+            raise ValueError('The bootstrap needs the output data y')
+        y = array(y, dtype=float64, ndmin=2)
+        if y.shape[0] == 1:
+            y = y.T
+        e = y - model.predict(u, y)
+        e -= e.mean(axis=0)
+    else:
+        L = cholesky(atleast_2d(m.ecov))
+        e = zeros((N, 0))
+    reps = range(replicates)
+    if not isinstance(workers, Executor) and workers <= 1:
+        theta = _replicates(model, fit, method, L, seed, reps, u, e)
+        return mcresult(theta, m.parameters, method)
+    # Deferred imports
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing.shared_memory import SharedMemory
+    # Input and residuals in shared memory, one block for all the tasks
+    shape = (N, nu + e.shape[1])
+    shm = SharedMemory(create=True, size=N*shape[1]*8)
+    pool = workers
+    try:
+        data = ndarray(shape, dtype=float64, buffer=shm.buf)
+        data[:, 0:nu], data[:, nu:] = u, e
+        data = None
+        tasks = [(shm.name, shape, nu, model, fit, method, L, seed, reps[k:k+batch])
+                 for k in range(0, replicates, batch)]
+        if not isinstance(workers, Executor):
+            pool = ProcessPoolExecutor(min(workers, len(tasks)))
+        theta = _map(_shared, tasks, pool)
+    finally:
+        if pool is not workers:
+            pool.shutdown()
+        shm.close()
+        shm.unlink()
+    return mcresult(array([t for block in theta for t in block]), m.parameters, method)
+
+
+# Classes
+class mcresult():
+    """
+    Parameters estimated by montecarlo:
+        theta     (R x p) estimates, one row per replicate
+        estimate  parameters of the original model
+        mean      mean of the estimates
+        cov       sample covariance of the estimates, to be compared with
+                  the asymptotic covariance m.P
+        std       standard deviations of the estimates
+        bias      mean - estimate
+        method    'bootstrap' or 'simulate'
+    """
+
+    # Initialization
+    def __init__(self, theta, estimate, method):
+        self.theta = theta
+        self.estimate = asarray(estimate, dtype=float64)
+        self.method = method
+        self.mean = theta.mean(axis=0)
+        self.cov = atleast_2d(cov(theta, rowvar=False))
+        self.std = sqrt(self.cov.diagonal())
+        self.bias = self.mean - self.estimate
+
+    def __repr__(self):
+        return '{}({!r}, replicates={}, nparam={})'.format(type(self).__name__, self.method,
+                                                           *self.theta.shape)
+
+    def interval(self, level=0.95):
+        """
+        Returns the percentile confidence intervals (p x 2) of the
+        parameters at the given level, from the quantiles of the estimates.
+        """
+        if not 0 < level < 1:
+            raise ValueError('level must be between 0 and 1')
+        q = 50*(1 - level)
+        return percentile(self.theta, [q, 100 - q], axis=0).T
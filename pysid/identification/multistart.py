@@ -0,0 +1,209 @@
+"""
+    Multi-start minimization of the prediction errors of a model structure
+    (see structure.polystruct), for the nonconvex oe, bj and pem problems.
+"""
+
+# Imports
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextvars import copy_context
+from numpy import absolute, amax, arange, arctanh, array_equal, ascontiguousarray, clip,\
+    concatenate, empty, float64, ones, tanh, zeros
+from numpy.random import default_rng
+from ..io.iddata import lagview
+from .ivmethod import _stable
+from .solvers import ls, qrsol
+from .trace import NOTRACE, lfilter
+
+# Variables
+__all__ = ['multistart']
+
+# Size of the random perturbations of the candidates (see _perturb)
+SPREAD = 1.0
+
+
+# Functions
+def _map(fn, tasks, workers=1):
+    """
+    Returns [fn(*t) for t in tasks], computed by a pool of threads (workers
+    is their number) or by an executor of concurrent.futures. The tasks run
+    by threads are run in a copy of the context of the caller, so that they
+    are counted by its traces (see trace.count).
+    """
+    if isinstance(workers, ThreadPoolExecutor):
+        futures = [workers.submit(copy_context().run, fn, *t) for t in tasks]
+        return [f.result() for f in futures]
+    if isinstance(workers, Executor):
+        futures = [workers.submit(fn, *t) for t in tasks]
+        return [f.result() for f in futures]
+    if workers > 1 and len(tasks) > 1:
+        with ThreadPoolExecutor(min(workers, len(tasks))) as pool:
+            futures = [pool.submit(copy_context().run, fn, *t) for t in tasks]
+            return [f.result() for f in futures]
+    return [fn(*t) for t in tasks]
+
+
+def _fitrow(s, i, theta, u, y, method, maxfev):
+    """
+    Minimizes the prediction errors of the output i of the structure s,
+    from the parameters theta and with at most maxfev evaluations (None for
+    no limit), and returns the least_squares result.
+    """
+    # Deferred imports
+    from scipy.optimize import least_squares
+    return least_squares(s.residuals, theta, jac=s.jacobian, method=method, max_nfev=maxfev,
+                         args=(i, u, y))
+
+
+def _reflection(p):
+    """Returns the reflection coefficients of the monic polynomial p (step-down recursion)."""
+    k = empty(p.size - 1)
+    for m in range(p.size - 1, 0, -1):
+        k[m-1] = p[m]
+        p = ((p - k[m-1]*p[::-1])/(1 - k[m-1]**2))[0:m]
+    return k
+
+
+def _monic(k):
+    """Returns the monic polynomial of the reflection coefficients k (step-up recursion)."""
+    p = ones(1)
+    for km in k:
+        p = concatenate((p, [0])) + km*concatenate(([0], p[::-1]))
+    return p
+
+
+def _perturb(s, i, theta, rng):
+    """
+    Returns a random perturbation of the parameters theta of the output i of
+    s. The monic polynomials (A_ii, C, D and F) with all their coefficients
+    free are stabilized and perturbed through their reflection coefficients,
+        k <- tanh(atanh(k) + SPREAD v),  v ~ N(0, I)
+    so that they remain stable; the other coefficients are perturbed as
+        theta <- theta + SPREAD (|theta| + 0.1) v
+    """
+    theta = theta.copy()
+    done = zeros(theta.size, dtype=bool)
+    for n, j, cols, lags in s._groups[i]:
+        monic = n in (2, 3, 4) or (n == 0 and j[0] == j[1])
+        if monic and array_equal(lags, arange(1, lags.size + 1)):
+            k = _reflection(_stable(concatenate(([1], theta[cols]))))
+            k = tanh(arctanh(clip(k, -0.99, 0.99)) + SPREAD*rng.standard_normal(k.size))
+            theta[cols] = _monic(k)[1:]
+            done[cols] = True
+    v = rng.standard_normal(theta.size)
+    theta[~done] += SPREAD*(absolute(theta[~done]) + 0.1)*v[~done]
+    return theta
+
+
+def _reduced(nb, nf, nk, u, y, n=None):
+    """
+    Returns the initial guesses B and F (ny x nu object arrays) of the paths
+    u_j -> y_i reduced from a high order ARX model of each output: the paths
+    x_ij = B_ij/A_i u_j of the ARX model are simulated, and B_ij/F_ij is fitted
+    by least squares to the noise free x_ij. The order n of the ARX model is
+    by default 10, or three times the largest order of the paths.
+    """
+    ny, nu = y.shape[1], u.shape[1]
+    if n is None:
+        n = max(10, 3*int(amax(nf + nb + 1)))
+    L = n + int(amax(nk))
+    B = empty((ny, nu), dtype=object)
+    F = empty((ny, nu), dtype=object)
+    for i in range(ny):
+        phi = concatenate([-lagview(y[:, i], L, n, 1)] +
+                          [lagview(u[:, j], L, n, nk[i, j]) for j in range(nu)], axis=1)
+        theta = qrsol(phi, y[L:, i:i+1])[0]
+        a = _stable(concatenate(([1], theta[0:n])))
+        for j in range(nu):
+            x = lfilter(concatenate((zeros(nk[i, j]), theta[n*(j+1):n*(j+2)])), a, u[:, j])
+            f, b = ls(nf[i, j], nb[i, j], nk[i, j], u[:, j:j+1], x[:, None])
+            F[i, j] = _stable(concatenate(([1], f)))
+            B[i, j] = concatenate((zeros(nk[i, j]), b))
+    return B, F
+
+
+def multistart(s, u, y, guesses=(), starts=8, refine=2, maxfev=10, seed=0, method='lm', workers=1,
+               trace=NOTRACE):
+    """
+    Minimizes the prediction errors of each output of the structure s from
+    several initial guesses, and leaves the best solution in s:
+        - the candidates of the output i are its coefficients in s, the ones
+          of the other guesses and random stable perturbations of them,
+          starts in total;
+        - a truncated minimization (at most maxfev evaluations) is run from
+          each candidate;
+        - the refine candidates with the lowest cost are minimized to
+          convergence, and the best one is kept.
+    The minimizations of all the outputs and candidates are independent and
+    are dispatched to the workers like in pemethod. The perturbations of the
+    output i are drawn from a generator seeded with (seed, i), so that the
+    result only depends on seed, not on the workers.
+
+    Parameters
+    ----------
+    s : polystruct
+        Model structure, with the initial guess.
+    u : ndarray
+        Input data array (N x nu).
+    y : ndarray
+        Output data array (N x ny).
+    guesses : list, optional
+        Other initial guesses, as lists [A, B, C, D, F] of polynomials with the
+        orders of s (None keeps the polynomials of s). Default is none.
+    starts : int, optional
+        Number of candidates of each output. Default is 8.
+    refine : int, optional
+        Number of candidates of each output minimized to convergence.
+        Default is 2.
+    maxfev : int, optional
+        Number of evaluations of the truncated minimizations. Default is 10.
+    seed : int, optional
+        Seed of the random perturbations. Default is 0.
+    method : string, optional
+        least_squares method. Default is 'lm'.
+    workers : int or Executor, optional
+        Number of threads, or an executor of concurrent.futures. Default is
+        1, the minimizations are run sequentially.
+    trace : trace, optional
+        Records the time of the truncated minimizations (stage 'trials')
+        and the results of the best candidates. Default is NOTRACE.
+    Returns
+    -------
+    sols : list
+        The least_squares results of the best candidate of each output.
+    """
+    # One channel per row, contiguous for the filters
+    uT = ascontiguousarray(u.T, dtype=float64)
+    yT = ascontiguousarray(y.T, dtype=float64)
+    rows = [i for i in range(s.ny) if s.rows[i].stop > s.rows[i].start]
+    refine = min(refine, starts)
+    # Parameters of the guesses
+    bases = [s.theta]
+    for g in guesses:
+        c = s.copy()
+        c.setpolys(*g)
+        bases.append(c.theta)
+    bases = bases[0:starts]
+    # Truncated minimizations from all the candidates, each one on a copy of
+    # the structure since the candidates of an output write the same row
+    tasks = []
+    for i in rows:
+        rng = default_rng([seed, i])
+        cands = [b[s.rows[i]] for b in bases]
+        for k in range(len(bases), starts):
+            cands.append(_perturb(s, i, bases[k % len(bases)][s.rows[i]], rng))
+        tasks += [(s.copy(), i, theta, uT, yT, method, maxfev) for theta in cands]
+    trials = _map(_fitrow, tasks, workers)
+    trace.stage('trials')
+    # Minimizations of the best candidates of each output
+    tasks = []
+    for k, i in enumerate(rows):
+        best = sorted(trials[k*starts:(k+1)*starts], key=lambda sol: sol.cost)[0:refine]
+        tasks += [(s.copy(), i, sol.x, uT, yT, method, None) for sol in best]
+    final = _map(_fitrow, tasks, workers)
+    sols = []
+    for k, i in enumerate(rows):
+        sol = min(final[k*refine:(k+1)*refine], key=lambda sol: sol.cost)
+        s.scatter(sol.x, i)
+        trace.solve(i, sol)
+        sols.append(sol)
+    return sols
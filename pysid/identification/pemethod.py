@@ -3,15 +3,20 @@
 """
 
 # Imports
+from concurrent.futures import Executor
 from numpy import arange, array, append, copy, count_nonzero,\
-delete, dot, empty, sum, size, amax, concatenate, shape, zeros, kron,\
-eye, reshape, convolve, where, equal, ndarray, floor
-from scipy.linalg import toeplitz, inv
-from scipy.signal import lfilter
-from scipy.optimize import least_squares
-from .solvers import ls, qrsol
+delete, dot, empty, sum, size, amax, concatenate, shape, zeros,\
+eye, reshape, convolve, where, equal, ndarray, floor, ascontiguousarray, float64, asarray,\
+ndindex, ones
+from scipy.linalg import inv, norm
+from .solvers import ls, nesol, qrsol
 from ..io.check import chckin
-from .models import polymodel
+from ..io.iddata import iddata, lagview
+from .ivmethod import riv
+from .models import compactmodel, polymodel
+from .multistart import _map, _reduced, multistart
+from .structure import polystruct
+from .trace import NOTRACE, lfilter, traced
 
 # functions
 __all__ = ['fir', 'arx', 'armax', 'oe', 'bj', 'pem']
@@ -111,7 +116,142 @@ def sortmat(A):
                 Ao[i,j] = A[i,j+1]
     return Ao
 
-def fir(nb, nk, u, y):
+def _unitpolys(shape, identity=False):
+    """
+    Returns an object array of order 0 polynomials, 1 (or the identity
+    matrix, 1 on the diagonal and 0 elsewhere, if identity is True).
+    """
+    P = empty(shape, dtype='object')
+    for i in range(shape[0]):
+        for j in range(shape[1]):
+            P[i, j] = array([float(i == j or not identity)])
+    return P
+
+def _initial(init, blocks):
+    """
+    Returns the initial polynomials given by init, a previous model
+    (polymodel or compactmodel) or its parameter vector, as a dict of
+    object arrays. blocks lists (name, n, lead) in the order of the
+    parameters: the polynomial i of name is lead(i) followed by n[i] free
+    coefficients. The orders of the model must be the ones of blocks.
+    """
+    theta = None
+    if not isinstance(init, (polymodel, compactmodel)):
+        theta = asarray(init, dtype=float64).ravel()
+    P = {}
+    k = 0
+    for name, n, lead in blocks:
+        X = empty(n.shape, dtype=object)
+        Y = None if theta is not None else getattr(init, name)
+        if Y is not None:
+            Y = asarray(Y, dtype=object)
+        for i in ndindex(n.shape):
+            c = lead(i)
+            if theta is not None:
+                X[i] = concatenate((c, theta[k:k+n[i]]))
+            elif Y is None or Y.shape != n.shape or size(Y[i]) != c.size + n[i]:
+                raise ValueError('The orders of {} in init do not match the structure'.format(name))
+            else:
+                X[i] = array(Y[i], dtype=float64).ravel()
+            k += n[i]
+        P[name] = X
+    if theta is not None and theta.size != k:
+        raise ValueError('init must have {} parameters'.format(k))
+    return P
+
+def _information(psi, isig, ny, chunk=65536):
+    """
+    Returns sum_t psi_t^T isig psi_t over the (ny x d) blocks psi_t of the
+    rows of psi, one block per sample, accumulated in float64 over chunks
+    of samples (psi may be stored in float32).
+    """
+    d = psi.shape[1]
+    M = zeros((d, d))
+    for k in range(0, psi.shape[0], chunk*ny):
+        P = psi[k:k+chunk*ny].astype(float64, copy=False)
+        M += P.T @ (isig @ P.reshape((-1, ny, d))).reshape(P.shape)
+    return M
+
+def _solverow(s, i, u, y, method, trace=NOTRACE):
+    """
+    Minimizes the prediction errors of the output i of the structure s,
+    with u (nu x N) and y (ny x N), and returns the least_squares result.
+    Only the coefficients of the row i are written, so that the outputs
+    can be solved concurrently on the same structure.
+    """
+    # Deferred imports
+    from scipy.optimize import least_squares
+    return least_squares(trace.residuals(s.residuals, i), s.coef[s.free[s.rows[i]]],
+                         jac=s.jacobian, method=method, args=(i, u, y))
+
+def _pemsolve(s, u, y, method='lm', joint=False, workers=1, trace=NOTRACE):
+    """
+    Minimizes the prediction errors of a precompiled structure s (see
+    structure.polystruct), starting from its current coefficients, and
+    leaves the solution in s, with the analytic Jacobian of the structure.
+    The outputs are solved one at a time or, if joint is True, all at once:
+    the residuals of all the outputs are stacked, the Jacobian is the block
+    diagonal operator of the Jacobians of the outputs (each output only
+    depends on its row of polynomials) and the trust region steps are
+    solved with lsmr, so that the cost grows linearly with ny.
+    The problems of the outputs are independent, and may be dispatched to
+    a pool of threads (the filters release the GIL) or to any executor of
+    concurrent.futures, e.g. a ProcessPoolExecutor.
+
+    Parameters
+    ----------
+    s : polystruct
+        Model structure, with the initial guess.
+    u : ndarray
+        Input data array (N x nu).
+    y : ndarray
+        Output data array (N x ny).
+    method : string, optional
+        least_squares method. Default is 'lm' ('trf' for joint problems).
+    joint : bool, optional
+        Solves one problem for all the outputs. Default is False.
+    workers : int or Executor, optional
+        Number of threads used to solve the outputs, or an executor.
+        Default is 1, the outputs are solved sequentially.
+    trace : trace, optional
+        Records the cost of each evaluation (not with an executor) and the
+        results of the minimizations. Default is NOTRACE.
+    Returns
+    -------
+    sols : list
+        The least_squares results, one per output or one for the joint problem.
+    """
+    # Deferred imports
+    from scipy.optimize import least_squares
+    # One channel per row, contiguous for the filters
+    uT = ascontiguousarray(u.T, dtype=float64)
+    yT = ascontiguousarray(y.T, dtype=float64)
+    theta = s.theta
+    if s.nparam == 0:
+        return []
+    if joint and s.ny > 1:
+        # Scaling of the variables from the column norms of the initial
+        # Jacobian (x_scale='jac' is not available for linear operators)
+        scale = concatenate([norm(s.jacobian(theta[r], i, uT, yT), axis=0)
+                             for i, r in enumerate(s.rows)])
+        scale[scale == 0] = 1
+        sol = least_squares(trace.residuals(s.stacked, None), theta, jac=s.stacked_jacobian,
+                            x_scale=1/scale, method='trf' if method == 'lm' else method,
+                            tr_solver='lsmr', args=(uT, yT))
+        s.scatter(sol.x)
+        trace.solve(None, sol)
+        return [sol]
+    rows = [i for i in range(0, s.ny) if s.rows[i].stop > s.rows[i].start]
+    # The evaluations are not recorded in the executors (other processes)
+    t = NOTRACE if isinstance(workers, Executor) else trace
+    sols = _map(_solverow, [(s, i, uT, yT, method, t) for i in rows], workers)
+    for i, sol in zip(rows, sols):
+        s.scatter(sol.x, i)
+        trace.solve(i, sol)
+    return sols
+
+@traced
+def fir(nb, nk, u, y=None, dtype=float64, trace=None):
     """
     Estimates a FIR model based on input (u(t)) and output (y(t)) vectors.
     Returns the polynomial B(q) relative to the MIMO FIR model with nu inputs
@@ -124,10 +264,18 @@ def fir(nb, nk, u, y):
         Array of integers (ny x nu) that represents the polynomial orders for B(q).
     nk : array_like
         Array of integers (ny x nu) that represents the model's time delay.
-    u : array_like
-        Input data array.
-    y : array_like
-        Output data array.
+    u : array_like or iddata
+        Input data array or an iddata object with the input and output data.
+    y : array_like, optional
+        Output data array. Not used when u is an iddata object.
+    dtype : data-type, optional
+        Data type of the regressors. With float32 the regressors take half
+        the memory, the normal equations are accumulated in float64 (see
+        solvers.nesol). Default is float64.
+    trace : trace, optional
+        Records the time of each stage and the number of QR factorizations
+        (see trace.trace). It is attached to the model as m.trace. Default
+        is None.
     Returns
     -------
     B : ndarray
@@ -140,21 +288,25 @@ def fir(nb, nk, u, y):
     Nu, nu = shape(u)
     nbk = nb + nk
     L = amax(nbk)
-    Iny = eye(ny)
     db = sum(sum(nb+1))
     #d = da + db
-    phiu = zeros(((Nu-L)*ny, db))
+    phiu = zeros(((Nu-L)*ny, db), dtype=dtype)
     k = 0;
-    # Input regressors
+    # Input regressors (the rows of the output i are i, i+ny, ...)
     for i in range(0, ny):
         for j in range(0, nu):
             if (nb[i, j] > -1):
-                phiu[:, k:k+nb[i, j]+1] = kron(toeplitz(u[L-nk[i, j]:Nu-nk[i, j], j], u[L-nk[i, j]-nb[i, j]:L-nk[i, j]+1, j][::-1]), Iny[:, i:i+1])
+                phiu[i::ny, k:k+nb[i, j]+1] = lagview(u[:, j], L, nb[i, j]+1, nk[i, j])
                 k += nb[i, j] + 1
+    trace.stage('regressors')
     # Solve the Ls problem
-    phi = copy(phiu)
-    y = reshape(y[L:Ny, :], ((Ny-L)*ny, 1))
-    theta, V, R = qrsol(phi, y)
+    phi = phiu
+    yL = reshape(y[L:Ny, :], ((Ny-L)*ny, 1))
+    if phi.dtype == float64:
+        theta, V, R = qrsol(phi, yL)
+    else:
+        theta, V, e = nesol(phi, yL)
+    trace.stage('solve')
     b = theta[0:]
     # Output
     B = empty((ny, nu), dtype='object')
@@ -166,22 +318,24 @@ def fir(nb, nk, u, y):
     # Model
     m = polymodel('fir', None, B, None, None, None, nk, db, (u, y), nu, ny, 1)
     # Estimate the noise
-    e = y - dot(phiu, theta.reshape((db, 1)))
+    if phi.dtype == float64:
+        e = yL - dot(phiu, theta.reshape((db, 1)))
     # Reshape e
     e = e.reshape(((Nu-L), ny))
     # Get the noise covariace
     sig = dot(e.T, e)/Ny
     # Estimate the parameter covariance
     isig = inv(sig)
-    M = zeros((db, db))
-    for k in range(0, phi.shape[0], ny):
-        M += phi[k:k+ny, :].T @ isig @ phi[k:k+ny, :]
+    M = _information(phi, isig, ny)
     M = M/Ny
     # Set model parameters
     m.setcov(V**2/Ny, inv(M)/Ny, sig)
+    m.setparameters(array(b.tolist()))
+    trace.stage('covariance')
     return m
 
-def arx(na, nb, nk, u, y, opt=0):
+@traced
+def arx(na, nb, nk, u, y=None, opt=0, dtype=float64, trace=None):
     """
     Estimates an ARX model based on input (u(t)) and output (y(t)) vectors.
     Returns the polynomials A(q) and B(q) relative to the MIMO ARX model with
@@ -197,10 +351,18 @@ def arx(na, nb, nk, u, y, opt=0):
         Array of integers (ny x nu) that represents the polynomial orders for B(q).
     nk : array_like
         Array of integers (ny x nu) that represents the model's time delay.
-    u : array_like
-        Input data array.
-    y : array_like
-        Output data array.
+    u : array_like or iddata
+        Input data array or an iddata object with the input and output data.
+    y : array_like, optional
+        Output data array. Not used when u is an iddata object.
+    dtype : data-type, optional
+        Data type of the regressors. With float32 the regressors take half
+        the memory, the normal equations are accumulated in float64 (see
+        solvers.nesol). Default is float64.
+    trace : trace, optional
+        Records the time of each stage and the number of QR factorizations
+        (see trace.trace). It is attached to the model as m.trace. Default
+        is None.
     Returns
     -------
     A : ndarray
@@ -218,31 +380,34 @@ def arx(na, nb, nk, u, y, opt=0):
     # MIMO case
     A = empty((ny, ny), dtype='object')
     B = empty((ny, nu), dtype='object')
-    Iny = eye(ny)
     da = sum(sum(na))
     db = sum(sum(nb+1))
     #d = da + db
-    phiy = zeros(((Ny-L)*ny, da))
-    phiu = zeros(((Nu-L)*ny, db))
+    phi = zeros(((Ny-L)*ny, da + db), dtype=dtype)
+    phiy, phiu = phi[:, 0:da], phi[:, da:]
     ka = 0
     kb = 0
-    # Output regressors and Input Regressors
+    # Output regressors and Input Regressors (the rows of the output i are
+    # i, i+ny, ...)
     for i in range(0, ny):
         # Input
         for j in range(0, nu):
             if (nb[i, j] > -1):
-                phiu[:, kb:kb+nb[i, j]+1] = kron(toeplitz(u[L-nk[i, j]:Nu-nk[i, j], j], u[L-nk[i, j]-nb[i, j]:L-nk[i, j]+1, j][::-1]), Iny[:, i:i+1])
+                phiu[i::ny, kb:kb+nb[i, j]+1] = lagview(u[:, j], L, nb[i, j]+1, nk[i, j])
                 kb += nb[i, j] + 1
         # Output
         for j in range(0, ny):
             if (na[i, j] > 0):
-                phiy[:, ka:ka+na[i,j]] = kron(-toeplitz(y[L-1:-1, j], y[L-na[i, j]:L, j][::-1]),Iny[:, i:i+1])
+                phiy[i::ny, ka:ka+na[i,j]] = -lagview(y[:, j], L, na[i, j], 1)
                 ka += na[i,j]
+    trace.stage('regressors')
     # Solve the Ls problem
-    phi = concatenate((phiy, phiu), axis=1)
-    yo = copy(y)
-    y = reshape(y[L:Ny, :], ((Ny-L)*ny, 1))
-    theta, V, R = qrsol(phi, y)
+    yL = reshape(y[L:Ny, :], ((Ny-L)*ny, 1))
+    if phi.dtype == float64:
+        theta, V, R = qrsol(phi, yL)
+    else:
+        theta, V, e = nesol(phi, yL)
+    trace.stage('solve')
     a = theta[0:da]
     b = theta[da:da+db+1]
     # Prepare the results
@@ -260,18 +425,22 @@ def arx(na, nb, nk, u, y, opt=0):
             ka += na[i, j]
     # Model
     m = polymodel('arx', A, B, None, None, None, nk, da+db, (u, y), nu, ny, 1)
-    e = (filtmat(A, yo) - filtmat(B, u))[L:Ny, 0:ny]
+    # The residuals are computed from the regressors (no filtering needed)
+    if phi.dtype == float64:
+        e = yL - dot(phi, theta.reshape((da + db, 1)))
+    e = e.reshape((Ny-L, ny))
     sig = (e.T @ e)/Ny
     isig = inv(sig)
-    M = zeros((da + db, da + db))
-    for k in range(0, phi.shape[0], ny):
-        M += phi[k:k+ny, :].T @ isig @ phi[k:k+ny, :]
+    M = _information(phi, isig, ny)
     M /= Ny # phi.T @ inv(sig) @ phi
     m.setcov(V**2/Ny, inv(M)/Ny, sig)
     m.setparameters(array(a.tolist() + b.tolist()))
+    trace.stage('covariance')
     return m
 
-def armax(na, nb, nc, nk, u, y):
+@traced
+def armax(na, nb, nc, nk, u, y=None, joint=False, workers=1, init=None, dtype=float64,
+          trace=None):
     """
     Estimates an ARMAX model based on input (u(t)) and output (y(t)) vectors.
     Returns the polynomials A(q), B(q) and C(q) relative to the MIMO ARMAX
@@ -289,10 +458,31 @@ def armax(na, nb, nc, nk, u, y):
         Array of integers (ny x 1) that represents the polynomial orders for C(q).
     nk : array_like
         Array of integers (ny x nu) that represents the model's time delay.
-    u : array_like
-        Input data array.
-    y : array_like
-        Output data array.
+    u : array_like or iddata
+        Input data array or an iddata object with the input and output data.
+    y : array_like, optional
+        Output data array. Not used when u is an iddata object.
+    joint : bool, optional
+        Estimates all the outputs in one optimization problem, with the
+        sparse (block diagonal) Jacobian. Default is False, one problem
+        per output.
+    workers : int or Executor, optional
+        Number of threads used to estimate the outputs in parallel, or an
+        executor of concurrent.futures (e.g. a ProcessPoolExecutor).
+        Default is 1.
+    init : polymodel, compactmodel or array_like, optional
+        Initial guess, e.g. the model of a previous fit with the same
+        orders, or its parameter vector [a, b, c]. The high order ARX
+        initialization is skipped. Default is None.
+    dtype : data-type, optional
+        Data type of the gradient of the prediction errors. It only affects
+        the covariance of the parameters (P), the minimization always runs
+        in float64. With float32 the gradient takes half the memory, the
+        information matrix is accumulated in float64. Default is float64.
+    trace : trace, optional
+        Records the time of each stage, the results of the minimizations
+        and the number of filters and QR factorizations (see trace.trace).
+        It is attached to the model as m.trace. Default is None.
     Returns
     -------
     A : ndarray
@@ -310,76 +500,50 @@ def armax(na, nb, nc, nk, u, y):
     da = sum(sum(na))
     db = sum(sum(nb+1))
     dc = sum(sum(nc))
-    # Define the prediction error
-    def pe(theta, na, nb, nc, nk, u, y):
-        Ny, ny = shape(y)
-        Nu, nu = shape(u)
-        A = theta[0:sum(na)]
-        ao = append([1], A[0:na[0]])
-        #b = append(zeros((1, nk)), theta[sum(na):sum(na)+nb+1])
-        c = append([1], theta[sum(na)+sum(nb+1):sum(na)+sum(nb+1)+nc[0]+1])
-        e = lfilter(ao, c, y[:,0], axis=0)
-        k = sum(na)
-        for i in range(0, nu):
-            b = append(zeros((1, nk[i])), theta[k:k+nb[i]+1])
-            k = k + nb[i] + 1
-            e -= lfilter(b, c, u[:,i], axis=0)
-        k = na[0]
-        for i in range(1, ny):
-            a = append([0], A[k:k+na[i]])
-            e -= lfilter(a, c, -y[:,i], axis=0)
-            k = k + na[i]
-        return e
     # Initial Guess
-    A = empty((ny, ny), dtype=object)
-    B = empty((ny, nu), dtype=object)
-    C = empty((ny, 1), dtype = object)
-    for i in range(0, ny):
-        A_ = []
-        B_ = []
-        E = copy(y[:,i:i+1])
-        # High order model
-        ho = int(floor((Nu - amax(nk)*(nu+1))/(nu+2)))
-        if(ho > 50):
-            ho = 50
-        mho = arx(ho, [ho,]*nu, [1,]*nu, u, y[:, i:i+1])
-        aho, bho = mho.A, mho.B
-        # Estimate of the prediction errors
-        ehat = lfilter(aho[0][0], [1], y[:, i:i+1], axis=0)
-        for j in range(0, nu):
-            ehat -= lfilter(bho[0][j], [1], u[:, j:j+1], axis=0)
-        # Index
-        index = arange(ny)
-        index = delete(index, i)
-        # Inputs
-        inps = concatenate((y[:, index], u, ehat), axis=1)
-        nkk = array(append([1, ]*len(na[i, index]), append(nk[i, :], 1)), ndmin=2, dtype='int')
-        m_ = arx([na[i, i]], array(append(na[i, index] - 1, append(nb[i, :], nc[i]-1)), ndmin=2), nkk, inps, y[:, i:i+1])
-        A_, BAC = m_.A, m_.B
-        thetai = A_[0][0][1:]
-        for k in range(len(nkk[0])):
-            thetai = append(thetai, BAC[0][k][nkk[0][k]:])
-        # Solve the minimization problem
-        tar = y[0:Ny,i:i+1]
-        tarna = na[i, i].reshape((1,))
-        Y = concatenate((tar, y[0:Ny,index]), axis=1)
-        NA = concatenate((tarna, na[i][index]))
-        sol = least_squares(pe, thetai, args=(NA, nb[i], nc[i], nk[i], u.reshape(Nu, nu), Y.reshape((Ny, ny))))
-        theta = sol.x
-        C[i,0] = append([1], theta[sum(na[i])+sum(nb[i]+1):sum(na[i])+sum(nb[i]+1)+sum(nc[i])+1])
-        k = sum(na[i])
-        for j in range(0, nu):
-            B[i, j] = append(zeros((1, nk[i,j])), theta[k:k+nb[i, j]+1])
-            k += nb[i, j] + 1
-        k = 0
-        for j in range(0, ny):
-            if (j == 0):
-                A[i, j] = append([1], theta[k:k+na[i, j]])
-            else:
-                A[i, j] = append([0], theta[k:k+na[i, j]])
-            k += na[i, j]
-    # Sort A
-    As = sortmat(A)
+    if init is not None:
+        P = _initial(init, [('A', na, lambda i: ones(1) if i[0] == i[1] else zeros(1)),
+                            ('B', nb + 1, lambda i: zeros(nk[i])), ('C', nc, lambda i: ones(1))])
+        A, B, C = P['A'], P['B'], P['C']
+    else:
+        A = empty((ny, ny), dtype=object)
+        B = empty((ny, nu), dtype=object)
+        C = empty((ny, 1), dtype = object)
+        for i in range(0, ny):
+            A_ = []
+            B_ = []
+            # High order model
+            ho = int(floor((Nu - amax(nk)*(nu+1))/(nu+2)))
+            if(ho > 50):
+                ho = 50
+            mho = arx(ho, [ho,]*nu, [1,]*nu, u, y[:, i:i+1])
+            aho, bho = mho.A, mho.B
+            # Estimate of the prediction errors
+            ehat = lfilter(aho[0][0], [1], y[:, i:i+1], axis=0)
+            for j in range(0, nu):
+                ehat -= lfilter(bho[0][j], [1], u[:, j:j+1], axis=0)
+            # Index
+            index = arange(ny)
+            index = delete(index, i)
+            # Inputs
+            inps = concatenate((y[:, index], u, ehat), axis=1)
+            nkk = array(append([1, ]*len(na[i, index]), append(nk[i, :], 1)), ndmin=2, dtype='int')
+            m_ = arx([na[i, i]], array(append(na[i, index] - 1, append(nb[i, :], nc[i]-1)), ndmin=2), nkk, inps, y[:, i:i+1])
+            A_, BAC = m_.A, m_.B
+            # Initial polynomials of the row i (the other outputs are on the
+            # right hand side of the ARX model, with the opposite sign)
+            A[i, i] = A_[0][0]
+            for k, j in enumerate(index):
+                A[i, j] = append([0], -BAC[0][k][1:])
+            for j in range(0, nu):
+                B[i, j] = BAC[0][len(index)+j]
+            C[i, 0] = append([1], BAC[0][-1][1:])
+    # Solve the minimization problem
+    s = polystruct(A, B, C, _unitpolys((ny, 1)), _unitpolys((ny, nu)), ny, nu, nk=nk)
+    trace.stage('initialization')
+    _pemsolve(s, u, y, joint=joint, workers=workers, trace=trace)
+    trace.stage('minimization')
+    As, B, C, _, _ = s.polys()
     # Estimate the prediction error: e(t) = C**-1 (y - G u)
     # Get covariance:
     L = amax([amax(na), amax(nb + nk), amax(nc)])
@@ -398,10 +562,8 @@ def armax(na, nb, nc, nk, u, y):
     # Model
     m = polymodel('armax', As, B, C, None, None, nk, da+db+dc, (u, y), nu, ny, 1)
     # Get filtered signals
-    Iny = eye(ny)
-    psiy = zeros(((Ny-L)*ny, da))
-    psiu = zeros(((Nu-L)*ny, db))
-    psie = zeros(((Ny-L)*ny, dc))
+    psi = zeros(((Ny-L)*ny, da + db + dc), dtype=dtype)
+    psiy, psiu, psie = psi[:, 0:da], psi[:, da:da+db], psi[:, da+db:]
     ka = 0
     kb = 0
     kc = 0
@@ -414,23 +576,20 @@ def armax(na, nb, nc, nk, u, y):
         # Input
         for j in range(0, nu):
             if (nb[i, j] > -1):
-                psiu[:, kb:kb+nb[i, j]+1] = kron(toeplitz(uf[L-nk[i, j]:Nu-nk[i, j], j], uf[L-nk[i, j]-nb[i, j]:L-nk[i, j]+1, j][::-1]), Iny[:, i:i+1])
+                psiu[i::ny, kb:kb+nb[i, j]+1] = lagview(uf[:, j], L, nb[i, j]+1, nk[i, j])
                 kb += nb[i, j] + 1
         # Output
         for j in range(0, ny):
             if (na[i, j] > 0):
-                psiy[:, ka:ka+na[i,j]] = kron(-toeplitz(yf[L-1:-1, j], yf[L-na[i, j]:L, j][::-1]),Iny[:, i:i+1])
+                psiy[i::ny, ka:ka+na[i,j]] = -lagview(yf[:, j], L, na[i, j], 1)
                 ka += na[i,j]
         # Error
         if (nc[i][0] > 0):
-            psie[:, kc:kc+nc[i][0]] = kron(toeplitz(ef[L-1:-1, i], ef[L-nc[i][0]:L, i][::-1]),Iny[:, i:i+1])
+            psie[i::ny, kc:kc+nc[i][0]] = lagview(ef[:, i], L, nc[i][0], 1)
             kc += nc[i][0]
-    psi = concatenate((psiy, psiu, psie), axis=1)
     # Get gradient of the prediction error
-    # Initialize information matrix
-    M = zeros((da + db + dc, da + db + dc))
-    for k in range(0, psi.shape[0], ny):
-        M += psi[k:k+ny, :].T @ isig @ psi[k:k+ny, :]
+    # Information matrix
+    M = _information(psi, isig, ny)
     M /= Ny
     m.M = M
     m.setcov(sig**2, inv(M)/Ny, sig)
@@ -446,9 +605,12 @@ def armax(na, nb, nc, nk, u, y):
         thetac += C[i][0][1:].tolist()
 
     m.setparameters(array(thetaa+thetab+thetac))
+    trace.stage('covariance')
     return m
 
-def oe(nb, nf, nk, u, y):
+@traced
+def oe(nb, nf, nk, u, y=None, workers=1, starts=1, seed=0, init=None, dtype=float64,
+       trace=None):
     """
     Estimates an OE model based on input (u(t)) and output (y(t)) vectors.
     Returns the polynomials B(q) and F(q) relative to the MIMO OE model
@@ -464,10 +626,37 @@ def oe(nb, nf, nk, u, y):
         Array of integers (ny x nu) that represents the polynomial orders for F(q).
     nk : array_like
         Array of integers (ny x nu) that represents the model's time delay.
-    u : array_like
-        Input data array.
-    y : array_like
-        Output data array.
+    u : array_like or iddata
+        Input data array or an iddata object with the input and output data.
+    y : array_like, optional
+        Output data array. Not used when u is an iddata object.
+    workers : int or Executor, optional
+        Number of threads used to estimate the outputs in parallel, or an
+        executor of concurrent.futures (e.g. a ProcessPoolExecutor).
+        Default is 1.
+    starts : int, optional
+        Number of initial guesses of each output (see multistart.multistart):
+        the least squares cascade, the SRIV estimate (see ivmethod.riv), the
+        reduction of a high order ARX model and random stable perturbations
+        of them, in this order: a small starts drops the later candidates
+        (starts=2 uses the first two), which are then not computed.
+        Default is 1, only the least squares cascade.
+    seed : int, optional
+        Seed of the random perturbations. Default is 0.
+    init : polymodel, compactmodel or array_like, optional
+        Initial guess, e.g. the model of a previous fit with the same
+        orders, or its parameter vector [b, f]. The initialization is
+        skipped (and the multi-start candidates are the perturbations of
+        init). Default is None.
+    dtype : data-type, optional
+        Data type of the gradient of the prediction errors. It only affects
+        the covariance of the parameters (P), the minimization always runs
+        in float64. With float32 the gradient takes half the memory, the
+        information matrix is accumulated in float64. Default is float64.
+    trace : trace, optional
+        Records the time of each stage, the results of the minimizations
+        and the number of filters and QR factorizations (see trace.trace).
+        It is attached to the model as m.trace. Default is None.
     Returns
     -------
     B : ndarray
@@ -482,62 +671,50 @@ def oe(nb, nf, nk, u, y):
     Ny, ny = shape(y)
     db = sum(sum(nb+1))
     df = sum(sum(nf))
-    # Define the prediction error
-    def pe(theta, nf, nb, nk, u, y):
-        Nu, nu = shape(u)
-        F = theta[0:sum(nf)]
-        B = theta[sum(nf):sum(nf)+sum(nb+1)+2]
-        kf = 0
-        kb = 0
-        e = copy(y)
-        for i in range(0, nu):
-            f = append([1], F[kf:kf+nf[i]])
-            b = append(zeros((1, nk[i])), B[kb:kb+nb[i]+1])
-            if size(b) == 0:
-                b = [0]
-            kf += nf[i]
-            kb += nb[i] + 1
-            yu = lfilter(b, f, u[:,i], axis=0)
-            e -= yu
-                #e -= lfilter(b, f, u[:,i], axis=0)
-                #TODO verify the strange lfilter behavior here too
-        return e
     # Initialization
+    if init is not None:
+        P = _initial(init, [('B', nb + 1, lambda i: zeros(nk[i])), ('F', nf, lambda i: ones(1))])
+        B, F = P['B'], P['F']
+    else:
+        B = empty((ny, nu), dtype=object)
+        F = empty((ny, nu), dtype=object)
+        for j in range(0, ny):
+            yn = copy(y[:,j:j+1])
+            for i in range(0, nu):
+                a, b = ls(nf[j, i], nb[j, i], nk[j, i], u[:,i:i+1], yn)
+                F[j, i] = append([1], a)
+                B[j, i] = append(zeros((nk[j, i],)), b)
+                if B[j, i].size > 0:
+                    yn -= lfilter(B[j, i], F[j, i], u[:,i:i+1], axis=0)
+    # Solve the minimization problem
+    s = polystruct(_unitpolys((ny, ny), True), B, _unitpolys((ny, 1)), _unitpolys((ny, 1)), F,
+                   ny, nu, nk=nk)
+    if starts > 1 and init is not None:
+        trace.stage('initialization')
+        sols = multistart(s, u, y, [], starts, seed=seed, workers=workers, trace=trace)
+    elif starts > 1:
+        # Only the guesses used by the starts candidates are computed
+        iv = riv(nb, nf, nk, u, y, check=False)
+        guesses = [[None, iv.B, None, None, iv.F]]
+        if starts > 2:
+            Br, Fr = _reduced(nb, nf, nk, u, y)
+            guesses.append([None, Br, None, None, Fr])
+        trace.stage('initialization')
+        sols = multistart(s, u, y, guesses, starts, seed=seed, workers=workers, trace=trace)
+    else:
+        trace.stage('initialization')
+        sols = _pemsolve(s, u, y, workers=workers, trace=trace)
+    trace.stage('minimization')
+    _, B, _, _, F = s.polys()
+    # Output
     parb = []
     parf = []
-    B = empty((ny, nu), dtype=object)
-    F = empty((ny, nu), dtype=object)
     BdF = empty((ny, nu), dtype=object)
     for j in range(0, ny):
-        A = []
-        B_ = []
-        yn = copy(y[:,j:j+1])
         for i in range(0, nu):
-            a, b = ls(nf[j, i], nb[j, i], nk[j, i], u[:,i:i+1], yn)
-            A = append(A, a)
-            B_ = append(B_, b)
-            a = append([1], a)
-            b = append(zeros((1, nk[j, i])), b)
-            if size(b) == 0:
-                b = [0]
-            yn -= lfilter(b, a, u[:,i:i+1], axis=0)
-        thetai = append(A, B_)
-        # Solve the minimization problem
-        sol = least_squares(pe, thetai, args=(nf[j], nb[j], nk[j], u.reshape((Nu, nu)), y[:,j]))
-        # Output
-        theta = sol.x
-        kf = 0
-        kb = 0
-        f = theta[0:sum(nf[j])]
-        b = theta[sum(nf[j]):sum(nf[j])+sum(nb[j]+1)+2]
-        parb += b.flatten().tolist()
-        parf += f.flatten().tolist()
-        for i in range(0, nu):
-            B[j, i] = append(zeros((1, nk[j, i])), b[kb:kb+nb[j, i]+1])
-            F[j, i] = append([1], f[kf:kf+nf[j, i]])
+            parb += B[j, i][nk[j, i]:].tolist()
+            parf += F[j, i][1:].tolist()
             BdF[j, i] = (B[j, i], F[j, i])
-            kf += nf[j, i]
-            kb += nb[j, i] + 1
     ehat = y - filtmat(BdF, u, isrational=True) #[L:Ny, 0:ny]
     # Get covariance of ehat
     sig = (ehat.T @ ehat)/Ny
@@ -548,9 +725,8 @@ def oe(nb, nf, nk, u, y):
     kf = 0
     # Get covariance:
     L = amax([amax(nf), amax(nb + nk)])
-    Iny = eye(ny)
-    psiy = zeros(((Ny-L)*ny, df))
-    psiu = zeros(((Nu-L)*ny, db))
+    psi = zeros(((Ny-L)*ny, db + df), dtype=dtype)
+    psiu, psiy = psi[:, 0:db], psi[:, db:]
     # Output regressors and Input Regressors
     for i in range(0, ny):
         kw = 0
@@ -562,26 +738,26 @@ def oe(nb, nf, nk, u, y):
             if (nb[i, j] > -1):
                 wf[:, kw] = lfilter(B[i, j], convolve(F[i, j], F[i, j]), u[:, j], axis=0)
                 uf[:, kw] = lfilter([1], F[i, j], u[:, j], axis=0)
-                psiu[:, kb:kb+nb[i, j]+1] = kron(toeplitz(uf[L-nk[i, j]:Nu-nk[i, j], j], uf[L-nk[i, j]-nb[i, j]:L-nk[i, j]+1, j][::-1]), Iny[:, i:i+1])
-                psiy[:, kf:kf+nf[i,j]] = kron(-toeplitz(wf[L-1:-1, kw], wf[L-nf[i, j]:L, kw][::-1]),Iny[:, i:i+1])
+                psiu[i::ny, kb:kb+nb[i, j]+1] = lagview(uf[:, j], L, nb[i, j]+1, nk[i, j])
+                psiy[i::ny, kf:kf+nf[i,j]] = -lagview(wf[:, kw], L, nf[i, j], 1)
                 kb += nb[i, j] + 1
                 kf += nf[i,j]
                 kw += 1
     # Get Model
     m = polymodel('oe', None, B, None, None, F, nk, db+df, (u, y), nu, ny, 1)
-    psi = concatenate((psiu, psiy), axis=1)
     # Get gradient of the prediction error
-    # Initialize information matrix
-    M = zeros((df + db, df + db))
-    for k in range(0, psi.shape[0], ny):
-        M += psi[k:k+ny, :].T @ isig @ psi[k:k+ny, :]
+    # Information matrix
+    M = _information(psi, isig, ny)
     M /= Ny
     m.M = M
-    m.setcov(sol.cost, inv(M)/Ny, sig)
+    m.setcov(sum([sol.cost for sol in sols]), inv(M)/Ny, sig)
     m.setparameters(array(parb+parf))
+    trace.stage('covariance')
     return m
 
-def bj(nb, nc, nd, nf, nk, u, y):
+@traced
+def bj(nb, nc, nd, nf, nk, u, y=None, joint=False, workers=1, starts=1, seed=0, init=None,
+       dtype=float64, trace=None):
     """
     Estimates an BJ model based on input (u(t)) and output (y(t)) vectors.
     Returns the polynomials B(q), F(q), C(q) and D(q) relative to the MIMO
@@ -601,10 +777,42 @@ def bj(nb, nc, nd, nf, nk, u, y):
         Array of integers (ny x nu) that represents the polynomial orders for F(q).
     nk : array_like
         Array of integers (ny x nu) that represents the model's time delay.
-    u : array_like
-        Input data array.
-    y : array_like
-        Output data array.
+    u : array_like or iddata
+        Input data array or an iddata object with the input and output data.
+    y : array_like, optional
+        Output data array. Not used when u is an iddata object.
+    joint : bool, optional
+        Estimates all the outputs in one optimization problem, with the
+        sparse (block diagonal) Jacobian. Default is False, one problem
+        per output.
+    workers : int or Executor, optional
+        Number of threads used to estimate the outputs in parallel, or an
+        executor of concurrent.futures (e.g. a ProcessPoolExecutor).
+        Default is 1.
+    starts : int, optional
+        Number of initial guesses of each output (see multistart.multistart):
+        the least squares estimates, the refined IV estimate with an AR noise
+        model (see ivmethod.riv), the reduction of a high order ARX model and
+        random stable perturbations of them, in this order: a small starts
+        drops the later candidates (starts=2 uses the first two), which are
+        then not computed. Not supported with joint. Default is 1, only the
+        least squares estimates.
+    seed : int, optional
+        Seed of the random perturbations. Default is 0.
+    init : polymodel, compactmodel or array_like, optional
+        Initial guess, e.g. the model of a previous fit with the same
+        orders, or its parameter vector [b, c, d, f]. The initialization
+        is skipped (and the multi-start candidates are the perturbations
+        of init). Default is None.
+    dtype : data-type, optional
+        Data type of the gradient of the prediction errors. It only affects
+        the covariance of the parameters (P), the minimization always runs
+        in float64. With float32 the gradient takes half the memory, the
+        information matrix is accumulated in float64. Default is float64.
+    trace : trace, optional
+        Records the time of each stage, the results of the minimizations
+        and the number of filters and QR factorizations (see trace.trace).
+        It is attached to the model as m.trace. Default is None.
     Returns
     -------
     B : ndarray
@@ -624,88 +832,67 @@ def bj(nb, nc, nd, nf, nk, u, y):
     dc = sum(sum(nc))
     dd = sum(sum(nd))
     df = sum(sum(nf))
-    # Number of parameters do estimate
-    #dp = nf + nb + nc + nd + 1
-    # Define the prediction error
-    def pe(theta, nf, nb, nc, nd, nk, u, y):
-        Nu, nu = shape(u)
-        F = theta[0:sum(nf)]
-        B = theta[sum(nf):sum(nf)+sum(nb+1)]
-        c = theta[sum(nf)+sum(nb+1):nc+sum(nf)+sum(nb+1)]
-        d = theta[nc+sum(nf)+sum(nb+1):nd+nc+sum(nf)+sum(nb+1)]
-        c = append([1], c)
-        d = append([1], d)
-        e = lfilter(d, c, y, axis=0)
-        kf = 0
-        kb = 0
-        for i in range(0, nu):
-            f = append([1], F[kf:kf+nf[i]])
-            b = append(zeros((1, nk[i])), B[kb:kb+nb[i]+1])
-            kf += nf[i]
-            kb += nb[i] + 1
-            db = convolve(b, d)
-            fc = convolve(f, c)
-            e -= lfilter(db, fc, u[0:,i], axis=0)
-        return e
     # Initial Guess
-    B = empty((ny, nu), dtype=object)
-    C = empty((ny,1), dtype=object)
-    D = empty((ny,1), dtype=object)
-    F = empty((ny, nu), dtype=object)
-    # Parameter
+    if init is not None:
+        monic = lambda i: ones(1)
+        P = _initial(init, [('B', nb + 1, lambda i: zeros(nk[i])), ('C', nc, monic),
+                            ('D', nd, monic), ('F', nf, monic)])
+        B, C, D, F = P['B'], P['C'], P['D'], P['F']
+    else:
+        B = empty((ny, nu), dtype=object)
+        C = empty((ny,1), dtype=object)
+        D = empty((ny,1), dtype=object)
+        F = empty((ny, nu), dtype=object)
+        # TODO: Verify a way to compute an ARMA process
+        for j in range(0, ny):
+            yn = copy(y[:, j:j+1])
+            for i in range(0, nu):
+                a, b = ls(nf[j, i], nb[j, i], nk[j, i], u[:, i:i+1], y[:,j:j+1])
+                F[j, i] = append([1], a)
+                B[j, i] = append(zeros((nk[j, i],)), b)
+                if B[j, i].size > 0:
+                    yn -= lfilter(B[j, i], F[j, i], u[:, i:i+1], axis=0)
+            ci = min(j, nu-1)
+            d, c = ls(nd[j][0], nc[j][0]-1, 1, u[:, ci:ci+1], yn)
+            C[j, 0] = append([1], c)
+            D[j, 0] = append([1], d)
+    # Solve the minimization problem
+    s = polystruct(_unitpolys((ny, ny), True), B, C, D, F, ny, nu, nk=nk)
+    if starts > 1 and joint:
+        raise ValueError('The multi-start minimization solves one problem per output')
+    if starts > 1 and init is not None:
+        trace.stage('initialization')
+        sols = multistart(s, u, y, [], starts, seed=seed, workers=workers, trace=trace)
+    elif starts > 1:
+        # Refined IV with an AR noise model (C = 1) and high order ARX reduction
+        iv = riv(nb, nf, nk, u, y, nd=nd, check=False)
+        Ci = empty((ny, 1), dtype=object)
+        for j in range(0, ny):
+            Ci[j, 0] = append([1], zeros(nc[j][0]))
+        guesses = [[None, iv.B, Ci, iv.D, iv.F]]
+        # Only the guesses used by the starts candidates are computed
+        if starts > 2:
+            Br, Fr = _reduced(nb, nf, nk, u, y)
+            guesses.append([None, Br, None, None, Fr])
+        trace.stage('initialization')
+        sols = multistart(s, u, y, guesses, starts, seed=seed, workers=workers, trace=trace)
+    else:
+        trace.stage('initialization')
+        sols = _pemsolve(s, u, y, joint=joint, workers=workers, trace=trace)
+    trace.stage('minimization')
+    _, B, C, D, F = s.polys()
+    # Parameters
     parb = []
     parc = []
     pard = []
     parf = []
-    # TODO: Verify a way to compute an ARMA process
     for j in range(0, ny):
-        thetaf = []
-        thetab = []
-        yn = copy(y[:, j:j+1])
-        for i in range(0, nu):
-            a, b = ls(nf[j, i], nb[j, i], nk[j, i], u[:, i:i+1], y[:,j:j+1])
-            #Verify empty arrays
-            if nf[j, i] == 0:
-                thetab = append(thetab, b)
-                yn -= lfilter(b, [1], u[:,i:i+1], axis=0)
-            elif nb[j, i] == -1:
-                thetai = append(thetaf, a)
-                yn -= lfilter([1], a, u[:, i:i+1], axis=0)
-            else:
-                thetaf = append(thetaf, a)
-                thetab = append(thetab, b)
-                yn -= lfilter(b, a, u[:, i:i+1], axis=0)
-        thetai = append(thetaf, thetab)
-        ci = min(j, nu-1)
-        d, c = ls(nd[j][0], nc[j][0]-1, 1, u[:, ci:ci+1], yn)
-        # Verify Empty Arrays
-        if nc[j] == 0:
-            thetai = append(thetai, d)
-        elif nd[j] == 0:
-            thetai = append(thetai, c)
-        else:
-            thetai = append(thetai, (c, d))
-        # Solve the minimization problem
-        sol = least_squares(pe, thetai, args=(nf[j], nb[j], nc[j][0], nd[j][0], nk[j], u.reshape(Nu, nu), y[:,j]))
-        theta = sol.x
-        #B[j] = append(zeros((1, nk[j])), theta[nf[j]:nf[j]+nb[j]+1])
-        C[j,0] = append([1], theta[sum(nf[j])+sum(nb[j]+1):nc[j][0]+sum(nf[j])+sum(nb[j]+1)])
-        D[j,0] = append([1], theta[nc[j][0]+sum(nf[j])+sum(nb[j]+1):nd[j][0]+nc[j][0]+sum(nf[j])+sum(nb[j]+1)])
         parc += C[j, 0][1:].tolist()
         pard += D[j, 0][1:].tolist()
-        #F[j] = append([1], theta[0:nf[j]])
-        F_ = theta[0:sum(nf[j])]
-        B_ = theta[sum(nf[j]):sum(nf[j])+sum(nb[j]+1)]
-        kf = 0
-        kb = 0
         for i in range(0, nu):
-            F[j, i] = append([1], F_[kf:kf+nf[j, i]])
-            B[j, i] = append(zeros((1, nk[j, i])), B_[kb:kb+nb[j, i]+1])
             parf += F[j, i][1:].tolist()
-            parb += B_[kb:kb+nb[j, i]+1].tolist()
-            kf += nf[j, i]
-            kb += nb[j, i] + 1
-        # Model
+            parb += B[j, i][nk[j, i]:].tolist()
+    # Model
     m = polymodel('boxjenkins', None, B, C, D, F, nk, db+dc+dd+df, (u, y), nu, ny, 1)
     # Set the parameters
     m.setparameters(array(parb + parc + pard + parf))
@@ -722,11 +909,9 @@ def bj(nb, nc, nd, nf, nk, u, y):
     isig = inv(sig)
     # Get covariance:
     L = amax([amax(nf), amax(nb + nk), amax(nc), amax(nd)])
-    Iny = eye(ny)
-    psiy = zeros(((Ny-L)*ny, df))
-    psiu = zeros(((Nu-L)*ny, db))
-    psiec = zeros(((Nu-L)*ny, dc))
-    psied = zeros(((Nu-L)*ny, dd))
+    psi = zeros(((Ny-L)*ny, db + dc + dd + df), dtype=dtype)
+    psiu, psiec = psi[:, 0:db], psi[:, db:db+dc]
+    psied, psiy = psi[:, db+dc:db+dc+dd], psi[:, db+dc+dd:]
     kb = 0
     kc = 0
     kd = 0
@@ -739,7 +924,7 @@ def bj(nb, nc, nd, nf, nk, u, y):
         w = zeros((Ny, 1))
         wf = zeros((Ny, nu))
         ef = lfilter([1], C[i, 0], ehat, axis=0)
-        psiec[:, kc:kc+nc[i][0]] = kron(toeplitz(ef[L-1:-1, i], ef[L-nc[i][0]:L, i][::-1]), Iny[:, i:i+1])
+        psiec[i::ny, kc:kc+nc[i][0]] = lagview(ef[:, i], L, nc[i][0], 1)
         kc += nc[i][0]
         # Input
         for j in range(0, nu):
@@ -750,895 +935,95 @@ def bj(nb, nc, nd, nf, nk, u, y):
                                              u[:, j], axis=0)
                 uf[:, kw] = lfilter(D[i, 0], convolve(F[i, j], C[i, 0]), u[:, j], axis=0)
 
-                psiu[:, kb:kb+nb[i, j]+1] = kron(toeplitz(uf[L-nk[i, j]:Nu-nk[i, j], j], uf[L-nk[i, j]-nb[i, j]:L-nk[i, j]+1, j][::-1]), Iny[:, i:i+1])
-                psiy[:, kf:kf+nf[i,j]] = kron(-toeplitz(wf[L-1:-1, kw], wf[L-nf[i, j]:L, kw][::-1]), Iny[:, i:i+1])
+                psiu[i::ny, kb:kb+nb[i, j]+1] = lagview(uf[:, j], L, nb[i, j]+1, nk[i, j])
+                psiy[i::ny, kf:kf+nf[i,j]] = -lagview(wf[:, kw], L, nf[i, j], 1)
                 kb += nb[i, j] + 1
                 kf += nf[i, j]
                 kw += 1
         # Get the last one
         vf = lfilter([1], C[i, 0], w-y[:, i:i+1], axis=0)
-        psied[:, kd:kd+nd[i][0]] = kron(toeplitz(vf[L-1:-1, 0], vf[L-nd[i][0]:L, 0][::-1]), Iny[:, i:i+1])
+        psied[i::ny, kd:kd+nd[i][0]] = lagview(vf[:, 0], L, nd[i][0], 1)
         kd += nd[i][0]
     # Make the information matrix
-    psi = concatenate((psiu, psiec, psied, psiy), axis=1)
     # Get gradient of the prediction error
-    # Initialize information matrix
-    M = zeros((df + db + dc + dd, df + db + dc + dd))
-    for k in range(0, psi.shape[0], ny):
-        M += psi[k:k+ny, :].T @ isig @ psi[k:k+ny, :]
+    # Information matrix
+    M = _information(psi, isig, ny)
     M /= Ny
     m.M = M
-    m.setcov(sol, inv(M)/Ny, sig)
+    m.setcov(sum([sol.cost for sol in sols]), inv(M)/Ny, sig)
+    trace.stage('covariance')
     return m
 
 # %% Testing functions
-def pem(A, B, C, D, F, u, y, mu=[] ,solver='lm'):
+@traced
+def pem(A, B, C, D, F, u, y=None, mu=[] ,solver='lm', joint=False, workers=1, starts=1, seed=0,
+        trace=None):
     """
     This functions implements the prediction error method for the gerenal
     tranfer function black-box model:
         A(q)y(t) = [B(q)/F(q)]u(t) + [C(q)/D(q)]e(t)
+    The structure (orders, delays and known coefficients) is compiled once
+    from the initial guess (see structure.polystruct) and one minimization
+    problem is solved for each output, over the polynomials of its row.
     Inputs:
         A - A (ny x ny) numpy object filled with polynomials
         B - A (ny x nu) numpy object filled with polynomials
         C - A (ny x 1) numpy object filled with polynomials
         D - A (ny x 1) numpy object filled with polynomials
         F - A (ny x nu) numpy object filled with polynomials
-        u - The system input (N x nu)
-        y - The system otput (N x ny)
+        u - The system input (N x nu) or an iddata object
+        y - The system otput (N x ny), not used if u is an iddata object
         mu- A mask representing the unknowns
+        solver - The least_squares method
+        joint - Solves one problem for all the outputs (trust region
+                reflective, with the block diagonal Jacobian)
+        workers - Number of threads (or an executor) used to solve the
+                outputs in parallel
+        starts - Number of initial guesses of each output, the given one
+                and random stable perturbations of it (see
+                multistart.multistart), not supported with joint
+        seed - Seed of the random perturbations
+        trace - Records of the estimation (see trace.trace): the time of
+                each stage, the results of the minimizations and the
+                number of filters. It is not attached to the outputs
+                (polynomials), the caller keeps the reference
     Outputs:
         A
         B
         C
         D
-        E
         F
+    The estimated polynomials are 1-D arrays for SISO systems and object
+    arrays with the shapes above otherwise.
     """
     #Array everything
-    A = array(A, ndmin=2, dtype='object')
-    #B = array(B, ndmin=2, dtype='object')
-    C = array(C, ndmin=1, dtype='object')
-    D = array(D, ndmin=1, dtype='object')
-    #F = array(F, ndmin=2, dtype='object')
-    y = array(y)
-    u = array(u)
+    if isinstance(u, iddata):
+        u, y = u.u, u.y
+    else:
+        y = array(y, dtype=float64)
+        u = array(u, dtype=float64)
+    if y.ndim == 1:
+        y = y.reshape((-1, 1))
+    if u.ndim == 1:
+        u = u.reshape((-1, 1))
     #Input Handling
     Ny, ny = shape(y)
     Nu, nu = shape(u)
-    da = sum(sum(na))
-    db = sum(sum(nb+1))
-    dc = sum(sum(nc))
-    dd = sum(sum(nd))
-    df = sum(sum(nf))
-    #Empty mask
-    mu = array(mu)
-    if size(mu) == 0:
-        kn = False
-    else:
-        muA = array(mu[0])
-        muB = array(mu[1])
-        muC = array(mu[2])
-        muD = array(mu[3])
-        muF = array(mu[4])
-        kn = True
     #Error Handling
     if Ny != Nu:
         raise ValueError('The data must have the same number of samples')
-    #Configure the output
-    Aout = empty((ny, ny), dtype='object')
-    Bout = empty((ny, nu), dtype='object')
-    Cout = empty((ny, ), dtype='object')
-    Dout = empty((ny, ), dtype='object')
-    Fout = empty((ny, nu), dtype='object')
-    #SISO case
-    if nu == 1 and ny == 1:
-        #Recover polynomial orders
-        na = size(A)-1
-        nk = 0
-        fc = True
-        for i in range(0, size(B)):
-            if (B[i] == 0 and fc):
-                nk += 1
-            else:
-                fc = False
-                nb = size(B) - nk - 1
-                break
-        nc = size(C)-1
-        nd = size(D)-1
-        nf = size(F)-1
-        #Define the prediction error
-        def pe(theta, A, B, C, D, F, u, y, mu, kn):
-            #Take the orders
-            na = size(A)-1
-            nk = 0
-            fc = True
-            for i in range(0, size(B)):
-                if (B[i] == 0 and fc):
-                    nk += 1
-                else:
-                    fc = False
-                    nb = size(B) - nk - 1
-                    break
-            nc = size(C)-1
-            nd = size(D)-1
-            nf = size(F)-1
-            #Verify what parameters are constant
-            if kn:
-                #Known Elements
-                muA = array(mu[0])
-                muB = array(mu[1])
-                muC = array(mu[2])
-                muD = array(mu[3])
-                muF = array(mu[4])
-                #Number of known elements
-                kA = count_nonzero(muA)
-                kB = count_nonzero(muB)
-                kC = count_nonzero(muC)
-                kD = count_nonzero(muD)
-                kF = count_nonzero(muF)
-                #Number of unknown elements
-                ukA = na - kA
-                ukB = nb - kB + 1
-                ukC = nc - kC
-                ukD = nd - kD
-                ukF = nf - kF
-                #Copy arrays
-                a = copy(A)
-                b = copy(B)
-                c = copy(C)
-                d = copy(D)
-                f = copy(F)
-                #Fill it with the unknown elements
-                k = 0
-                if ukA != 0:
-                    i = array(where(muA==0))[0]
-                    i = i[1:]
-                    a[i] = theta[k:k+ukA]
-                    k += ukA
-                if ukB != 0:
-                    i = array(where(muB==0))[0]
-                    i = i[nk:]
-                    b[i] = theta[k:k+ukB]
-                    k += ukB
-                if ukC != 0:
-                    i = array(where(muC==0))[0]
-                    i = i[1:]
-                    c[i] = theta[k:k+ukC]
-                    k += ukC
-                if ukD != 0:
-                    i = array(where(muD==0))[0]
-                    i = i[1:]
-                    d[i] = theta[k:k+ukD]
-                    k+= ukD
-                if ukF != 0:
-                    i = array(where(muF==0))[0]
-                    i = i[1:]
-                    f[i] = theta[k:k+ukF]
-            #Everything is unknown
-            else:
-                k = 0
-                if na != 0:
-                    a = append([1], theta[k:k+na])
-                    k += na
-                else:
-                    a = 1
-                if nb != -1:
-                    b = append(zeros((1, nk)), theta[k:k+nb+1])
-                    k += nb + 1
-                else:
-                    b = 0
-                if nc != 0:
-                    c = append([1], theta[k:k+nc])
-                    k += nc
-                else:
-                    c = 1
-                if nd != 0:
-                    d = append([1], theta[k:k+nd])
-                    k += nd
-                else:
-                    d = 1
-                if nf != 0:
-                    f = append([1], theta[k:k+nf])
-                else:
-                    f = 1
-                #e = (AD)/(C)(y - (B)/(AF)u)
-            ad = convolve(a, d)
-            bd = convolve(b, d)
-            cf = convolve(c, f)
-            e = lfilter(ad, c, y, axis=0) - lfilter(bd, cf, u, axis=0)
-            return e
-        #Initial Guess
-        #a, b = ls(na+nf, nb, nk, u, y)
-        #yn = y - lfilter(append(zeros((1,nk)), b), append([1], a), u, axis=0)
-        #f = a[na:na+nf+1]
-        #a = a[0:na]
-        #d, c = ls(nd, nc-1, 1, u, yn)
-        #Verify what parameters are previously known
-        if kn:
-            #Copy arrays
-            pa = A[1:na+1]
-            pb = B[nk:nk+nb+1]
-            pc = C[1:nc+1]
-            pd = D[1:nd+1]
-            pf = F[1:nf+1]
-            #Fill it with the unknown elements
-            i = where(muA[1:na+1]==0)
-            a = pa[i]
-            i = where(muB[nk:nk+nb+1]==0)
-            b = pb[i]
-            i = where(muC[1:nc+1]==0)
-            c = pc[i]
-            i = where(muD[1:nd+1]==0)
-            d = pd[i]
-            i = where(muF[1:nf+1]==0)
-            f = pf[i]
-        else:
-            a = A[1:na+1]
-            b = B[nk:nk+nb+1]
-            c = C[1:nc+1]
-            d = D[1:nd+1]
-            f = F[1:nf+1]
-        thetai = concatenate((a, b, c, d, f))
-        #Call minimization function
-        sol = least_squares(pe, thetai, args=(A, B, C, D, F, u.reshape(Nu,), y.reshape(Ny,), mu, kn))
-        theta = sol.x
-        k = 0
-        if kn:
-            #Number of known elements
-            kA = count_nonzero(muA)
-            kB = count_nonzero(muB)
-            kC = count_nonzero(muC)
-            kD = count_nonzero(muD)
-            kF = count_nonzero(muF)
-            #Number of unknown elements
-            ukA = na - kA
-            ukB = nb - kB + 1
-            ukC = nc - kC
-            ukD = nd - kD
-            ukF = nf - kF
-            #Fill it with the unknown elements
-            k = 0
-            if ukA != 0:
-                i = array(where(muA==0))[0]
-                i = i[1:]
-                A[i] = theta[k:k+ukA]
-                k += ukA
-            if ukB != 0:
-                i = array(where(muB==0))[0]
-                i = i[nk:]
-                B[i] = theta[k:k+ukB]
-                k += ukB
-            if ukC != 0:
-                i = array(where(muC==0))[0]
-                i = i[1:]
-                C[i] = theta[k:k+ukC]
-                k += ukC
-            if ukD != 0:
-                i = array(where(muD==0))[0]
-                i = i[1:]
-                D[i] = theta[k:k+ukD]
-                k+= ukD
-            if ukF != 0:
-                i = array(where(muF==0))[0]
-                i = i[1:]
-                F[i] = theta[k:k+ukF]
-        else:
-            if na != 0:
-                A = append([1], theta[k:k+na])
-                k += na
-            else:
-                A = 1
-            if nb != -1:
-                B = append(zeros((1, nk)), theta[k:k+nb+1])
-                k += nb + 1
-            else:
-                B = 0
-            if nc != 0:
-                C = append([1], theta[k:k+nc])
-                k += nc
-            else:
-                C = 1
-            if nd != 0:
-                D = append([1], theta[k:k+nd])
-                k += nd
-            else:
-                D = 1
-            if nf != 0:
-                F = append([1], theta[k:k+nf])
-            else:
-                F = 1
-    #MISO case
-    elif (ny==1):
-        #Define the output of the algorithm
-        #B = empty((nu,), dtype='object')
-        #F = empty((nu,), dtype='object')
-        nf = zeros((nu,), dtype = 'int32')
-        nb = zeros((nu,), dtype = 'int32')
-        nk = zeros((nu,), dtype = 'int32')
-        #Recover the polynomial orders
-        for i in range(0, nu):
-            nf[i] = size(F[0, i])-1
-            fc = True
-            for j in range(0, size(B[0, i])): #B[i]
-                if (B[0, i][j] == 0 and fc):
-                    nk[i] += 1
-                else:
-                    fc = False
-                    nb[i] = size(B[0, i]) - nk[i] - 1
-                    break
-        na = size(A)-1
-        nc = size(C)-1
-        nd = size(D)-1
-        #Define the prediction error
-        #Define the prediction error
-        def pe(theta, A, B, C, D, F, u, y, mu, kn):
-            #Check shape of u
-            Nu, nu = shape(u)
-            #Take the orders
-            nf = zeros((nu,), dtype = 'int32')
-            nb = zeros((nu,), dtype = 'int32')
-            nk = zeros((nu,), dtype = 'int32')
-            for i in range(0, nu):
-                fc = True
-                nf[i] = size(F[0, i]) - 1
-                for j in range(0, size(B[0, i])):
-                    if (B[0, i][j] == 0 and fc):
-                        nk[i] += 1
-                    else:
-                        fc = False
-                        nb[i] = size(B[0, i]) - nk[i] - 1
-                        break
-            na = size(A)-1
-            nc = size(C)-1
-            nd = size(D)-1
-            #Verify what parameters are constant
-            if kn:
-                #Known Elements
-                muA = array(mu[0])
-                muB = array(mu[1])
-                muC = array(mu[2])
-                muD = array(mu[3])
-                muF = array(mu[4])
-                #Number of known elements
-                kA = count_nonzero(muA)
-                kB = zeros((nu,), dtype = 'int32')
-                kF = zeros((nu,), dtype = 'int32')
-                #Unknown
-                ukB = zeros((nu,), dtype = 'int32')
-                ukF = zeros((nu,), dtype = 'int32')
-                for i in range(0, nu):
-                    #Known elements
-                    kB[i] = count_nonzero(muB[i])
-                    kF[i] = count_nonzero(muF[i])
-                    #Unknown elements
-                    ukB[i] = nb[i] - kB[i] + 1
-                    ukF[i] = nf[i] - kF[i]
-                kB = count_nonzero(muB)
-                kC = count_nonzero(muC)
-                kD = count_nonzero(muD)
-                #Number of unknown elements
-                ukA = na - kA
-                ukC = nc - kC
-                ukD = nd - kD
-                #Copy arrays
-                a = copy(A)
-                b = copy(B)
-                c = copy(C)
-                d = copy(D)
-                f = copy(F)
-                #Fill it with the unknown elements
-                k = 0
-                if ukA != 0:
-                    i = array(where(muA==0))[0]
-                    i = i[1:]
-                    a[i] = theta[k:k+ukA]
-                    k += ukA
-                for j in range(0, nu):
-                    if ukB[j] != 0:
-                        i = array(where(muB[j]==0))[0]
-                        i = i[nk[j]:]
-                        b[0, j][i] = theta[k:k+ukB[j]]
-                        k += ukB[j]
-                if ukC != 0:
-                    i = array(where(muC==0))[0]
-                    i = i[1:]
-                    c[i] = theta[k:k+ukC]
-                    k += ukC
-                if ukD != 0:
-                    i = array(where(muD==0))[0]
-                    i = i[1:]
-                    d[i] = theta[k:k+ukD]
-                    k+= ukD
-                for j in range(0, nu):
-                    if ukF[j] != 0:
-                        i = array(where(muF[j]==0))[0]
-                        i = i[1:]
-                        #TODO: Cannot Broadcast shape 0 into shape 1 (deal with scalar)
-                        f[0, j][i] = theta[k:k+ukF[j]]
-                        k += ukF[j]
-            #Everything is unknown
-            else:
-                #Initialization
-                f = empty((nu,), dtype='object')
-                b = empty((nu,), dtype='object')
-                k = 0
-                if na != 0:
-                    a = append([1], theta[k:k+na])
-                    k += na
-                else:
-                    a = 1
-                for i in range(0, nu):
-                    if nb[i] != -1:
-                        b[i] = append(zeros((1, nk[i])), theta[k:k+nb[i]+1])
-                        k += nb[i] + 1
-                    else:
-                        b[i] = 0
-                if nc != 0:
-                    c = append([1], theta[k:k+nc])
-                    k += nc
-                else:
-                    c = 1
-                if nd != 0:
-                    d = append([1], theta[k:k+nd])
-                    k += nd
-                else:
-                    d = 1
-                for i in range(0, nu):
-                    if nf[i] != 0:
-                        f[i] = append([1], theta[k:k+nf[i]])
-                        k += nf[i]
-                    else:
-                        f[i] = 1
-                #e = (AD)/(C)(y - (B)/(AF)u)
-            ad = convolve(a[0], d[0])
-            e = lfilter(ad, c[0], y, axis=0)
-            for i in range(0, nu):
-                bd = convolve(b[0, i], d)
-                cf = convolve(c, f[0, i])
-                e -= lfilter(bd, cf, u[:, i], axis=0)
-            return e.tolist()
-        #Verify what parameters are previously known
-        if kn:
-            pb = empty((sum(nb+1),), dtype = 'object')
-            pf = empty((sum(nf)  ,), dtype = 'object')
-            #Copy arrays
-            pa = A[1:na+1]
-            for i in range(0, nu):
-                pb[i] = B[0, i][nk[i]:nk[i]+nb[i]+1]
-                pf[i] = F[0, i][1:nf[i]+1]
-            pc = C[1:nc+1]
-            pd = D[1:nd+1]
-            #Fill it with the unknown elements
-            i = where(muA[1:na+1]==0)
-            a = pa[i]
-            b = []
-            f = []
-            for j in range(0, nu):
-                i = where(equal(muB[j][nk[j]:nk[j]+nb[j]+1],0))
-                b = append(b, pb[j][i])
-                i = where(muF[j][1:nf[j]+1]==0)
-                f = append(f, pf[j][i])
-            i = where(muC[1:nc+1]==0)
-            c = pc[i]
-            i = where(muD[1:nd+1]==0)
-            d = pd[i]
-        else:
-            a = A[1:na+1]
-            b = []
-            f = []
-            for i in range(0, nu):
-                b = append(b, B[0, i][nk[i]:nk[i]+nb[i]+1])
-                f = append(f, F[0, i][1:nf[i]+1])
-            c = C[1:nc+1]
-            d = D[1:nd+1]
-        #Initial Guess
-        thetai = concatenate((a.tolist(), b.tolist(), c.tolist(), d.tolist(), f.tolist()))
-        #Call minimization function
-        sol = least_squares(pe, thetai, args=(A, B, C, D, F, u.reshape(Nu, nu), y.reshape(Ny,), mu, kn))
-        theta = sol.x
-        k = 0
-        if kn:
-            #Number of known elements
-            kA = count_nonzero(muA)
-            kB = zeros((nu,), dtype = 'int32')
-            kF = zeros((nu,), dtype = 'int32')
-            ukB = zeros((nu,), dtype = 'int32')
-            ukF = zeros((nu,), dtype = 'int32')
-            #Unknown
-            for i in range(0, nu):
-                kB[i] = count_nonzero(muB[i])
-                kF[i] = count_nonzero(muF[i])
-                ukB[i] = nb[i] - kB[i] + 1
-                ukF[i] = nf[i] - kF[i]
-            kC = count_nonzero(muC)
-            kD = count_nonzero(muD)
-            #Number of unknown elements
-            ukA = na - kA
-            ukC = nc - kC
-            ukD = nd - kD
-            #Fill it with the unknown elements
-            k = 0
-            if ukA != 0:
-                i = array(where(muA==0))[0]
-                i = i[1:]
-                A[i] = theta[k:k+ukA]
-                k += ukA
-            for j in range(0, nu):
-                if ukB[j] != 0:
-                    i = array(where(muB[j]==0))[0]
-                    i = i[nk[j]:]
-                    B[0, j][i] = theta[k:k+ukB[j]]
-                    k += ukB[j]
-            if ukC != 0:
-                i = array(where(muC==0))[0]
-                i = i[1:]
-                C[i] = theta[k:k+ukC]
-                k += ukC
-            if ukD != 0:
-                i = array(where(muD==0))[0]
-                i = i[1:]
-                D[i] = theta[k:k+ukD]
-                k+= ukD
-            for j in range(0, nu):
-                if ukF[j] != 0:
-                    i = array(where(muF[j]==0))[0]
-                    i = i[1:]
-                    F[0, j][i] = theta[k:k+ukF[j]]
-                    k += ukF[j]
-        else:
-            if na != 0:
-                A = append([1], theta[k:k+na])
-                k += na
-            else:
-                A = 1
-            for i in range(0, nu):
-                if nb[i] != -1:
-                    B[i] = append(zeros((1, nk[i])), theta[k:k+nb[i]+1])
-                    k += nb[i] + 1
-                else:
-                    B[i] = 0
-            if nc != 0:
-                C = append([1], theta[k:k+nc])
-                k += nc
-            else:
-                C = 1
-            if nd != 0:
-                D = append([1], theta[k:k+nd])
-                k += nd
-            else:
-                D = 1
-            for i in range(0, nu):
-                if nf[i] != 0:
-                    F[i] = append([1], theta[k:k+nf[i]])
-                    k += nf[i]
-                else:
-                    F[i] = 1
-    #SIMO case
-    elif (nu==1):
-        #do = nothing
-        pass
-    #MIMO case
+    #Compile the structure once
+    s = polystruct(A, B, C, D, F, ny, nu, mu)
+    trace.stage('initialization')
+    #Minimize the prediction errors
+    if starts > 1:
+        if joint:
+            raise ValueError('The multi-start minimization solves one problem per output')
+        multistart(s, u, y, [], starts, seed=seed, method=solver, workers=workers, trace=trace)
     else:
-        #Define the orders of the polynomials
-        na = zeros((ny, ny), dtype = 'int32')
-        nb = zeros((ny, nu), dtype = 'int32')
-        nc = zeros((ny,), dtype = 'int32')
-        nd = zeros((ny,), dtype = 'int32')
-        nf = zeros((ny, nu), dtype = 'int32')
-        nk = zeros((ny, nu), dtype = 'int32')
-        #Recover the polynomial orders
-        for j in range(0, ny):
-            #Noise
-            nc[j] = size(C[j]) - 1
-            nd[j] = size(D[j]) - 1
-            #Output
-            for i in range(0, ny):
-                na[j, i] = size(A[j, i]) - 1
-            #Input
-            for i in range(0, nu):
-                nf[j, i] = size(F[j, i]) - 1
-                fc = True
-                for k in range(0, size(B[j, i])):
-                    if (B[j, i][k] == 0 and fc):
-                        nk[j, i] += 1
-                    else:
-                        fc = False
-                        nb[j, i] = size(B[j, i]) - nk[j, i] - 1
-                        break
-        #Define the prediction error
-        def pe(theta, A, B, C, D, F, u, y, mu, kn):
-            #Check shape of u ans y
-            Nu, nu = shape(u)
-            Ny, ny = shape(y)
-            #NA = concatenate((tarna, na[i][index]))
-            #Take the orders
-            na = zeros((ny,), dtype = 'int32')
-            nf = zeros((nu,), dtype = 'int32')
-            nb = zeros((nu,), dtype = 'int32')
-            nk = zeros((nu,), dtype = 'int32')
-            for i in range(0, ny):
-                na[i] = size(A[i])-1
-            for i in range(0, nu):
-                fc = True
-                nf[i] = size(F[i]) - 1
-                for j in range(0, size(B[i])):
-                    if (B[i][j] == 0 and fc):
-                        nk[i] += 1
-                    else:
-                        fc = False
-                        nb[i] = size(B[i]) - nk[i] - 1
-                        break
-            nc = size(C)-1
-            nd = size(D)-1
-            #Verify what parameters are constant
-            if kn:
-                #Known Elements
-                muA = array(mu[0])
-                muB = array(mu[1])
-                muC = array(mu[2])
-                muD = array(mu[3])
-                muF = array(mu[4])
-                #Number of known elements
-                kA = zeros((ny,), dtype = 'int32')
-                ukA = zeros((ny,), dtype = 'int32')
-                for i in range(0, ny):
-                    #Known Elements
-                    kA[i] = count_nonzero(muA[i])
-                    #Unknown elements
-                    ukA[i] = na[i] - kA[i]
-                kB = zeros((nu,), dtype = 'int32')
-                kF = zeros((nu,), dtype = 'int32')
-                #Unknown
-                ukB = zeros((nu,), dtype = 'int32')
-                ukF = zeros((nu,), dtype = 'int32')
-                for i in range(0, nu):
-                    #Known elements
-                    kB[i] = count_nonzero(muB[i])
-                    kF[i] = count_nonzero(muF[i])
-                    #Unknown elements
-                    ukB[i] = nb[i] - kB[i] + 1
-                    ukF[i] = nf[i] - kF[i]
-                kB = count_nonzero(muB)
-                kC = count_nonzero(muC)
-                kD = count_nonzero(muD)
-                #Number of unknown elements
-                ukC = nc - kC
-                ukD = nd - kD
-                #Copy arrays
-                a = copy(A)
-                b = copy(B)
-                c = copy(C)
-                d = copy(D)
-                f = copy(F)
-                #Fill it with the unknown elements
-                k = 0
-                for j in range(0, nu):
-                    if ukA[j] != 0:
-                        i = array(where(muA[j]==0))[0]
-                        i = i[1:]
-                        a[j][i] = theta[k:k+ukA[j]]
-                        k += ukA[j]
-                for j in range(0, nu):
-                    if ukB[j] != 0:
-                        i = array(where(muB[j]==0))[0]
-                        i = i[nk[j]:]
-                        b[j][i] = theta[k:k+ukB[j]]
-                        k += ukB[j]
-                if ukC != 0:
-                    i = array(where(muC==0))[0]
-                    i = i[1:]
-                    c[i] = theta[k:k+ukC]
-                    k += ukC
-                if ukD != 0:
-                    i = array(where(muD==0))[0]
-                    i = i[1:]
-                    d[i] = theta[k:k+ukD]
-                    k+= ukD
-                for j in range(0, nu):
-                    if ukF[j] != 0:
-                        i = array(where(muF[j]==0))[0]
-                        i = i[1:]
-                        f[j][i] = theta[k:k+ukF[j]]
-                        k += ukF[j]
-            #Everything is unknown
-            else:
-                #Initialization
-                a = empty((ny,), dtype='object')
-                f = empty((nu,), dtype='object')
-                b = empty((nu,), dtype='object')
-                k = 0
-                for i in range(0, ny):
-                    if i == 0:
-                        aux = [1]
-                    else:
-                        aux = [0]
-                    if na[i] != 0:
-                        a[i] = append(aux, theta[k:k+na[i]])
-                        k += na[i]
-                    else:
-                        a[i] = aux
-                for i in range(0, nu):
-                    if nb[i] != -1:
-                        b[i] = append(zeros((1, nk[i])), theta[k:k+nb[i]+1])
-                        k += nb[i] + 1
-                    else:
-                        b[i] = 0
-                if nc != 0:
-                    c = append([1], theta[k:k+nc])
-                    k += nc
-                else:
-                    c = 1
-                if nd != 0:
-                    d = append([1], theta[k:k+nd])
-                    k += nd
-                else:
-                    d = 1
-                for i in range(0, nu):
-                    if nf[i] != 0:
-                        f[i] = append([1], theta[k:k+nf[i]])
-                        k += nf[i]
-                    else:
-                        f[i] = 1
-                #e = (AD)/(C)(y - (B)/(AF)u)
-            ad = convolve(a[0], d)
-            e = lfilter(ad, c, y[:, 0], axis=0)
-            for i in range(0, nu):
-                bd = convolve(b[i], d)
-                cf = convolve(c, f[i])
-                e -= lfilter(bd, cf, u[:, i], axis=0)
-            #Additional Outputs
-            for i in range(1, ny):
-                ad = convolve(a[i], d)
-                e -= lfilter(ad, c, -y[:,i], axis=0)
-            return e
-        #Solve ny MISO problems
-        for l in range(0, ny):
-            #Sort to make the predicted y to be the first
-            #Verify what parameters are previously known
-            if kn:
-                pa = empty((ny,), dtype = 'object')
-                pb = empty((nu,), dtype = 'object')
-                pf = empty((nu,), dtype = 'object')
-                #Copy arrays
-                a = []
-                for i in range(0, ny):
-                    pa[i] = A[l, i][1:]
-                    ind = where(muA[l, i][1:na[l, i]+1]==0)
-                    a = append(a, pa[i][ind])
-                for i in range(0, nu):
-                    pb[i] = B[l, i][nk[l, i]:nk[l, i]+nb[l, i]+1]
-                    pf[i] = F[l, i][1:nf[l, i]+1]
-                pc = C[l][1:nc[l]+1]
-                pd = D[l][1:nd[l]+1]
-                #Fill it with the unknown elements
-                b = []
-                f = []
-                for j in range(0, nu):
-                    i = where(muB[j][nk[j]:nk[j]+nb[j]+1]==0)
-                    b = append(b, pb[j][i])
-                    i = where(muF[j][1:nf[j]+1]==0)
-                    f = append(f, pf[j][i])
-                i = where(muC[l][1:nc[l]+1]==0)
-                c = pc[i]
-                i = where(muD[l][1:nd[l]+1]==0)
-                d = pd[i]
-            else:
-                a = empty((ny,), dtype='object')
-                for i in range(0, ny):
-                    a[i] = A[l, i][1:]
-                b = []
-                f = []
-                for i in range(0, nu):
-                    b = append(b, B[l, i][nk[l, i]:nk[l, i]+nb[l, i]+1])
-                    f = append(f, F[l, i][1:nf[l, i]+1])
-                c = C[l][1:nc[l]+1]
-                d = D[l][1:nd[l]+1]
-            #Organize the target
-            tar = y[0:Ny,l:l+1]
-            ax = a[l]
-            Ax = A[l, l].reshape((1, na[l, l]+1))
-            index = arange(ny)
-            index = delete(index, l)
-            Y = concatenate((tar, y[0:Ny,index]), axis=1)
-            ax = array([ax, a[index]])
-            Ax = array([Ax, A[l][index]])
-            a = []
-            for i in range(0, ny):
-                a = append(a, ax[i])
-            #Initial Guess
-            thetai = concatenate((a, b, c, d, f))
-            #Call minimization function
-            sol = least_squares(pe, thetai, args=(Ax, B[l], C[l], D[l], F[l], u.reshape(Nu, nu), Y.reshape(Ny, ny), mu, kn))
-            theta = sol.x
-            k = 0
-            if kn:
-                #Number of known elements
-                kA = count_nonzero(muA)
-                kB = zeros((nu,), dtype = 'int32')
-                kF = zeros((nu,), dtype = 'int32')
-                ukB = zeros((nu,), dtype = 'int32')
-                ukF = zeros((nu,), dtype = 'int32')
-                #Unknown
-                for i in range(0, nu):
-                    kB[i] = count_nonzero(muB[i])
-                    kF[i] = count_nonzero(muF[i])
-                    ukB[i] = nb[i] - kB[i] + 1
-                    ukF[i] = nf[i] - kF[i]
-                kC = count_nonzero(muC)
-                kD = count_nonzero(muD)
-                #Number of unknown elements
-                ukA = na - kA
-                ukC = nc - kC
-                ukD = nd - kD
-                #Fill it with the unknown elements
-                k = 0
-                if ukA != 0:
-                    i = array(where(muA==0))[0]
-                    i = i[1:]
-                    A[i] = theta[k:k+ukA]
-                    k += ukA
-                for j in range(0, nu):
-                    if ukB[j] != 0:
-                        i = array(where(muB[j]==0))[0]
-                        i = i[nk[j]:]
-                        B[j][i] = theta[k:k+ukB[j]]
-                        k += ukB[j]
-                if ukC != 0:
-                    i = array(where(muC==0))[0]
-                    i = i[1:]
-                    C[i] = theta[k:k+ukC]
-                    k += ukC
-                if ukD != 0:
-                    i = array(where(muD==0))[0]
-                    i = i[1:]
-                    D[i] = theta[k:k+ukD]
-                    k+= ukD
-                for j in range(0, nu):
-                    if ukF[j] != 0:
-                        i = array(where(muF[j]==0))[0]
-                        i = i[1:]
-                        F[j][i] = theta[k:k+ukF[j]]
-                        k += ukF[j]
-            else:
-                #A polynomial
-                for i in range(0, ny):
-                    if l == i:
-                        aux = [1]
-                    else:
-                        aux = [0]
-                    if na[l, i] != 0:
-                        Aout[l, i] = append(aux, theta[k:k+na[l, i]])
-                        k += na[l, i]
-                    else:
-                        Aout[l, i] = aux
-                #B polynomial
-                for i in range(0, nu):
-                    if nb[l, i] != -1:
-                        Bout[l, i] = append(zeros((1, nk[l, i])), theta[k:k+nb[l, i]+1])
-                        k += nb[l, i] + 1
-                    else:
-                        Bout[l, i] = 0
-                #C polynomial
-                if nc[l] != 0:
-                    Cout[l] = append([1], theta[k:k+nc[l]])
-                    k += nc[l]
-                else:
-                    Cout[l] = 1
-                if nd[l] != 0:
-                    Dout[l] = append([1], theta[k:k+nd[l]])
-                    k += nd[l]
-                else:
-                    Dout[l] = 1
-                for i in range(0, nu):
-                    if nf[l, i] != 0:
-                        Fout[l, i] = append([1], theta[k:k+nf[l, i]])
-                        k += nf[l, i]
-                    else:
-                        Fout[l, i] = 1
-        A = copy(Aout)
-        B = copy(Bout)
-        C = copy(Cout)
-        D = copy(Dout)
-        F = copy(Fout)
-    #Find the solution of the minimzation problem
+        _pemsolve(s, u, y, solver, joint, workers, trace)
+    trace.stage('minimization')
+    A, B, C, D, F = s.polys()
+    if nu == 1 and ny == 1:
+        return [A[0, 0], B[0, 0], C[0, 0], D[0, 0], F[0, 0]]
     return [A, B, C, D, F]
@@ -0,0 +1,178 @@
+"""
+    Stateful predictors of the polynomial models for online use, that
+    advance one sample at a time.
+"""
+
+# Imports
+from numpy import asarray, eye, float64, zeros
+from .filters import firbank, iirbank
+
+# Variables
+__all__ = ['predictor']
+
+
+# classes
+class dfbank():
+    """
+    Filter bank with padded (nout x nin x n) coefficient arrays, advanced one
+    sample at a time in direct form II transposed. The output channel i is
+        out_i(t) = sum_j b_ij(q)/a_ij(q) x_j(t)
+    or, for diagonal banks (nin = 1), out_i(t) = b_i(q)/a_i(q) x_i(t).
+    """
+
+    def __init__(self, b, a=None, diag=False):
+        n = max(b.shape[2], 2)
+        bp = zeros(b.shape[0:2] + (n,))
+        bp[..., 0:b.shape[2]] = b
+        self.diag = diag
+        # Coefficients split for the update of the state
+        self.b0 = bp[..., 0].copy()
+        self.b = bp[..., 1:].copy()
+        self.a = None
+        if a is not None:
+            ap = zeros(b.shape[0:2] + (n,))
+            ap[..., 0:a.shape[2]] = a
+            self.a = ap[..., 1:].copy()
+        self.z = zeros(b.shape[0:2] + (n - 1,))
+
+    @classmethod
+    def fromstage(cls, stage, diag=False):
+        """Builds the bank of a firbank or iirbank stage (see filters.py)."""
+        if isinstance(stage, firbank):
+            return cls(stage.M.transpose((1, 2, 0)), None, diag)
+        nin = 1 if diag else max([j + 1 for _, j, _, _ in stage.entries] + [1])
+        n = max([b.size for _, _, b, _ in stage.entries] + [2])
+        b = zeros((stage.nout, nin, n))
+        a = zeros((stage.nout, nin, n))
+        a[..., 0] = 1
+        for i, j, bij, aij in stage.entries:
+            b[i, 0 if diag else j, 0:bij.size] = bij
+            a[i, 0 if diag else j, 0:aij.size] = aij
+        return cls(b, a, diag)
+
+    def _x(self, x):
+        return x[:, None] if self.diag else x[None, :]
+
+    def free(self):
+        """Returns the part of the current output due to the past samples."""
+        return self.z[..., 0].sum(axis=1)
+
+    def output(self, x):
+        """Returns the current output for the sample x (the state is not changed)."""
+        return (self.b0*self._x(x) + self.z[..., 0]).sum(axis=1)
+
+    def advance(self, x):
+        """Filters the sample x, updates the state and returns the output."""
+        x = self._x(x)
+        out = self.b0*x + self.z[..., 0]
+        z = self.b*x[..., None]
+        if self.a is not None:
+            z -= self.a*out[..., None]
+        z[..., :-1] += self.z[..., 1:]
+        self.z = z
+        return out.sum(axis=1)
+
+    def reset(self):
+        self.z[...] = 0
+
+
+class predictor():
+    """
+    Stateful k-step ahead predictor of a polynomial model
+        A(q) y(t) = B(q)/F(q) u(t) + C(q)/D(q) e(t)
+    which keeps the state of the filters of each channel between calls, so
+    that every new sample is processed in O(order) operations instead of
+    re-filtering the whole history. At each sample t:
+        yp = p.forecast(u)  # y(t|t-k), uses u(t) and the outputs until t-1
+        p.update(y)         # feeds the measured output y(t)
+    or yp = p.step(u, y), which does both. The predictions are the same as
+    the ones of model.predict(u, y, k) over the whole history.
+
+    Latency budget: each sample costs O(ny*nu*n) flops (n is the largest
+    order) and a fixed number of small numpy operations, so the latency
+    is dominated by the numpy call overhead and does not depend on the
+    length of the history. On a typical x86 machine forecast takes about
+    20 us and step about 50-90 us, for SISO up to 8x8 models, while
+    re-filtering 1000 samples with predict takes 0.1-1.5 ms (see
+    benchmarks/benchmarks/bench_predictor.py). For large blocks of
+    samples, model.predict with zi is faster.
+
+    Parameters
+    ----------
+    model : polymodel or compactmodel
+        Model used for the prediction. A(0), C(0) and D(0) must be the
+        identity (monic polynomials).
+    k : int, optional
+        Prediction horizon. Default is 1.
+    """
+
+    def __init__(self, model, k=1):
+        if k < 1:
+            raise ValueError('The prediction horizon k must be at least 1')
+        f = model.filters()
+        self.k = k
+        self.ny, self.nu = f.ny, f.nu
+        if f.A is not None and (f.A.M[0] != eye(self.ny)).any():
+            raise ValueError('A(q) must be monic (A(0) = I)')
+        self.A = None if f.A is None else dfbank.fromstage(f.A)
+        self.G = None if f.G is None else dfbank.fromstage(f.G)
+        self.Hinv = None if f.Hinv is None else dfbank.fromstage(f.Hinv, diag=True)
+        if self.Hinv is not None and (self.Hinv.b0 != 1).any():
+            raise ValueError('C(q) and D(q) must be monic')
+        self.Hk = None if k == 1 else dfbank(f.markov(k).transpose((1, 2, 0)))
+        self._u = None
+
+    def reset(self):
+        """Resets the state of the predictor (zero initial conditions)."""
+        for s in (self.A, self.G, self.Hinv, self.Hk):
+            if s is not None:
+                s.reset()
+        self._u = None
+
+    def forecast(self, u=None):
+        """
+        Returns the prediction y(t|t-k) (ny elements) given the input u(t)
+        (nu elements) and the outputs fed until t-1. The state is not changed.
+        """
+        yp = zeros(self.ny)
+        if self.G is not None:
+            self._u = asarray(u, dtype=float64).reshape(self.nu)
+            yp += self.G.output(self._u)
+        for s in (self.A, self.Hinv, self.Hk):
+            if s is not None:
+                yp -= s.free()
+        return yp
+
+    def update(self, y):
+        """
+        Feeds the output y(t) (ny elements) and advances the predictor to
+        the next sample. forecast(u(t)) must be called before, when the
+        model has inputs.
+        """
+        x = asarray(y, dtype=float64).reshape(self.ny)
+        if self.A is not None:
+            x = self.A.advance(x)
+        if self.G is not None:
+            x = x - self.G.advance(self._u)
+        if self.Hinv is not None:
+            x = self.Hinv.advance(x)
+        if self.Hk is not None:
+            self.Hk.advance(x)
+
+    def step(self, u, y):
+        """Returns forecast(u) and then feeds the output y (see update)."""
+        yp = self.forecast(u)
+        self.update(y)
+        return yp
+
+    def __call__(self, u, y):
+        """
+        Processes a block of samples, u (N x nu) and y (N x ny), and
+        returns the predictions (N x ny).
+        """
+        y = asarray(y, dtype=float64).reshape((-1, self.ny))
+        u = zeros((y.shape[0], 0)) if u is None else asarray(u, dtype=float64).reshape((y.shape[0], -1))
+        yp = zeros(y.shape)
+        for t in range(y.shape[0]):
+            yp[t] = self.step(u[t], y[t])
+        return yp
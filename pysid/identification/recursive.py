@@ -7,6 +7,8 @@ Module for recursive methods
 from numpy import zeros, identity, matmul, empty, insert, concatenate, power
 from .models import polymodel
 from .solvers import qrsolm
+from .trace import traced
+from ..io.iddata import iddata
 
 __all__ = ['els', 'rls']
 
@@ -36,7 +38,8 @@ def var_erro(error, th = 0.001):
     else:
         return True
 
-def els(na,nb,nc,nk,u,y,th = 0.001,n_max = 100):
+@traced
+def els(na,nb,nc,nk,u,y=None,th = 0.001,n_max = 100,trace=None):
     """
     
     Performs the Extended Least Squres algorithm on u,y data,
@@ -55,21 +58,28 @@ def els(na,nb,nc,nk,u,y,th = 0.001,n_max = 100):
         Degree of C polynomial
     nk : int
         minimum delay for B polynomial
-    u : numpy array
-        Array (or array of arrays) contaning the inputs chronologically
-    y : numpy array
+    u : numpy array or iddata
+        Array (or array of arrays) contaning the inputs chronologically,
+        or an iddata object with the inputs and outputs
+    y : numpy array, optional
         Array (or array of arrays) contaning the outputs chronologically
     th : float
         Treshold
         Minimum difference between the quadratic sum of two consecutive errors needed to assume that there was convergence
     n_max : int
         Maximum number of iterations allowed
+    trace : trace, optional
+        Records the time of the stages and the quadratic sum of the
+        residuals of each output at each iteration (see trace.trace).
+        It is attached to the model as m.trace. Default is None.
         
     Returns
     -------
     m : pysid polymodel
 
     """
+    if isinstance(u, iddata):
+        u, y = u.u, u.y
     nu = u.shape[1]
     ny = y.shape[1]
 
@@ -117,6 +127,7 @@ def els(na,nb,nc,nk,u,y,th = 0.001,n_max = 100):
     for i in range(ny):
         theta_emq[:,i] = qrsolm(psi_emq[:,:,i],y_sol[nc:,:])[:,i]
 
+    trace.stage('least squares')
     #Iteractions
     res = zeros((psi_emq.shape[0],nc))
     res_i = zeros((res.shape[0]))
@@ -134,8 +145,10 @@ def els(na,nb,nc,nk,u,y,th = 0.001,n_max = 100):
         s_error[1,:] = s_error[0,:]
         for ii in range(ny):
             s_error[0,ii] = sum(power(res,2)[:,ii])
+            trace.cost(ii, s_error[0,ii])
 
         i = i + 1
+    trace.stage('iterations')
 
     #Assembly of matrices of polynomials
     A = empty((ny,ny), dtype='object')
@@ -176,7 +189,8 @@ def els(na,nb,nc,nk,u,y,th = 0.001,n_max = 100):
 
     return m
 
-def rls(na,nb,nk,u,y):
+@traced
+def rls(na,nb,nk,u,y=None,trace=None):
     """
     Performs the Recursive Least Squres algorithm on u,y data,
     indentifing A,B and C polynomials with na,nb and nc degree respectively.
@@ -191,16 +205,22 @@ def rls(na,nb,nk,u,y):
         Degree of B polynomial
     nk : int
         minimum delay for B polynomial
-    u : numpy array
-        Array (or array of arrays) contaning the inputs chronologically
-    y : numpy array
+    u : numpy array or iddata
+        Array (or array of arrays) contaning the inputs chronologically,
+        or an iddata object with the inputs and outputs
+    y : numpy array, optional
         Array (or array of arrays) contaning the outputs chronologically
+    trace : trace, optional
+        Records the time of the recursion (see trace.trace). It is attached
+        to the model as m.trace. Default is None.
 
     Returns
     -------
     m : pysid polymodel
 
     """
+    if isinstance(u, iddata):
+        u, y = u.u, u.y
     ny = y.shape[1]
     nu = u.shape[1]
 
@@ -228,6 +248,7 @@ def rls(na,nb,nk,u,y):
         theta = theta + K*(y[cont]-matmul(psik,theta))
         P = P - K*(matmul(psik,P))
         cont = cont + 1
+    trace.stage('recursion')
 
     #Assembly of matrices of polynomials 
     A = empty((ny,ny), dtype='object')
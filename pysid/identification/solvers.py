@@ -2,11 +2,14 @@
     Solvers for the identification modules.
 """
 
-from numpy import append, array, amax, concatenate, dot, shape, empty, dot, zeros
-from scipy.linalg import qr, solve, toeplitz
+from numpy import absolute, append, array, amax, asarray, atleast_2d, concatenate, dot, einsum,\
+    eye, float64, ones, shape, empty, dot, sqrt, zeros
+from scipy.linalg import qr, schur, solve, solve_triangular
+from ..io.iddata import lagview
+from .trace import count
 
 # Variables
-__all__ = ['ls', 'qrsol', 'burg', 'levinson']
+__all__ = ['ls', 'qrsol', 'nesol', 'burg', 'levinson', 'arcov', 'dlyap']
 
 # functions
 def ls(na, nb, nk, u, y):
@@ -39,7 +42,7 @@ def ls(na, nb, nk, u, y):
         raise ValueError('Number of samples should be greater' &
                          'than the maximum order!')
     # Build matrix phi in which will contain y and u shifted in time
-    phi = concatenate((toeplitz(-y[L-1:Ny-1], -y[L-na:L][::-1]), toeplitz(u[L-nk:Nu-nk], u[L-nk-nb:L-nk+1][::-1])), axis=1)
+    phi = concatenate((-lagview(y[:, 0], L, na, 1), lagview(u[:, 0], L, nb+1, nk)), axis=1)
     # Crop y from n_max to N
     y = y[L:Ny]
     # Find theta by QR factorization
@@ -60,13 +63,47 @@ def qrsol(A, B):
     """
     r, d = shape(A)
     M = concatenate((A, B), axis=1)
-    Q, R = qr(M)
+    R = qr(M, mode='r')[0]
+    count('qr')
     R1 = R[0:d, 0:d]
     R2 = R[0:d, d]
     V = R[d, d]
     theta = solve(R1, R2)
     return [theta, V, R1]
 
+def nesol(A, b, chunk=65536):
+    """
+    Solves the least squares problem min |b - A theta| through the normal
+    equations, accumulated in float64 over blocks of chunk rows of A (that
+    may be stored in float32), followed by one step of iterative refinement
+    with the float64 residuals. Returns theta, the norm of the residuals (V
+    of qrsol) and the residuals e = b - A theta.
+    """
+    b = asarray(b).ravel()
+    d = A.shape[1]
+    G = zeros((d, d))
+    g = zeros(d)
+    for k in range(0, A.shape[0], chunk):
+        Ak = A[k:k+chunk].astype(float64, copy=False)
+        G += Ak.T @ Ak
+        g += Ak.T @ b[k:k+chunk]
+    theta = solve(G, g, assume_a='pos')
+
+    def residuals(theta):
+        e = empty(b.size)
+        for k in range(0, A.shape[0], chunk):
+            e[k:k+chunk] = b[k:k+chunk] - A[k:k+chunk].astype(float64, copy=False) @ theta
+        return e
+
+    # Refinement step, with the residuals of the rounded regressors
+    e = residuals(theta)
+    g = zeros(d)
+    for k in range(0, A.shape[0], chunk):
+        g += A[k:k+chunk].astype(float64, copy=False).T @ e[k:k+chunk]
+    theta = theta + solve(G, g, assume_a='pos')
+    e = residuals(theta)
+    return [theta, sqrt(e @ e), e]
+
 def qrsolm(psi,y):
     """
     Solve the least saqures problem using QR-factorization but for mimo systems
@@ -78,6 +115,33 @@ def qrsolm(psi,y):
         theta[:,i] = theta_i
     return theta
  
+def dlyap(A, Q, B=None):
+    """
+    Solves the discrete Lyapunov equations
+        X_i = A X_i A^T + Q_i
+    or, if B is given, the Stein (discrete Sylvester) equations
+        X_i = A X_i B^T + Q_i
+    for a batch of right-hand sides Q (... x n x m), with one complex Schur
+    decomposition of A (and B) shared by all the equations. In the Schur
+    bases, A = U T U^H and B = V R V^H, Y_i - T Y_i R^H = U^H Q_i V is
+    solved column by column (from the last one) with triangular solves
+    over the whole batch.
+    """
+    A = asarray(A)
+    Q = asarray(Q)
+    n, m = Q.shape[-2:]
+    T, U = schur(A, output='complex')
+    R, V = (T, U) if B is None else schur(asarray(B), output='complex')
+    C = (U.conj().T @ Q @ V).reshape((-1, n, m))
+    Y = zeros(C.shape, dtype=C.dtype)
+    Rc = R.conj()
+    for j in range(m-1, -1, -1):
+        # Contribution of the columns already solved (k > j)
+        rhs = C[:, :, j] + (Y[:, :, j+1:] @ Rc[j, j+1:]) @ T.T
+        Y[:, :, j] = solve_triangular(eye(n) - Rc[j, j]*T, rhs.T).T
+    X = U @ Y @ V.conj().T
+    return X.real.reshape(Q.shape)
+
 def levinson(R, n):
     """
     This function implements the Levinson algorithm for fast parameters computations
@@ -100,6 +164,37 @@ def levinson(R, n):
         A[i] = Av
     return A
 
+def arcov(D, L):
+    """
+    Returns the autocovariance r(0), ..., r(L) of the AR process
+        D(q) v(t) = e(t)
+    with unit variance e(t), for a monic polynomial D (n+1 coefficients)
+    or a batch of them (nb x n+1, the result is nb x L+1). The reflection
+    coefficients are found with the step-down Levinson recursion and the
+    covariances with the Yule-Walker equations of each order, in O(n L)
+    operations per polynomial, without forming Toeplitz matrices.
+    """
+    D = atleast_2d(asarray(D, dtype=float64))
+    nb, n = D.shape[0], D.shape[1] - 1
+    # Step-down recursion, polys[k] is the predictor polynomial of order k
+    polys = [None]*(n + 1)
+    polys[n] = D/D[:, 0:1]
+    g = ones(nb)
+    for k in range(n, 0, -1):
+        d = polys[k]
+        kappa = d[:, k:k+1]
+        if (absolute(kappa) >= 1).any():
+            raise ValueError('D(q) must have all its roots inside the unit circle')
+        g *= 1 - kappa[:, 0]**2
+        polys[k-1] = (d[:, 0:k] - kappa*d[:, k:0:-1])/(1 - kappa**2)
+    # r(k) = -sum_i d_i r(k-i), with the predictor of order min(k, n)
+    r = zeros((nb, L + 1))
+    r[:, 0] = 1/g
+    for k in range(1, L + 1):
+        o = min(k, n)
+        r[:, k] = -einsum('bi,bi->b', polys[o][:, 1:o+1], r[:, k-1::-1][:, 0:o])
+    return r
+
 def burg(y, n):
     """Returns the output of the burg algorithm."""
     # Array Everything
@@ -0,0 +1,250 @@
+"""
+    Binary serialization of the polynomial models.
+
+    save_model/load_model store one model in a .npz file, with the flat
+    coefficient vector of the compactmodel representation, the structure
+    of the polynomials and the accuracy information, without the training
+    data and without pickled objects.
+
+    A model store packs many models in one file, made of:
+        - the magic string b'PYSIDMDL' and a little-endian uint32 with the
+          size of the header;
+        - a JSON header with the number of models, their keys and names,
+          and the data type, shape and offset of each array below;
+        - the arrays, each one starting at a 64 bytes aligned offset:
+            coef    the coefficient vectors of all the models, one after
+                    the other, index (n+1) holds their offsets;
+            ptr     the polynomial offsets of each model (compactmodel._ptr),
+                    pindex (n+1) holds their position in ptr;
+            delay   the delays of each model, dindex (n+1) holds their
+                    position in delay;
+            shape   (n x 5 x 2) shapes of A, B, C, D and F, -1 if missing;
+            meta    (n x 5) nu, ny, ts, N (-1 if unknown) and nparam.
+    The file is mapped with numpy.memmap, so that opening a store only
+    parses the header. The models are built on access, as compactmodel
+    instances whose coefficients are views of the mapped file.
+"""
+
+# Imports
+from json import dumps, loads
+from struct import pack, unpack
+from numpy import array, asarray, ascontiguousarray, concatenate, cumsum, dtype as npdtype,\
+    empty, float64, full, int64, load, memmap, prod, savez, uint8
+from .models import compactmodel
+import errno
+import os
+
+__all__ = ['save_model', 'load_model', 'save_store', 'modelstore']
+
+MAGIC = b'PYSIDMDL'
+ALIGN = 64
+# Accuracy information, saved by save_model when it is set
+ACCURACY = ('parameters', 'ecov', 'P', 'costfunction', 'Jaic', 'Jaicn', 'Jaicc', 'Jbic', 'Jfpe')
+
+
+# Functions
+def _compact(model):
+    """Returns the model as a compactmodel."""
+    return model if isinstance(model, compactmodel) else model.compact()
+
+
+def _shape_array(shape):
+    """Encodes the shapes of A, B, C, D and F as a (5 x 2) array, -1 if missing."""
+    s = full((5, 2), -1, dtype=int64)
+    for k, sk in enumerate(shape):
+        if sk is not None:
+            s[k, 0:len(sk)] = sk
+    return s
+
+
+def _offsets(sizes):
+    """Returns the (n+1) offsets of consecutive blocks with the given sizes."""
+    return concatenate(([0], cumsum(sizes, dtype=int64))).astype(int64)
+
+
+def save_model(model, filename):
+    """
+    Saves a polynomial model in a .npz file. The training data is not saved.
+
+    Parameters
+    ----------
+    model : polymodel or compactmodel
+        Model to save.
+    filename : string
+        Name of the file (.npz is appended if it has no extension).
+    """
+    m = _compact(model)
+    meta = {'name': m.name, 'nu': int(m.nu), 'ny': int(m.ny), 'ts': m.ts,
+            'N': None if m.N is None else int(m.N), 'nparam': int(m.nparam)}
+    arrays = {'coef': m.coef, 'ptr': m._ptr, 'shape': _shape_array(m._shape)}
+    if m.delay is not None:
+        arrays['delay'] = asarray(m.delay)
+    for attr in ACCURACY:
+        value = getattr(m, attr, None)
+        if value is not None:
+            arrays[attr] = asarray(value)
+    savez(filename, meta=array(dumps(meta)), **arrays)
+
+
+def load_model(filename):
+    """
+    Loads a model saved with save_model.
+
+    Parameters
+    ----------
+    filename : string
+        Name of the .npz file.
+
+    Returns
+    -------
+    m : compactmodel
+        The model, without training data.
+    """
+    with load(filename, allow_pickle=False) as f:
+        meta = loads(str(f['meta']))
+        delay = f['delay'] if 'delay' in f.files else None
+        m = compactmodel.fromarrays(meta['name'], f['coef'], f['ptr'], f['shape'], delay,
+                                    meta['nparam'], meta['nu'], meta['ny'], meta['ts'], meta['N'])
+        for attr in ACCURACY:
+            if attr in f.files:
+                value = f[attr]
+                setattr(m, attr, value.item() if value.ndim == 0 else value)
+    return m
+
+
+def save_store(models, filename, keys=None):
+    """
+    Packs the coefficients and structure of many models in one model store
+    file, to be opened with modelstore. The accuracy information and the
+    training data are not saved.
+
+    Parameters
+    ----------
+    models : list of polymodel or compactmodel
+        Models to save.
+    filename : string
+        Name of the model store file.
+    keys : list of strings, optional
+        Unique key of each model. Default is '0', '1', ...
+
+    Returns
+    -------
+    s : modelstore
+        The opened model store.
+    """
+    models = [_compact(m) for m in models]
+    n = len(models)
+    keys = [str(i) for i in range(n)] if keys is None else [str(k) for k in keys]
+    if len(keys) != n or len(set(keys)) != n:
+        raise ValueError('keys must have one unique key per model')
+    delays = [empty(0, dtype=int64) if m.delay is None else asarray(m.delay).astype(int64).ravel()
+              for m in models]
+    arrays = [
+        ('coef', concatenate([m.coef for m in models] + [empty(0)])),
+        ('index', _offsets([m.coef.size for m in models])),
+        ('ptr', concatenate([m._ptr for m in models] + [empty(0, dtype=int64)]).astype(int64)),
+        ('pindex', _offsets([m._ptr.size for m in models])),
+        ('delay', concatenate(delays + [empty(0, dtype=int64)])),
+        ('dindex', _offsets([d.size for d in delays])),
+        ('shape', array([_shape_array(m._shape) for m in models], dtype=int64).reshape((n, 5, 2))),
+        ('meta', array([[m.nu, m.ny, m.ts, -1 if m.N is None else m.N, m.nparam]
+                        for m in models], dtype=float64).reshape((n, 5))),
+    ]
+    # Aligned offsets of the arrays, relative to the start of the data block
+    layout = {}
+    offset = 0
+    for name, x in arrays:
+        offset += -offset % ALIGN
+        layout[name] = [x.dtype.str, list(x.shape), offset]
+        offset += x.nbytes
+    header = {'n': n, 'keys': keys, 'names': [m.name for m in models], 'arrays': layout}
+    header = dumps(header).encode('utf-8')
+    start = len(MAGIC) + 4 + len(header)
+    # Pad the header with spaces so that the data block is aligned
+    header += b' '*(-start % ALIGN)
+    with open(filename, 'wb') as f:
+        f.write(MAGIC + pack('<I', len(header)) + header)
+        start = f.tell()
+        for name, x in arrays:
+            f.write(b'\0'*(start + layout[name][2] - f.tell()))
+            f.write(ascontiguousarray(x).tobytes())
+    return modelstore(filename)
+
+
+def _read_header(filename):
+    """Returns the header (as a dict) and the data offset of a model store file."""
+    try:
+        with open(filename, 'rb') as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError(filename + ' is not a pysid model store')
+            size = unpack('<I', f.read(4))[0]
+            header = loads(f.read(size).decode('utf-8'))
+            return header, f.tell()
+    except IOError:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), filename) from None
+
+
+# Classes
+class modelstore():
+    """
+    Read-only, memory-mapped access to a model store file written by
+    save_store. Only the header is read when the store is opened; the
+    models are built on access, as compactmodel instances whose
+    coefficients are read-only views of the mapped file:
+        s = modelstore('models.pmd')
+        m = s['plant7']   # or s[7]
+        yp = m.predict(u, y)
+
+    Parameters
+    ----------
+    filename : string
+        Name of the model store file.
+    """
+
+    def __init__(self, filename):
+        header, offset = _read_header(filename)
+        self.filename = filename
+        self.keys = header['keys']
+        self.names = header['names']
+        self._keys = {key: i for i, key in enumerate(self.keys)}
+        raw = memmap(filename, dtype=uint8, mode='r')
+        for name, (dtype, shape, start) in header['arrays'].items():
+            start += offset
+            size = int(prod(shape))*npdtype(dtype).itemsize
+            setattr(self, '_' + name, raw[start:start+size].view(dtype).reshape(shape))
+
+    def __repr__(self):
+        return 'modelstore({!r}, {} models)'.format(self.filename, len(self))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def index(self, key):
+        """Returns the position of the model with the given key."""
+        try:
+            return self._keys[key]
+        except KeyError:
+            raise KeyError('No model with key ' + repr(key)) from None
+
+    def __getitem__(self, i):
+        """Returns the model at position i, or with key i if i is a string."""
+        if isinstance(i, str):
+            i = self.index(i)
+        i = range(len(self))[i]
+        nu, ny, ts, N, nparam = self._meta[i]
+        delay = self._delay[self._dindex[i]:self._dindex[i+1]]
+        if delay.size == 0:
+            delay = None
+        elif delay.size == ny*nu:
+            delay = delay.reshape((int(ny), int(nu)))
+        return compactmodel.fromarrays(self.names[i], self._coef[self._index[i]:self._index[i+1]],
+                                       self._ptr[self._pindex[i]:self._pindex[i+1]],
+                                       self._shape[i], delay, int(nparam), int(nu), int(ny),
+                                       float(ts), None if N < 0 else int(N))
@@ -0,0 +1,286 @@
+"""
+    Precompiled structure of the general polynomial model, used by the
+    prediction error methods to evaluate the residuals.
+"""
+
+# Imports
+from numpy import arange, array, asarray, concatenate, convolve, empty, float64, int64, ndim,\
+    ndindex, zeros
+from .trace import lfilter
+
+# Variables
+__all__ = ['polystruct']
+
+
+# Functions
+def _leaves(P):
+    """
+    Returns the list of polynomials (1-D float arrays) of a nested list or
+    object array, in row major order. Scalars are polynomials of order 0.
+    """
+    if P is None:
+        return []
+    if isinstance(P, (list, tuple)) or (hasattr(P, 'dtype') and P.dtype == object):
+        if all(ndim(p) == 0 and not isinstance(p, (list, tuple)) for p in P):
+            return [asarray(P, dtype=float64).ravel()]
+        return [q for p in P for q in _leaves(p)]
+    return [asarray(P, dtype=float64).ravel()]
+
+
+def _lagged(x, lags):
+    """Returns the (N x n) matrix of the delayed copies x(t - lags[k]), zero for t < lags[k]."""
+    L = int(lags.max())
+    xp = concatenate((zeros(L), x))
+    return xp[arange(L, L + x.size)[:, None] - lags[None, :]]
+
+
+def _polyarray(P, shape, name):
+    """Returns the polynomials in P as an object array of the given shape."""
+    leaves = _leaves(P)
+    if len(leaves) != shape[0]*shape[1]:
+        raise ValueError('{} must have {} x {} polynomials'.format(name, *shape))
+    X = empty(shape, dtype=object)
+    for k, i in enumerate(ndindex(shape)):
+        X[i] = leaves[k]
+    return X
+
+
+# Classes
+class polystruct():
+    """
+    Precompiled structure of the general model
+        A(q) y(t) = B(q)/F(q) u(t) + C(q)/D(q) e(t)
+    built once from the initial polynomials and the mask of the known
+    coefficients. The coefficients of all the polynomials are stored in
+    one flat buffer (coef), and A, B, C, D and F are object arrays of
+    views of it. The free parameters of the output i are
+        coef[free[rows[i]]]
+    ordered as [a, b, c, d, f] of the row i of the model, such that the
+    evaluation of the residuals is a scatter of the parameters into coef
+    followed by the filters of the row. The orders, the delays (leading
+    zeros of B) and the index maps never change during the optimization.
+
+    Parameters
+    ----------
+    A, B, C, D, F : array_like
+        Initial polynomials, (ny x ny), (ny x nu), (ny x 1), (ny x 1) and
+        (ny x nu), as object arrays or (nested) lists. SISO polynomials may
+        be given as flat lists.
+    ny : int
+        Number of outputs.
+    nu : int
+        Number of inputs.
+    mu : list, optional
+        Masks [muA, muB, muC, muD, muF] of the known coefficients (1 for
+        known), with the same layout as the polynomials. Default is None,
+        everything but the leading coefficients and the delays is unknown.
+    nk : array_like, optional
+        Array of integers (ny x nu) with the time delays. Default is None,
+        the delays are the number of leading zeros of B.
+    """
+
+    def __init__(self, A, B, C, D, F, ny, nu, mu=None, nk=None):
+        self.ny, self.nu = ny, nu
+        shapes = ((ny, ny), (ny, nu), (ny, 1), (ny, 1), (ny, nu))
+        polys = [_polyarray(P, s, name) for P, s, name in zip((A, B, C, D, F), shapes, 'ABCDF')]
+        masks = [None]*5
+        if mu is not None and len(mu) != 0:
+            masks = [_polyarray(M, s, 'The mask of ' + name)
+                     for M, s, name in zip(mu, shapes, 'ABCDF')]
+        # Flat buffer and polynomial offsets (row major, A, B, C, D, F)
+        flat = [p for P in polys for p in P.flat]
+        self._ptr = array([0] + [p.size for p in flat], dtype=int64).cumsum()
+        self.coef = concatenate(flat)
+        self._views()
+        self.nk = zeros((ny, nu), dtype=int64)
+        if nk is not None:
+            nk = asarray(nk, dtype=int64).reshape((ny, nu))
+        pos = {}
+        start = {}
+        active = {}
+        k = 0
+        for n, (X, M, s) in enumerate(zip((self.A, self.B, self.C, self.D, self.F), masks, shapes)):
+            for i in ndindex(s):
+                known = zeros(X[i].size, dtype=bool) if M is None else asarray(M[i]) != 0
+                if M is not None and known.size != X[i].size:
+                    raise ValueError('The masks must have the same size of the polynomials')
+                # Leading coefficient (or delay) is never estimated
+                if n == 1:
+                    nz = (X[i] != 0).nonzero()[0]
+                    self.nk[i] = (nz[0] if nz.size else X[i].size) if nk is None else nk[i]
+                    known[0:self.nk[i]] = True
+                else:
+                    known[0:1] = True
+                pos[n, i] = (~known).nonzero()[0]
+                start[n, i] = self._ptr[k] + pos[n, i]
+                active[n, i] = (~known).any() or (X[i] != 0).any()
+                k += 1
+        # Free parameters, grouped by output, and the groups of columns of the
+        # Jacobian of each output: (polynomial, index, columns, lags)
+        free = []
+        self.rows = []
+        self._groups = []
+        for i in range(ny):
+            keys = [(0, (i, j)) for j in range(ny)] + [(1, (i, j)) for j in range(nu)] +\
+                   [(2, (i, 0)), (3, (i, 0))] + [(4, (i, j)) for j in range(nu)]
+            groups = []
+            n0 = len(free)
+            for key in keys:
+                if pos[key].size > 0:
+                    col = len(free) - n0
+                    groups.append(key + (slice(col, col + pos[key].size), pos[key]))
+                    free += start[key].tolist()
+            self.rows.append(slice(n0, len(free)))
+            self._groups.append(groups)
+        self.free = array(free, dtype=int64)
+        self.nparam = self.free.size
+        # Paths that contribute to each output (all-zero fixed polynomials are skipped)
+        self._ypaths = [[j for j in range(ny) if j != i and active[0, (i, j)]] for i in range(ny)]
+        self._upaths = [[j for j in range(nu) if active[1, (i, j)]] for i in range(ny)]
+
+    def _views(self):
+        """Builds A, B, C, D and F as object arrays of views of coef."""
+        ny, nu = self.ny, self.nu
+        k = 0
+        for name, s in zip('ABCDF', ((ny, ny), (ny, nu), (ny, 1), (ny, 1), (ny, nu))):
+            X = empty(s, dtype=object)
+            for i in ndindex(s):
+                X[i] = self.coef[self._ptr[k]:self._ptr[k+1]]
+                k += 1
+            setattr(self, name, X)
+
+    def __getstate__(self):
+        # The views are rebuilt when unpickled (e.g. in a process pool)
+        state = self.__dict__.copy()
+        for name in 'ABCDF':
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._views()
+
+    def copy(self):
+        """
+        Returns a copy of the structure with its own coefficient buffer (the
+        index maps are shared, they never change).
+        """
+        state = self.__getstate__()
+        state['coef'] = self.coef.copy()
+        s = polystruct.__new__(polystruct)
+        s.__setstate__(state)
+        return s
+
+    def setpolys(self, A=None, B=None, C=None, D=None, F=None):
+        """
+        Writes the coefficients of the given polynomials into the structure,
+        known coefficients included. The polynomials must have the orders of
+        the structure; the ones that are None are left unchanged.
+        """
+        for X, P, name in zip((self.A, self.B, self.C, self.D, self.F), (A, B, C, D, F), 'ABCDF'):
+            if P is None:
+                continue
+            P = _polyarray(P, X.shape, name)
+            for i in ndindex(X.shape):
+                if P[i].size != X[i].size:
+                    raise ValueError('The orders of {} do not match the structure'.format(name))
+                X[i][:] = P[i]
+
+    @property
+    def theta(self):
+        """Current values of the free parameters."""
+        return self.coef[self.free]
+
+    def scatter(self, theta, i=None):
+        """
+        Writes the free parameters into the polynomials: all of them, or the
+        ones of the output i.
+        """
+        if i is None:
+            self.coef[self.free] = theta
+        else:
+            self.coef[self.free[self.rows[i]]] = theta
+
+    def residuals(self, theta, i, u, y):
+        """
+        Returns the prediction errors of the output i
+            e_i = D_i/C_i (sum_j A_ij y_j - sum_j B_ij/F_ij u_j)
+        for the free parameters theta of the row i. u (nu x N) and y (ny x N)
+        are the signals, one channel per row.
+        """
+        self.coef[self.free[self.rows[i]]] = theta
+        return self._residuals(i, u, y)
+
+    def stacked(self, theta, u, y):
+        """
+        Returns the prediction errors of all the outputs, stacked in one
+        (ny*N) vector, for all the free parameters theta (see residuals).
+        """
+        self.coef[self.free] = theta
+        return concatenate([self._residuals(i, u, y) for i in range(self.ny)])
+
+    def jacobian(self, theta, i, u, y):
+        """
+        Returns the (N x n_i) Jacobian of residuals(theta, i, u, y). Each
+        column is a lagged copy of one filtered signal per polynomial:
+            de/da_ij,k =  q^-k D_i/C_i y_j
+            de/db_ij,k = -q^-k D_i/(C_i F_ij) u_j
+            de/dc_i,k  = -q^-k e_i/C_i
+            de/dd_i,k  =  q^-k e_i/D_i
+            de/df_ij,k =  q^-k D_i B_ij/(C_i F_ij^2) u_j
+        """
+        self.coef[self.free[self.rows[i]]] = theta
+        c, d = self.C[i, 0], self.D[i, 0]
+        N = y.shape[1]
+        J = empty((N, self.rows[i].stop - self.rows[i].start))
+        e = None
+        for n, j, cols, lags in self._groups[i]:
+            if n == 0:
+                x = lfilter(d, c, y[j[1]])
+            elif n == 1:
+                x = -lfilter(d, convolve(c, self.F[j]), u[j[1]])
+            elif n == 4:
+                F = self.F[j]
+                x = lfilter(convolve(d, self.B[j]), convolve(c, convolve(F, F)), u[j[1]])
+            else:
+                e = self._residuals(i, u, y) if e is None else e
+                x = -lfilter([1], c, e) if n == 2 else lfilter([1], d, e)
+            J[:, cols] = _lagged(x, lags)
+        return J
+
+    def stacked_jacobian(self, theta, u, y):
+        """
+        Returns the (ny*N x nparam) Jacobian of stacked(theta, u, y), a
+        block diagonal linear operator over the Jacobians of the outputs.
+        """
+        # Deferred imports
+        from scipy.sparse.linalg import LinearOperator
+        J = [self.jacobian(theta[r], i, u, y) for i, r in enumerate(self.rows)]
+        N = y.shape[1]
+
+        def matvec(x):
+            return concatenate([Ji @ x[r] for Ji, r in zip(J, self.rows)])
+
+        def rmatvec(e):
+            return concatenate([Ji.T @ e[i*N:(i+1)*N] for i, Ji in enumerate(J)])
+
+        return LinearOperator((self.ny*N, self.nparam), matvec=matvec, rmatvec=rmatvec)
+
+    def _residuals(self, i, u, y):
+        c, d = self.C[i, 0], self.D[i, 0]
+        e = lfilter(convolve(self.A[i, i], d), c, y[i])
+        for j in self._ypaths[i]:
+            e += lfilter(convolve(self.A[i, j], d), c, y[j])
+        for j in self._upaths[i]:
+            e -= lfilter(convolve(self.B[i, j], d), convolve(c, self.F[i, j]), u[j])
+        return e
+
+    def polys(self):
+        """Returns copies of the polynomials [A, B, C, D, F]."""
+        out = []
+        for X in (self.A, self.B, self.C, self.D, self.F):
+            Y = empty(X.shape, dtype=object)
+            for i in ndindex(X.shape):
+                Y[i] = X[i].copy()
+            out.append(Y)
+        return out
@@ -0,0 +1,163 @@
+"""
+    Subspace identification of state space models in the innovations form
+    (N4SID and MOESP), a non-iterative estimator for MIMO systems.
+"""
+
+# Imports
+from numpy import ascontiguousarray, concatenate, diff, empty, float64, log, sqrt, zeros
+from numpy.lib.stride_tricks import as_strided
+from numpy.linalg import lstsq, pinv, svd
+from scipy.linalg import qr
+from ..io.check import chckin
+from .accr import kalman
+from .trace import count
+
+# Variables
+__all__ = ['n4sid']
+
+
+# Functions
+def _hankel(x, k):
+    """
+    Returns a read-only strided view of the block Hankel matrix of the
+    signal x (N x m), whose row t is [x(t), x(t+1), ..., x(t+k-1)], that is
+    the column i*m + j is x_j(t+i). No data is copied.
+    """
+    x = ascontiguousarray(x, dtype=float64)
+    N, m = x.shape
+    return as_strided(x, shape=(N - k + 1, k*m), strides=(x.strides[0], x.strides[1]),
+                      writeable=False)
+
+
+def _compress(blocks, chunk):
+    """
+    Returns the lower triangular factor L of the LQ factorization Z = L Q of
+    the data matrix Z^T = [B_1, B_2, ...] (the blocks are views with the
+    same number of rows), normalized such that L L^T = Z Z^T/M. The QR
+    factorization of Z^T is accumulated over chunks of rows, so that only
+    one chunk is copied at a time.
+    """
+    M = blocks[0].shape[0]
+    d = sum(b.shape[1] for b in blocks)
+    R = zeros((0, d))
+    for k in range(0, M, chunk):
+        Zc = concatenate([b[k:k+chunk] for b in blocks], axis=1)
+        R = qr(concatenate((R, Zc)), mode='r')[0][0:d]
+        count('qr')
+    return R.T/sqrt(M)
+
+
+def _order(sv, nmax):
+    """Returns the order at the largest gap of the log singular values sv[0:nmax+1]."""
+    s = log(sv[0:nmax+1] + 1e-300*sv[0])
+    return int((-diff(s)).argmax()) + 1
+
+
+def n4sid(nx, u, y=None, f=10, p=None, weight='moesp', feedthrough=False, chunk=65536, ts=1):
+    """
+    Estimates a state space model in the innovations form
+        x(t+1) = A x(t) + B u(t) + K e(t)
+          y(t) = C x(t) + D u(t) + e(t)
+    with the subspace method:
+        - the block Hankel matrices of the future inputs U_f and outputs Y_f
+          (f block rows) and of the past data W_p = [U_p; Y_p] (p block
+          rows) are strided views of the signals, compressed by the LQ
+          factorization [U_f; W_p; Y_f] = L Q accumulated over chunks of
+          samples;
+        - the oblique projection of Y_f onto W_p along U_f, O = L32 L22^+ W_p,
+          is weighted and factored by the SVD, whose n dominant directions
+          give the extended observability matrix G;
+        - the state sequence x(t) = G^+ O(t) is computed from the data, and
+          [A B; C D] are estimated by least squares from x(t+1) and y(t);
+        - the Kalman gain K and the innovation covariance Re are computed
+          from the covariances of the residuals (see accr.kalman).
+    The cost grows linearly with N and there is no iteration, which makes
+    the method suitable for systems with many outputs, and as an initial
+    guess for the prediction error methods (see ssmodel.polys).
+
+    Parameters
+    ----------
+    nx : int or None
+        Order of the model. If None, it is chosen at the largest gap of the
+        logarithm of the singular values, up to f*ny - 1.
+    u : array_like or iddata
+        Input data array (N x nu) or an iddata object with the input and
+        output data.
+    y : array_like, optional
+        Output data array (N x ny). Not used when u is an iddata object.
+    f : int, optional
+        Number of block rows of the future, larger than the order. Default
+        is 10.
+    p : int, optional
+        Number of block rows of the past. Default is f.
+    weight : string, optional
+        Weighting of the SVD: 'moesp' (PO-MOESP, the projection orthogonal
+        to U_f, default) or 'n4sid' (no weighting).
+    feedthrough : bool, optional
+        Estimates D. Default is False, D = 0.
+    chunk : int, optional
+        Number of samples of the chunks of the LQ factorization. Default is
+        65536.
+    ts : float, optional
+        Sample time. Default is 1.
+    Returns
+    -------
+    m : ssmodel
+        Estimated model, with the singular values of the weighted
+        projection in m.sv, used to select the order.
+    """
+    # Transform everything in array for use with numpy
+    _, _, _, _, _, _, u, y = chckin([], [], [], [], [], [], u, y)
+    N, ny = y.shape
+    nu = u.shape[1]
+    p = f if p is None else p
+    if weight not in ('moesp', 'n4sid'):
+        raise ValueError("weight must be 'moesp' or 'n4sid'")
+    if nx is not None and not 0 < nx < f*ny:
+        raise ValueError('The order must be positive and smaller than f*ny')
+    M = N - p - f + 1
+    if M < f*nu + p*(nu + ny) + f*ny:
+        raise ValueError('Not enough samples for {} past and {} future block rows'.format(p, f))
+    # Block Hankel views: the column t of the data matrix is the window of
+    # samples t, ..., t+p+f-1
+    w = concatenate((u, y), axis=1)
+    Uf = _hankel(u, f)[p:p+M]
+    Wp = _hankel(w, p)[0:M]
+    Yf = _hankel(y, f)[p:p+M]
+    L = _compress([Uf, Wp, Yf], chunk)
+    a, b = f*nu, p*(nu + ny)
+    L21, L22 = L[a:a+b, 0:a], L[a:a+b, a:a+b]
+    L32 = L[a+b:, a:a+b]
+    # Oblique projection O = Lp W_p
+    Lp = lstsq(L22.T, L32.T, rcond=None)[0].T
+    if weight == 'moesp':
+        U, sv, _ = svd(L32)
+    else:
+        U, sv, _ = svd(Lp @ concatenate((L21, L22), axis=1))
+    if nx is None:
+        nx = _order(sv, min(f*ny - 1, sv.size - 1))
+    G = U[:, 0:nx]*sqrt(sv[0:nx])
+    # State sequence x(t), t = p, ..., p+M-1
+    T = pinv(G) @ Lp
+    x = empty((M, nx))
+    for k in range(0, M, chunk):
+        x[k:k+chunk] = Wp[k:k+chunk] @ T.T
+    # Least squares [x(t+1); y(t)] = [A B; C D] [x(t); u(t)] + [w(t); v(t)]
+    ut, yt = u[p:p+M-1], y[p:p+M-1]
+    phi = concatenate((x[0:-1], ut), axis=1)
+    AB = lstsq(phi, x[1:], rcond=None)[0]
+    W = x[1:] - phi @ AB
+    if feedthrough:
+        CD = lstsq(phi, yt, rcond=None)[0]
+    else:
+        CD = concatenate((lstsq(x[0:-1], yt, rcond=None)[0], zeros((nu, ny))))
+    V = yt - phi @ CD
+    A, B = AB[0:nx].T, AB[nx:].T
+    C, D = CD[0:nx].T, CD[nx:].T
+    # Noise covariances and the steady state Kalman filter
+    n = M - 1
+    Q, R, S = W.T @ W/n, V.T @ V/n, W.T @ V/n
+    m = kalman(A, B if nu > 0 else None, C, D, Q, R, S, ts)
+    m.name = 'n4sid'
+    m.sv = sv
+    return m
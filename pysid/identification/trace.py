@@ -0,0 +1,166 @@
+"""
+    Instrumentation of the estimators: time of each stage, cost and number
+    of evaluations of the minimizations, and number of calls of the
+    filters and QR factorizations.
+
+    The estimators take a trace keyword argument:
+        t = trace()
+        m = bj(nb, nc, nd, nf, nk, u, y, trace=t)
+        t.stages    # [('initialization', 0.01), ('minimization', 0.2), ...]
+        m.trace     # the same trace
+    pem and the time series estimators (ar, arma and ma) return the
+    polynomials, not a model, so the trace is not attached and the caller
+    must keep its own reference to it.
+    When no trace is given the estimators receive NOTRACE, whose methods
+    do nothing, so that the instrumentation costs one method call per
+    record. The traces counting the calls are kept in a context variable,
+    so an estimation only counts its own calls and the ones of its worker
+    threads (see multistart._map), not the ones of concurrent estimations.
+"""
+
+# Imports
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from .models import polymodel
+
+# Variables
+__all__ = ['trace']
+
+# Traces counting the calls (see count), the ones of the running estimations
+# of the current context
+_active = ContextVar('traces', default=())
+
+
+# Functions
+def count(name, n=1):
+    """Adds n calls of name to the active traces."""
+    for t in _active.get():
+        t.calls[name] = t.calls.get(name, 0) + n
+
+
+def lfilter(b, a, x, axis=-1, zi=None):
+    """scipy.signal.lfilter, counted by the active traces."""
+    # Deferred imports
+    from scipy.signal import lfilter
+    if _active.get():
+        count('lfilter')
+    return lfilter(b, a, x, axis, zi)
+
+
+def traced(estimator):
+    """
+    Decorator of the estimators with a trace keyword argument. Without a
+    trace, the estimator is called with NOTRACE. Otherwise the trace is
+    active (it counts the calls) during the estimation, and it is attached
+    to the returned model, if it is a polymodel (not to the polynomials
+    returned by pem, ar, arma and ma).
+    """
+    @wraps(estimator)
+    def traced_estimator(*args, trace=None, **kwargs):
+        if trace is None:
+            return estimator(*args, trace=NOTRACE, **kwargs)
+        with trace:
+            out = estimator(*args, trace=trace, **kwargs)
+        if isinstance(out, polymodel):
+            out.trace = trace
+        return out
+    return traced_estimator
+
+
+# Classes
+class trace():
+    """
+    Records of one or more estimations:
+        stages  list of (name, seconds), the time of each stage of the
+                estimators, in order
+        costs   list of (output, cost) of each evaluation of the residuals
+                in the minimizations (cost = |e|^2/2), or of each iteration
+                of the iterative methods
+        solves  list of dicts with the output (None for joint problems),
+                cost, nfev, njev and status of each least_squares result
+        calls   dict with the number of calls of 'lfilter' and 'qr'
+    The costs of the evaluations are not recorded for minimizations run by
+    an executor, they may run in another process.
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Called as callback(event, info) for each record, with event one of
+        'stage', 'cost' and 'solve', and info the record. Default is None.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.stages = []
+        self.costs = []
+        self.solves = []
+        self.calls = {}
+        self._t = None
+        self._tokens = []
+
+    def __enter__(self):
+        self._tokens.append(_active.set(_active.get() + (self,)))
+        self._t = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _active.reset(self._tokens.pop())
+        return False
+
+    def __repr__(self):
+        stages = ', '.join('{} {:.3g}s'.format(*s) for s in self.stages)
+        nfev = sum(s['nfev'] for s in self.solves)
+        return 'trace({}; {} solves, {} evaluations; {})'.format(stages, len(self.solves), nfev,
+                                                               self.calls)
+
+    def _emit(self, event, info):
+        if self.callback is not None:
+            self.callback(event, info)
+
+    def stage(self, name):
+        """Records the time since the previous stage (or the start) as the stage name."""
+        t = perf_counter()
+        if self._t is None:
+            self._t = t
+        self.stages.append((name, t - self._t))
+        self._t = t
+        self._emit('stage', self.stages[-1])
+
+    def cost(self, i, value):
+        """Records the cost of an evaluation (or iteration) of the output i."""
+        self.costs.append((i, value))
+        self._emit('cost', self.costs[-1])
+
+    def solve(self, i, sol):
+        """Records the least_squares result sol of the output i."""
+        self.solves.append({'output': i, 'cost': sol.cost, 'nfev': sol.nfev,
+                            'njev': sol.njev, 'status': sol.status})
+        self._emit('solve', self.solves[-1])
+
+    def residuals(self, fun, i):
+        """Returns fun (residuals of the output i), recording the cost of each call."""
+        def traced_residuals(*args):
+            e = fun(*args)
+            self.cost(i, 0.5*(e @ e))
+            return e
+        return traced_residuals
+
+
+class _notrace():
+    """Trace that records nothing, used when no trace is given."""
+
+    def stage(self, name):
+        pass
+
+    def cost(self, i, value):
+        pass
+
+    def solve(self, i, sol):
+        pass
+
+    def residuals(self, fun, i):
+        return fun
+
+
+NOTRACE = _notrace()
@@ -12,24 +12,29 @@ eye, reshape, convolve, sqrt, where, nonzero, correlate, equal, ndarray, pi, \
 absolute, exp, log, real
 from scipy.linalg import qr, solve, toeplitz
 from numpy.linalg import matrix_rank
-from scipy.signal import lfilter, periodogram
-from scipy.optimize import leastsq, least_squares
-import numpy.fft as fft
 # Internal imports
 from .solvers import ls, levinson, burg
 from ..io.check import chckin
+from ..io.iddata import iddata
+from .trace import lfilter, traced
 # functions
 __all__ = ['ar', 'arma', 'ma']
 # implementations
-def ar(na, y, md = 'yw'):
+@traced
+def ar(na, y, md = 'yw', trace=None):
     """
     This function estimate a AR model based on output data provided in the
     vector y. This particular function returns the polynomial A(q) from the
     following AR model:
         A(q)y(t) = e(t)
     Inputs:
+        trace - Records the cost of each evaluation and the result of the
+                minimization of md='pem' (see trace.trace). It is not
+                attached to the output, the caller keeps the reference
     Outputs:
     """
+    # Deferred imports
+    from scipy.optimize import least_squares
     na, _, _, _, _, _, _, y = chckin(na, [], [], [], [], [], y, y)
     Ny, ny = shape(y)
     na = na.item()
@@ -52,17 +57,26 @@ def ar(na, y, md = 'yw'):
             return lfilter(append([1], theta[0:na]), [1], y, axis=0)
         # Least Squares Initialization
         thetai = ls(na, -1, 0, y, y)[0]
-        sol = least_squares(pe, thetai, gtol=1e-15, args=(na, y.reshape((Ny))))
+        sol = least_squares(trace.residuals(pe, 0), thetai, gtol=1e-15,
+                            args=(na, y.reshape((Ny))))
+        trace.solve(0, sol)
         theta = sol.x
         A = append([1], theta)
     return A
 
-def arma(na, nc, y, md='pem'):
+@traced
+def arma(na, nc, y, md='pem', trace=None):
     """
     This functions estimates the parameters of an ARMA model defined as:
         A(q)y(t) = C(q)e(t)
+    The optional trace (see trace.trace) records the cost of each evaluation
+    and the result of the minimization of md='pem'. It is not attached to
+    the returned polynomials, the caller keeps the reference.
     """
+    # Deferred imports
+    from scipy.optimize import least_squares
     na, _, nc, _, _, _, _, y = chckin(na, [], nc, [], [], [], y, y)
+    na, nc = na.item(), nc.item()
     # size
     Ny, ny = shape(y)
     # Hannan-Rissanen Algorithm
@@ -97,19 +111,32 @@ def arma(na, nc, y, md='pem'):
         ehat = lfilter(Ar, [1], y, axis=0)
         A1, B1 = ls(na, nc-1, 1, ehat, y)
         thetai = concatenate((A1, B1))
-        sol = least_squares(pe, thetai, gtol=1e-15, args=(na, nc, y.reshape((Ny))))
+        sol = least_squares(trace.residuals(pe, 0), thetai, gtol=1e-15,
+                            args=(na, nc, y.reshape((Ny))))
+        trace.solve(0, sol)
         theta = sol.x
         A = append([1], theta[0:na])
         B = append([1], theta[na:])
     return [A, B]
 
-def ma(nc, y, md='durbin'):
+@traced
+def ma(nc, y, md='durbin', trace=None):
     """
     This function estimates the parameters of a moving average model in the form:
         y(t) = C(q)e(t)
+    The optional trace (see trace.trace) records the cost of each evaluation
+    and the result of the minimization of md='pem'. It is not attached to
+    the returned polynomials, the caller keeps the reference.
     """
+    # Deferred imports
+    from scipy.signal import periodogram
+    from scipy.optimize import least_squares
+    import numpy.fft as fft
     nc = array(nc)
-    y = array(y)
+    if isinstance(y, iddata):
+        y = y.y
+    else:
+        y = array(y)
     Ny, ny = shape(y)
     # Durbin Method
     if md == 'durbin':
@@ -158,7 +185,9 @@ def ma(nc, y, md='durbin'):
         ehat = lfilter(Ar, [1], y, axis=0)
         # Least Squares Initialization
         thetai = ls(0, nc-1, 1, ehat, y)[1]
-        sol = least_squares(pe, thetai, gtol=1e-15, args=(nc, y.reshape((Ny))))
+        sol = least_squares(trace.residuals(pe, 0), thetai, gtol=1e-15,
+                            args=(nc, y.reshape((Ny))))
+        trace.solve(0, sol)
         theta = sol.x
         C = append([1], theta)
     return C
@@ -1,3 +1,5 @@
 # Initialization of IO module from pysid
 from .csv_data import *
+from .iddata import *
+from .bin_data import *
 from .print import *
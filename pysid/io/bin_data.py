@@ -0,0 +1,269 @@
+"""
+    Binary dataset format with memory-mapped, lazy access to the channels.
+
+    A binary dataset file is made of:
+        - the magic string b'PYSIDBIN' and a little-endian uint32 with the
+          size of the header;
+        - a JSON header with the sample time (ts), the channel names, the
+          input/output split (nu, ny), the number of samples (N) and the
+          data type of the samples;
+        - the raw data block, stored channel by channel (nu + ny rows of N
+          samples each, inputs first), starting at a 64 bytes aligned offset.
+    Since each channel is contiguous on disk, reading a subset of channels
+    and a time range only touches the pages that hold those samples.
+"""
+
+from json import dumps, loads
+from struct import pack, unpack
+from numpy import asarray, ascontiguousarray, dtype as npdtype, float64, memmap
+from .iddata import iddata
+from .csv_data import load_chunks
+import errno
+import os
+
+__all__ = ['bindata', 'load_bin', 'save_bin', 'csv_to_bin']
+
+MAGIC = b'PYSIDBIN'
+ALIGN = 64
+
+
+def _write_header(f, N, nu, ny, ts, names, dtype):
+    """Writes the header of a binary dataset file and returns the data offset."""
+    header = {'N': int(N), 'nu': int(nu), 'ny': int(ny), 'ts': ts,
+              'names': list(names), 'dtype': npdtype(dtype).str}
+    header = dumps(header).encode('utf-8')
+    offset = len(MAGIC) + 4 + len(header)
+    # Pad the header with spaces so that the data block is aligned
+    header += b' '*(-offset % ALIGN)
+    f.write(MAGIC + pack('<I', len(header)) + header)
+    return f.tell()
+
+
+def _read_header(filename):
+    """Returns the header (as a dict) and the data offset of a binary dataset file."""
+    try:
+        with open(filename, 'rb') as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError(filename + ' is not a pysid binary dataset')
+            size = unpack('<I', f.read(4))[0]
+            header = loads(f.read(size).decode('utf-8'))
+            return header, f.tell()
+    except IOError:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), filename) from None
+
+
+def _channel_names(names, nu, ny):
+    """Returns the channel names, filling the missing ones with u1, ..., y1, ..."""
+    if names is None:
+        names = ['u' + str(i+1) for i in range(nu)] + ['y' + str(i+1) for i in range(ny)]
+    names = [str(name).strip() for name in names]
+    if len(names) != nu + ny:
+        raise ValueError('names must have nu + ny elements')
+    return names
+
+
+class bindata():
+    """
+    Lazy, read-only access to a binary dataset file. The samples are mapped
+    with numpy.memmap and are only read from disk when they are used.
+
+    Parameters
+    ----------
+    filename : string
+        Name of the binary dataset file.
+    """
+
+    def __init__(self, filename):
+        header, offset = _read_header(filename)
+        self.filename = filename
+        self.N = header['N']
+        self.nu = header['nu']
+        self.ny = header['ny']
+        self.ts = header['ts']
+        self.names = header['names']
+        self.map = memmap(filename, dtype=header['dtype'], mode='r', offset=offset,
+                          shape=(self.nu + self.ny, self.N))
+
+    def __repr__(self):
+        return '{}({!r}, N={}, nu={}, ny={}, ts={})'\
+            .format(type(self).__name__, self.filename, self.N, self.nu, self.ny, self.ts)
+
+    @property
+    def inputs(self):
+        return self.names[0:self.nu]
+
+    @property
+    def outputs(self):
+        return self.names[self.nu:]
+
+    def index(self, channel):
+        """Returns the row of a channel given by its name or by its (global) index."""
+        if isinstance(channel, str):
+            return self.names.index(channel)
+        return int(channel)
+
+    def channel(self, channel, start=0, stop=None):
+        """Returns a read-only view of the samples [start, stop) of a channel."""
+        return self.map[self.index(channel), start:stop]
+
+    def getdata(self, inputs=None, outputs=None, start=0, stop=None, dtype=float64):
+        """
+        Returns an iddata object with the selected channels and time range.
+        Only the requested samples are read from disk. Single channel
+        selections are not copied when dtype matches the stored data type.
+
+        Parameters
+        ----------
+        inputs : list, optional
+            Names or indexes (0, ..., nu-1) of the inputs. Default is all the inputs.
+        outputs : list, optional
+            Names or indexes (0, ..., ny-1) of the outputs. Default is all the outputs.
+        start : int, optional
+            First sample. Default is 0.
+        stop : int, optional
+            Last sample (not included). Default is N.
+        dtype : data-type, optional
+            Data type of the iddata buffers. Default is float64.
+        Returns
+        -------
+        data : iddata
+            Dataset with the selected inputs and outputs.
+        """
+        if inputs is None:
+            inputs = range(self.nu)
+        if outputs is None:
+            outputs = range(self.ny)
+        iu = [self.index(i) if isinstance(i, str) else int(i) for i in inputs]
+        iy = [self.index(i) if isinstance(i, str) else self.nu + int(i) for i in outputs]
+        if any(i < 0 or i >= self.nu for i in iu) or any(i < self.nu or i >= self.nu + self.ny for i in iy):
+            raise ValueError('Invalid input or output selection')
+        u = self._block(iu, start, stop)
+        y = self._block(iy, start, stop)
+        return iddata(u, y, self.ts, dtype)
+
+    def _block(self, rows, start, stop):
+        """Returns the (N x len(rows)) block of the selected channels."""
+        if len(rows) == 1:
+            # A (1 x N) contiguous row is also a contiguous (N x 1) column
+            return self.map[rows[0], start:stop].reshape((-1, 1))
+        if len(rows) == 0:
+            return self.map[0:0, start:stop].T
+        return ascontiguousarray(self.map[rows, start:stop].T)
+
+
+def load_bin(filename):
+    """Opens a binary dataset file and returns a bindata object."""
+    return bindata(filename)
+
+
+def save_bin(data, filename, nu=None, ts=1, names=None, dtype=float64):
+    """
+    Saves a dataset into a binary dataset file.
+
+    Parameters
+    ----------
+    data : ndarray or iddata
+        Dataset in the form [input, output] (N x (nu + ny)), a single
+        channel (N,) or an iddata object.
+    filename : string
+        Name of the file.
+    nu : int, optional
+        Number of inputs, that is, the number of the first columns of data
+        that are inputs. Not used when data is an iddata object.
+    ts : float, optional
+        Sample time. Not used when data is an iddata object. Default is 1.
+    names : list, optional
+        Channel names, inputs first. Default is u1, ..., y1, ...
+    dtype : data-type, optional
+        Data type of the stored samples. Default is float64.
+    Returns
+    -------
+
+    """
+    if isinstance(data, iddata):
+        nu, ts = data.nu, data.ts
+        rows = data.u.T, data.y.T
+    else:
+        if nu is None:
+            raise ValueError('The number of inputs nu must be provided')
+        data = asarray(data)
+        if data.ndim == 1:
+            data = data.reshape((-1, 1))
+        if data.ndim != 2:
+            raise ValueError('data must be an N x (nu + ny) array')
+        rows = (data.T,)
+    nch = sum(r.shape[0] for r in rows)
+    N = rows[0].shape[1]
+    names = _channel_names(names, nu, nch - nu)
+    with open(filename, 'wb') as f:
+        offset = _write_header(f, N, nu, nch - nu, ts, names, dtype)
+    out = memmap(filename, dtype=dtype, mode='r+', offset=offset, shape=(nch, N))
+    k = 0
+    for r in rows:
+        out[k:k+r.shape[0]] = r
+        k += r.shape[0]
+    out.flush()
+    del out
+
+
+def csv_to_bin(csvname, binname, nu, ts=1, names=None, delim=",", skip_rows=1,
+               chunksize=100000, dtype=float64):
+    """
+    Converts a .csv dataset (as saved by save_data) into a binary dataset file.
+    The csv file is parsed in chunks of rows, so that the whole file is never
+    held in memory.
+
+    Parameters
+    ----------
+    csvname : string
+        Name of the .csv file.
+    binname : string
+        Name of the binary dataset file to be created.
+    nu : int
+        Number of inputs, that is, the number of the first columns that are inputs.
+    ts : float, optional
+        Sample time. Default is 1.
+    names : list, optional
+        Channel names. Default is the header of the csv file when skip_rows > 0,
+        otherwise u1, ..., y1, ...
+    delim : string, optional
+        Column delimiter. Default is ",".
+    skip_rows : int, optional
+        Number of skipped rows. Default is 1, for the file header.
+    chunksize : int, optional
+        Number of rows parsed at once. Default is 100000.
+    dtype : data-type, optional
+        Data type of the stored samples. Default is float64.
+    Returns
+    -------
+    data : bindata
+        The converted dataset.
+    """
+    try:
+        f = open(csvname, 'r')
+    except IOError:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), csvname) from None
+    with f:
+        # First pass: header, number of samples and of channels
+        header = [next(f, '') for i in range(skip_rows)]
+        first = next(f, '')
+        nch = len(first.split(delim))
+        N = 1 + sum(1 for line in f if line.strip()) if first.strip() else 0
+    if N == 0:
+        raise ValueError(csvname + ' has no data')
+    if names is None and skip_rows > 0 and len(header[-1].split(delim)) == nch:
+        names = header[-1].split(delim)
+    names = _channel_names(names, nu, nch - nu)
+    with open(binname, 'wb') as f:
+        offset = _write_header(f, N, nu, nch - nu, ts, names, dtype)
+    out = memmap(binname, dtype=dtype, mode='r+', offset=offset, shape=(nch, N))
+    # Second pass: parse the data in chunks
+    k = 0
+    for block in load_chunks(csvname, nu, chunksize, delim, skip_rows, dtype=dtype):
+        out[0:nu, k:k+block.N] = block.u.T
+        out[nu:, k:k+block.N] = block.y.T
+        k += block.N
+    out.flush()
+    del out
+    return bindata(binname)
@@ -4,12 +4,13 @@
 
 # Imports
 from numpy import array, amax, ndarray, expand_dims, size, shape, floor
+from .iddata import iddata
 # Variables
 __all__ = ['chckin']
 
 
 # functions
-def chckin(na, nb, nc, nd, nf, nk, u, y):
+def chckin(na, nb, nc, nd, nf, nk, u, y=None):
     """
     Function used to handle input arguments for prediction error method (PEM)
     identification, following the general polynomial model:
@@ -29,10 +30,12 @@ def chckin(na, nb, nc, nd, nf, nk, u, y):
         Array of integers relative to the F(q) polynomial.     
     nk : array_like
         Array of integers relative to the model's time delay.
-    u : array_like
-        Input data array.
-    y : array_like
-        Output data array.
+    u : array_like or iddata
+        Input data array or an iddata object holding both input and output.
+        The signals of an iddata object are already validated and are used
+        as they are (no conversions or copies).
+    y : array_like, optional
+        Output data array. Not used when u is an iddata object.
     Returns
     -------
     na : array_like
@@ -53,6 +56,10 @@ def chckin(na, nb, nc, nd, nf, nk, u, y):
         Validated output array.
     """
 
+    # Validated datasets skip all the data conversions
+    isdata = isinstance(u, iddata)
+    if isdata:
+        u, y = u.u, u.y
     # Check if is at least a list or array
     if not isinstance(na, (int, list, ndarray)) or not isinstance(nb, (int, list, ndarray)) or\
        not isinstance(nc, (int, list, ndarray)) or not isinstance(nd, (int, list, ndarray)) or\
@@ -72,15 +79,16 @@ def chckin(na, nb, nc, nd, nf, nk, u, y):
         nf = array(nf, ndmin=2)
     if isinstance(nk, (int, list)):
         nk = array(nk, ndmin=2)
-    if isinstance(u, (int, float, list, tuple)):
-        u = array(u, ndmin=2)
-    if isinstance(y, (int, float, list, tuple)):
-        y = array(y, ndmin=2)
-    # Check dimension
-    if len(u.shape) < 2:
-        u = expand_dims(u, axis=1)
-    if len(y.shape) < 2:
-        y = expand_dims(y, axis=1)
+    if not isdata:
+        if isinstance(u, (int, float, list, tuple)):
+            u = array(u, ndmin=2)
+        if isinstance(y, (int, float, list, tuple)):
+            y = array(y, ndmin=2)
+        # Check dimension
+        if len(u.shape) < 2:
+            u = expand_dims(u, axis=1)
+        if len(y.shape) < 2:
+            y = expand_dims(y, axis=1)
     # Check the shapes
     Ny, ny = shape(y)
     Nu, nu = shape(u)
@@ -92,10 +100,10 @@ def chckin(na, nb, nc, nd, nf, nk, u, y):
     rk, ck = shape(nk)
     L = int(amax([amax(na, initial=0), amax(nb + nk, initial=0), amax(nc, initial=0), amax(nd, initial=0), amax(nf, initial=0)]))
     # Different number of Data
-    if Ny != Nu:
+    if not isdata and Ny != Nu:
         raise Exception('Input and Output must be the same number of data samples')
     #second case for when its not possible to make the high order model in armax
-    if Ny < L or int(floor((Nu - amax(nk)*(nu+1))/(nu+2))) <= 1:
+    if Ny < L or int(floor((Nu - amax(nk, initial=0)*(nu+1))/(nu+2))) <= 1:
         raise Exception('Not enough data for model identification')
     # Classify Into the structures: Initial Variables
     #isAR = True
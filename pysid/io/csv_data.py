@@ -5,13 +5,14 @@
 """
 
 
-from numpy import loadtxt, savetxt, concatenate, sqrt
+from itertools import islice
+from numpy import loadtxt, savetxt, concatenate, sqrt, asarray, float64
 from numpy.random import rand, randn
-from scipy.signal import lfilter
+from .iddata import iddata
 import errno
 import os
 
-__all__ = ['load_data', 'save_data', 'gen_data']
+__all__ = ['load_data', 'save_data', 'gen_data', 'load_chunks', 'csvwriter']
 
 def gen_data(Ao, Bo, N, u, e_var):
     """
@@ -37,6 +38,8 @@ def gen_data(Ao, Bo, N, u, e_var):
     data : ndarray
         Dataset array in the form of [input, output].
     """
+    # Deferred import
+    from scipy.signal import lfilter
     # Replicates the following experiment:
     # y(t) = Go(q)*u(t) + Ho(q)*e(t),
     # where u(t) is the system input and e(t) white noise
@@ -98,3 +101,125 @@ def save_data(data, filename="data.csv", delim=",", hdr="Input, Output"):
         print("csv_data.py::save_data -- Successfully saved data as " + filename + ".")
     except:
         print("csv_data.py::save_data -- Error saving data.")
+
+def load_chunks(filename, nu, chunksize=10000, delim=",", skip_rows=1, usecols=None, dtype=float64):
+    """
+    Reads a dataset from a .csv file in blocks of chunksize samples, so that
+    the whole file is never held in memory. Each block is returned as an
+    iddata object, which can be unpacked as an (u, y) pair or passed
+    directly to the estimators:
+        for u, y in load_chunks("data.csv", 1):
+            ...
+
+    Parameters
+    ----------
+    filename : string
+        Name of the file (with extension) from which the dataset is loaded.
+    nu : int
+        Number of inputs, that is, the number of the first (selected) columns
+        that are inputs. The remaining ones are outputs.
+    chunksize : int, optional
+        Number of samples of each block. The last block may be shorter.
+        Blank and comment ('#') lines are skipped, like in load_data, and
+        are not counted. Default is 10000.
+    delim : string, optional
+        Column delimiter. Default is "," for .csv files.
+    skip_rows : int, optional
+        Number of skipped rows. Default is 1, for the file header.
+    usecols : list, optional
+        Indexes of the columns to be read. Default is all the columns.
+    dtype : data-type, optional
+        Either float64 (default) or float32.
+    Returns
+    -------
+    data : generator of iddata
+        Blocks of the dataset.
+    """
+    try:
+        f = open(filename, 'r')
+    except IOError:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), filename) from None
+    with f:
+        for i in range(skip_rows):
+            next(f, None)
+        # Data lines only, so that the blocks only end at the end of file
+        rows = (line for line in f if line.split('#', 1)[0].strip())
+        while True:
+            lines = list(islice(rows, chunksize))
+            if not lines:
+                return
+            block = loadtxt(lines, dtype=dtype, delimiter=delim, usecols=usecols, ndmin=2)
+            yield iddata(block[:, 0:nu], block[:, nu:], dtype=dtype)
+
+class csvwriter():
+    """
+    Buffered writer of datasets (or results) to a .csv file. The rows are
+    accumulated in memory and written in large blocks, each one formatted
+    at once instead of row by row:
+        with csvwriter("results.csv", hdr="u, y, yhat") as w:
+            for block in blocks:
+                w.write(block)
+
+    Parameters
+    ----------
+    filename : string
+        Name of the file (with extension) where the data shall be saved.
+    delim : string, optional
+        Column delimiter. Default is "," for .csv files.
+    hdr : str, optional
+        File header for column labelling. Default is "Input, Output"
+    fmt : str, optional
+        Format of each value. Default is '%.18e', as in numpy.savetxt.
+    bufsize : int, optional
+        Number of rows kept in memory before writing. Default is 65536.
+    """
+
+    def __init__(self, filename, delim=",", hdr="Input, Output", fmt='%.18e', bufsize=65536):
+        self.filename = filename
+        self.delim = delim
+        self.fmt = fmt
+        self.bufsize = bufsize
+        self.buffer = []
+        self.nrows = 0
+        self.ncols = None
+        self.file = open(filename, 'w')
+        if hdr:
+            self.file.write(hdr + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data):
+        """Appends the rows of data (N x ncols), or of an iddata object, to the file."""
+        if isinstance(data, iddata):
+            data = concatenate((data.u, data.y), axis=1)
+        data = asarray(data, dtype=float64)
+        if data.ndim < 2:
+            data = data.reshape((-1, 1))
+        if self.ncols is None:
+            self.ncols = data.shape[1]
+        elif data.shape[1] != self.ncols:
+            raise ValueError('All the blocks must have the same number of columns')
+        self.buffer.append(data)
+        self.nrows += data.shape[0]
+        if self.nrows >= self.bufsize:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered rows to the file."""
+        if self.nrows > 0:
+            data = concatenate(self.buffer, axis=0)
+            row = self.delim.join([self.fmt]*self.ncols) + '\n'
+            self.file.write((row*data.shape[0]) % tuple(data.ravel()))
+            self.buffer = []
+            self.nrows = 0
+        self.file.flush()
+
+    def close(self):
+        """Writes the remaining rows and closes the file."""
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
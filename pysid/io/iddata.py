@@ -0,0 +1,115 @@
+"""
+    Data container for identification datasets
+"""
+
+# Imports
+from numpy import ascontiguousarray, dtype as npdtype, float32, float64, ndarray
+from numpy.lib.stride_tricks import as_strided
+
+# Variables
+__all__ = ['iddata', 'lagview']
+
+
+# functions
+def lagview(x, L, n, d=0):
+    """
+    Returns a read-only strided view of the lagged samples of a signal, such
+    that the row associated to the time instant t (t = L, ..., N-1) is
+        [x(t-d), x(t-d-1), ..., x(t-d-n+1)]
+    This is the same matrix built by toeplitz(x[L-d:N-d], x[L-d-n+1:L-d+1][::-1]),
+    but no data is copied.
+
+    Parameters
+    ----------
+    x : ndarray
+        One dimensional signal (it may be a column of a 2D array).
+    L : int
+        First time instant of the regressor, usually the maximum lag.
+    n : int
+        Number of lags (columns of the view).
+    d : int, optional
+        Delay applied to the first column. Default is 0.
+    Returns
+    -------
+    phi : ndarray
+        Read-only (N-L) x n view of x.
+    """
+    if not isinstance(x, ndarray) or x.ndim != 1:
+        raise ValueError('x must be an one dimensional numpy.ndarray')
+    N = x.shape[0]
+    if d < 0 or L - d - n + 1 < 0 or L > N:
+        raise ValueError('Not enough samples for the requested lags')
+    s = x.strides[0]
+    return as_strided(x[L-d:], shape=(N-L, n), strides=(s, -s), writeable=False)
+
+
+# classes
+class iddata():
+    """
+    This class holds a validated identification dataset, that is, the input
+    u(t) and output y(t) signals as C-contiguous (N x nu) and (N x ny)
+    floating point arrays. Validation and conversion are done only once, when
+    the object is created, so that the same dataset can be passed to several
+    estimators without any further checks or copies:
+        data = iddata(u, y)
+        m1 = arx(na, nb, nk, data)
+        m2 = oe(nb, nf, nk, data)
+
+    Parameters
+    ----------
+    u : array_like
+        Input data array (N x nu). Use None for time series.
+    y : array_like
+        Output data array (N x ny).
+    ts : float, optional
+        Sample time. Default is 1.
+    dtype : data-type, optional
+        Either float64 (default) or float32.
+    """
+
+    # Initialization
+    def __init__(self, u, y, ts=1, dtype=float64):
+        dtype = npdtype(dtype)
+        if dtype != float64 and dtype != float32:
+            raise ValueError('dtype must be either float64 or float32')
+        y = ascontiguousarray(y, dtype=dtype)
+        if y.ndim == 1:
+            y = y.reshape((y.shape[0], 1))
+        if u is None:
+            u = ascontiguousarray(y[:, 0:0])
+        u = ascontiguousarray(u, dtype=dtype)
+        if u.ndim == 1:
+            u = u.reshape((u.shape[0], 1))
+        if u.ndim != 2 or y.ndim != 2:
+            raise ValueError('Input and Output must be at most 2D arrays')
+        if u.shape[0] != y.shape[0]:
+            raise Exception('Input and Output must be the same number of data samples')
+        self.u = u
+        self.y = y
+        self.ts = ts
+        self.N = y.shape[0]
+        self.nu = u.shape[1]
+        self.ny = y.shape[1]
+
+    # Behaves as the (u, y) tuple stored in the polymodel objects
+    def __iter__(self):
+        return (i for i in (self.u, self.y))
+
+    def __getitem__(self, i):
+        return (self.u, self.y)[i]
+
+    def __repr__(self):
+        return '{}(N={}, nu={}, ny={}, ts={}, dtype={})'\
+            .format(type(self).__name__, self.N, self.nu, self.ny, self.ts, self.y.dtype)
+
+    @property
+    def dtype(self):
+        return self.y.dtype
+
+    def ulag(self, j, L, n, d=0):
+        """Returns a read-only view of the lags of the input j (see lagview)."""
+        return lagview(self.u[:, j], L, n, d)
+
+    def ylag(self, j, L, n, d=0):
+        """Returns a read-only view of the lags of the output j (see lagview)."""
+        return lagview(self.y[:, j], L, n, d)
@@ -1,6 +1,22 @@
-from IPython.display import display, Math
 from shutil import which
 
+__all__ = ['coef_to_str', 'poly_to_str', 'matrix_to_str', 'print_matrix',
+           'print_poly', 'print_model']
+
+def latex_display():
+    """
+    Returns a function that displays a LaTeX string through IPython, or None
+    when LaTeX or IPython are not available. IPython is only imported here,
+    so that importing pysid does not require it.
+    """
+    if which('latex') is None:
+        return None
+    try:
+        from IPython.display import display, Math
+    except ImportError:
+        return None
+    return lambda s: display(Math(s))
+
 def coef_to_str(c,prec=3):
     """Converts a float coefficient (c) into a string, with precision given by prec."""
     return "{:.{precision}g}".format(c, precision = prec)
@@ -129,21 +145,21 @@ def print_poly(P,dim,name,prec=3):
     s = poly_to_str(P,prec)
     rows, cols = dim[0], dim[1]
     index = 0
-    #print(which('latex'))
-    if which('latex') is not None:
+    show = latex_display()
+    if show is not None:
         for row in range(rows):
             for col in range(cols):
                 if rows == 1 and cols == 1:
                     # Prints SISO subcase
-                    display(Math(r'' + name + '(q^{-1}) = ' + s[index]))
+                    show(r'' + name + '(q^{-1}) = ' + s[index])
                 else:
                     if name == "C" or name == "D":
                         poly_index = "{" + str(row+1) + "}"
-                        display(Math(r'' + name + "_" + poly_index + '(q^{-1}) = ' + s[index]))
+                        show(r'' + name + "_" + poly_index + '(q^{-1}) = ' + s[index])
                     else:
                         # Prints general MIMO case
                         poly_index = "{" + str(row+1) + str(col+1) + "}"
-                        display(Math(r'' + name + "_" + poly_index + '(q^{-1}) = ' + s[index]))
+                        show(r'' + name + "_" + poly_index + '(q^{-1}) = ' + s[index])
                 index = index + 1
     else:
         for row in range(rows):
@@ -202,7 +218,8 @@ def print_model(model,prec=3,only_polynomials=False):
     
         if hasattr(model, 'P'):
             print(f'Accuracy:')
-            if which('latex') is not None:
-                display(Math(matrix_to_str(model.P,prec)))
+            show = latex_display()
+            if show is not None:
+                show(matrix_to_str(model.P,prec))
             else:
                 print_matrix(model.P,prec)
@@ -0,0 +1,17 @@
+"""
+    Fixtures shared by the testing modules
+"""
+import pytest
+from numpy.random import rand, randn, seed
+from scipy.signal import lfilter
+
+# ----------------- Fixtures -----------------
+@pytest.fixture
+def test_signals_siso():
+    # Second order ARX system: y(t) = B/A u(t) + 1/A e(t)
+    seed(1)
+    N = 500
+    u = -1 + 2*rand(N, 1)
+    e = 0.01*randn(N, 1)
+    y = lfilter([0, 0.5, 0.1], [1, -1.2, 0.36], u, axis=0) + lfilter([1], [1, -1.2, 0.36], e, axis=0)
+    return [u, y]
@@ -0,0 +1,124 @@
+"""
+    Testing modules for accr.py using pytest
+"""
+import pytest
+from numpy import allclose, array, block, eye, kron, stack, trace, zeros
+from numpy.linalg import eigvals, inv
+from numpy.random import randn, seed
+from scipy.linalg import solve_discrete_are, solve_discrete_lyapunov, toeplitz
+from scipy.signal import lfilter
+from pysid.identification.accr import crlbarma, crlbss, kalman
+from pysid.identification.solvers import arcov, dlyap
+
+# ----------------- Fixtures -----------------
+def sym(X):
+    return X @ X.T
+
+@pytest.fixture
+def test_ss():
+    # Random state space system with n = 3 states, p = 2 outputs and nt = 4 parameters
+    seed(3)
+    n, p, nt = 3, 2, 4
+    F = randn(n, n)
+    F = 0.8*F/max(abs(eigvals(F)))
+    C = randn(p, n)
+    R1 = sym(randn(n, n)) + eye(n)
+    R2 = sym(randn(p, p)) + eye(p)
+    R12 = 0.1*randn(n, p)
+    der = lambda shape, f=lambda X: X: [f(randn(*shape)) for i in range(nt)]
+    return (F, C, R1, R2, R12, nt, der((n, n)), der((p, n)), der((n, n), sym),
+            der((p, p), sym), der((n, p)))
+
+def crlbss_loop(F, C, R1, R2, R12, nt, Fis, Cis, R1is, R2is, R12is):
+    # Reference implementation, one parameter at a time
+    n, p = F.shape[0], C.shape[0]
+    P = solve_discrete_are(F.T, C.T, R1, R2, s=R12)
+    S = inv(C @ P @ C.T + R2)
+    K = (F @ P @ C.T + R12) @ S
+    Fk = F - K @ C
+    Qis, Kis = [], []
+    for i in range(nt):
+        aux = (R1is[i] - K@R12is[i].T - R12is[i]@K.T + K@R2is[i]@K.T) + (Fis[i]-K@Cis[i])@P@Fk.T + Fk@P@(Fis[i] - K@Cis[i]).T
+        Pi = solve_discrete_lyapunov(Fk, aux)
+        Qis.append(Cis[i]@P@C.T + C@P@Cis[i].T + C@Pi@C.T + R2is[i])
+        Kis.append((Fis[i]-K@Cis[i])@P@C.T@S + Fk@Pi@C.T@S + R12is[i]@S + Fk@P@Cis[i].T@S - K@R2is[i]@S)
+    cF = block([[F, zeros((n, n)), zeros((n, n*nt))], [K@C, Fk, zeros((n, n*nt))],
+                [block([[Kis[i]@C] for i in range(nt)]),
+                 block([[Fis[i] - Kis[i]@C - K@Cis[i]] for i in range(nt)]), kron(eye(nt), Fk)]])
+    cK = block([[eye(n), zeros((n, p))], [zeros((n, n)), K], [zeros((n*nt, n)), block([[Ki] for Ki in Kis])]])
+    cC = block([[zeros((nt*p, n)), -block([[Ci] for Ci in Cis]), kron(-eye(nt), C)]])
+    cP = solve_discrete_lyapunov(cF, cK @ block([[R1, R12], [R12.T, R2]]) @ cK.T)
+    PP = cC @ cP @ cC.T
+    M = zeros((nt, nt))
+    for i in range(nt):
+        for j in range(nt):
+            M[i, j] = 0.5*trace(S@Qis[i]@S@Qis[j]) + trace(PP[j*p:(j+1)*p, i*p:(i+1)*p] @ S)
+    return inv(M)
+
+# ----------------- crlbss -----------------
+def test_dlyap(test_ss):
+    F, R = test_ss[0], test_ss[8]
+    X = dlyap(F, R)
+    assert X.shape == (4, 3, 3)
+    for i in range(4):
+        assert allclose(X[i], solve_discrete_lyapunov(F, R[i]))
+    assert allclose(dlyap(F, R[0]), X[0])
+
+def test_crlbss(test_ss):
+    assert allclose(crlbss(*test_ss), crlbss_loop(*test_ss))
+    # Single output
+    F, C, R1, R2, R12, nt, Fis, Cis, R1is, R2is, R12is = test_ss
+    args = (F, C[0:1], R1, R2[0:1, 0:1], R12[:, 0:1], nt, Fis, [Ci[0:1] for Ci in Cis],
+            R1is, [R[0:1, 0:1] for R in R2is], [R[:, 0:1] for R in R12is])
+    assert allclose(crlbss(*args), crlbss_loop(*args))
+
+def test_kalman(test_ss):
+    F, C, R1, R2, R12 = test_ss[0:5]
+    m = kalman(F, None, C, None, R1, R2, R12)
+    X = solve_discrete_are(F.T, C.T, R1, R2, s=R12)
+    assert allclose(m.X, X) and allclose(m.Re, C @ X @ C.T + R2)
+    assert allclose(m.K, (F @ X @ C.T + R12) @ inv(m.Re))
+    assert m.nu == 0 and m.ny == 2 and m.nx == 3
+    # The predictor is built once
+    assert m.filters() is m.filters()
+    # Innovations of the simulated output
+    e = randn(500, 2)
+    y = m.simulate(None, e)
+    assert allclose(y - m.predict(None, y), e)
+
+# ----------------- crlbarma -----------------
+def crlbarma_dense(A, C):
+    # Reference, inverses of the Gohberg-Semencul forms
+    n, m = len(A) - 1, len(C) - 1
+    q = max(n, m)
+    A = list(A) + [0]*(q - n)
+    C = list(C) + [0]*(q - m)
+    T1 = lambda P: toeplitz(P[0:-1], [P[0]] + [0]*(q-1))
+    T2 = lambda P: toeplitz(P[1:][::-1], [P[-1]] + [0]*(q-1))
+    Rxx = inv(T1(A)@T1(A).T - T2(A)@T2(A).T)
+    Rzz = inv(T1(C)@T1(C).T - T2(C)@T2(C).T)
+    Rzx = inv(T1(A)@T1(C).T - T2(C)@T2(A).T)
+    return inv(block([[Rxx[0:n, 0:n], -Rzx.T[0:n, 0:m]], [-Rzx[0:m, 0:n], Rzz[0:m, 0:m]]]))
+
+def test_arcov():
+    D = [1, -1.2, 0.5, -0.1]
+    h = lfilter([1], D, [1] + [0]*2000)
+    r = arcov(D, 6)
+    assert r.shape == (1, 7)
+    assert allclose(r[0], [h[k:] @ h[0:2001-k] for k in range(7)])
+    with pytest.raises(ValueError):
+        arcov([1, -2.5, 1], 3)
+
+def test_crlbarma():
+    A = [1, -1.5, 0.7]
+    C = [1, 0.5]
+    CRLB = crlbarma(A, C, 0.1)
+    assert A == [1, -1.5, 0.7] and C == [1, 0.5]
+    assert CRLB.shape == (3, 3) and allclose(CRLB, crlbarma_dense(A, C))
+    assert allclose(crlbarma([1, 0.4], [1, -0.3, 0.2]), crlbarma_dense([1, 0.4], [1, -0.3, 0.2]))
+    # Batch of models
+    As = array([A, [1, -0.2, 0.3], [1, 0.9, 0.5]])
+    Cs = array([C, [1, -0.6], [1, 0.1]])
+    CRLBs = crlbarma(As, Cs)
+    assert CRLBs.shape == (3, 3, 3)
+    assert allclose(CRLBs, stack([crlbarma_dense(a, c) for a, c in zip(As, Cs)]))
@@ -0,0 +1,47 @@
+"""
+    Testing modules for comcrit.py using pytest
+"""
+import pytest
+from numpy import allclose
+from numpy.random import randn, seed
+from scipy.signal import lfilter
+from pysid.identification.comcrit import aicarx, orderarmax, orderbj, orderoe
+from pysid.identification.pemethod import armax
+
+# ----------------- Fixtures -----------------
+@pytest.fixture
+def test_signals():
+    seed(8)
+    N = 3000
+    u = randn(N, 1)
+    e = 0.1*randn(N, 1)
+    x = lfilter([0, 0.5, 0.3], [1, -1.2, 0.5], u, axis=0)
+    return u, x, e
+
+# ----------------- Tests -----------------
+def test_orderarmax(test_signals):
+    u, x, e = test_signals
+    y = x + lfilter([1, 0.4], [1, -1.2, 0.5], e, axis=0)
+    m = orderarmax(4, 3, 3, 1, u, y, 'bic')
+    assert min(m.search, key=m.search.get) == (2, 1, 1)
+    assert m.Jbic == m.search[2, 1, 1]
+    # Same minimum as the cold start of the selected orders
+    assert allclose(m.parameters, armax(2, 1, 1, 1, u, y).parameters, atol=1e-4)
+    # The branches that stop improving are pruned
+    assert len(orderarmax(4, 3, 3, 1, u, y, 'bic', patience=0).search) < 4*4*3
+
+def test_orderoe_bj(test_signals):
+    u, x, e = test_signals
+    m = orderoe(3, 3, 1, u, x + e, 'bic')
+    assert min(m.search, key=m.search.get) == (1, 2)
+    y = x + lfilter([1, 0.4], [1, -0.6], e, axis=0)
+    m = orderbj(2, 2, 2, 3, 1, u, y, 'bic')
+    assert min(m.search, key=m.search.get) == (1, 1, 1, 2)
+    with pytest.raises(ValueError):
+        orderoe(3, 3, 1, u, y, 'bad')
+
+def test_aicarx_criteria(test_signals):
+    u, x, e = test_signals
+    m = aicarx(3, 2, 1, u, x + 0.01*e, 'fpe')
+    assert m.Jfpe > 0
+    assert aicarx(3, 2, 1, u, x + 0.01*e, 'bic').Jbic < 0
@@ -0,0 +1,90 @@
+"""
+    Testing modules for the pysid.io package using pytest
+"""
+import pytest
+from numpy import arange, allclose, array_equal, concatenate, float32
+from scipy.linalg import toeplitz
+from pysid.io.iddata import iddata, lagview
+from pysid.io.csv_data import save_data, load_data, load_chunks, csvwriter
+from pysid.io.bin_data import csv_to_bin, load_bin, save_bin
+from pysid.identification.pemethod import arx
+
+# ----------------- iddata -----------------
+def test_lagview():
+    x = arange(20.)
+    L, n, d = 6, 3, 2
+    phi = lagview(x, L, n, d)
+    assert array_equal(phi, toeplitz(x[L-d:20-d], x[L-d-n+1:L-d+1][::-1]))
+    # It is a view, not a copy
+    assert phi.base is not None and not phi.flags.writeable
+    with pytest.raises(ValueError):
+        lagview(x, 2, 4, 0)
+
+def test_iddata_no_copy(test_signals_siso):
+    u, y = test_signals_siso
+    data = iddata(u, y)
+    assert data.u is u or data.u.base is u
+    assert data.u.flags.c_contiguous and data.y.flags.c_contiguous
+    assert (data.N, data.nu, data.ny) == (500, 1, 1)
+    # Single precision buffers
+    data32 = iddata(u, y, dtype=float32)
+    assert data32.dtype == float32
+    with pytest.raises(Exception):
+        iddata(u, y[1:])
+
+def test_iddata_estimators(test_signals_siso):
+    u, y = test_signals_siso
+    data = iddata(u, y)
+    m1 = arx(2, 1, 1, u, y)
+    m2 = arx(2, 1, 1, data)
+    assert allclose(m1.parameters, m2.parameters)
+    assert allclose(m1.P, m2.P)
+
+# ----------------- Chunked csv -----------------
+def test_csv_chunks(test_signals_siso, tmp_path):
+    u, y = test_signals_siso
+    data = concatenate((u, y), axis=1)
+    filename = str(tmp_path / 'data.csv')
+    with csvwriter(filename, bufsize=128) as w:
+        for k in range(0, 500, 100):
+            w.write(data[k:k+100])
+    assert allclose(load_data(filename), data)
+    blocks = list(load_chunks(filename, 1, chunksize=128))
+    assert [b.N for b in blocks] == [128, 128, 128, 116]
+    u2, y2 = blocks[1]
+    assert allclose(u2, u[128:256]) and allclose(y2, y[128:256])
+    # Column selection and single precision
+    b = next(load_chunks(filename, 0, chunksize=10, usecols=[1], dtype=float32))
+    assert b.nu == 0 and b.dtype == float32 and allclose(b.y, y[0:10])
+    # Blank and comment lines inside the data are skipped, like in load_data
+    with open(filename, 'w') as f:
+        f.write('u,y\n1,2\n3,4\n\n\n5,6\n# comment\n7,8\n\n9,10\n')
+    blocks = list(load_chunks(filename, 1, chunksize=2))
+    assert [b.N for b in blocks] == [2, 2, 1]
+    u2 = concatenate([b.u for b in blocks])
+    assert array_equal(u2, load_data(filename)[:, 0:1])
+
+# ----------------- Binary datasets -----------------
+def test_csv_to_bin(test_signals_siso, tmp_path):
+    u, y = test_signals_siso
+    data = concatenate((u, y, 2*y), axis=1)
+    save_data(data, str(tmp_path / 'data.csv'), hdr='u, y1, y2')
+    b = csv_to_bin(str(tmp_path / 'data.csv'), str(tmp_path / 'data.bin'), 1, ts=0.5, chunksize=64)
+    assert (b.N, b.nu, b.ny, b.ts) == (500, 1, 2, 0.5)
+    assert b.names == ['u', 'y1', 'y2']
+    d = b.getdata(outputs=['y2'], start=100, stop=200)
+    assert allclose(d.u, u[100:200]) and allclose(d.y, 2*y[100:200])
+    # Single channels are memory-mapped views
+    assert d.y.base is not None
+
+def test_save_bin(test_signals_siso, tmp_path):
+    u, y = test_signals_siso
+    save_bin(iddata(u, y, ts=0.1), str(tmp_path / 'data.bin'))
+    d = load_bin(str(tmp_path / 'data.bin')).getdata()
+    assert allclose(d.u, u) and allclose(d.y, y) and d.ts == 0.1
+    # A single channel (1-D array) is one column
+    save_bin(y[:, 0], str(tmp_path / 'y.bin'), nu=0)
+    d = load_bin(str(tmp_path / 'y.bin')).getdata()
+    assert d.u.shape == (len(y), 0) and allclose(d.y, y)
+    with pytest.raises(ValueError):
+        save_bin(y.reshape((-1, 1, 1)), str(tmp_path / 'y.bin'), nu=0)
@@ -0,0 +1,81 @@
+"""
+    Testing modules for ivmethod.py using pytest
+"""
+import pytest
+from numpy import allclose, array, zeros
+from numpy.random import rand, randn, seed
+from scipy.signal import lfilter
+from pysid.identification.ivmethod import iv, riv
+from pysid.identification.pemethod import arx
+
+# ----------------- Fixtures -----------------
+@pytest.fixture
+def test_signals_colored():
+    # A y = B u + C/D e, with colored noise (arx is biased)
+    seed(5)
+    N = 4000
+    u = -1 + 2*rand(N, 2)
+    y0 = zeros((N, 2))
+    y0[:, 0] = lfilter([0, 0.5, 0.2], [1, -1.2, 0.36], u[:, 0]) + lfilter([0, 0, 0.4], [1, -1.2, 0.36], u[:, 1])
+    y0[:, 1] = lfilter([0, 1.0], [1, -0.5], u[:, 1])
+    v = lfilter([1, 0.9], [1, -0.8], 0.3*randn(N, 2), axis=0)
+    return u, y0, y0 + v
+
+# ----------------- iv -----------------
+def test_iv_siso(test_signals_colored):
+    u, y0, y = test_signals_colored
+    m = iv(2, 1, 1, u[:, 0], y[:, 0], y0[:, 0] - lfilter([0, 0, 0.4], [1, -1.2, 0.36], u[:, 1]))
+    assert m.name == 'iv' and m.nparam == 4 and m.P.shape == (4, 4)
+    assert allclose(m.A[0, 0], [1, -1.2, 0.36], atol=0.05)
+    assert allclose(m.B[0, 0], [0, 0.5, 0.2], atol=0.05)
+    assert allclose(m.parameters, [m.A[0, 0][1], m.A[0, 0][2], m.B[0, 0][1], m.B[0, 0][2]])
+    # arx is biased by the colored noise
+    ma = arx(2, 1, 1, u[:, 0], y[:, 0])
+    assert abs(ma.A[0, 0][1] + 1.2) > abs(m.A[0, 0][1] + 1.2)
+
+def test_iv_mimo(test_signals_colored):
+    u, y0, y = test_signals_colored
+    na = [[2, 0], [0, 1]]
+    nb = [[1, 0], [0, 0]]
+    nk = [[1, 2], [1, 1]]
+    m = iv(na, nb, nk, u, y, y0)
+    assert m.A.shape == (2, 2) and m.B.shape == (2, 2)
+    assert allclose(m.A[0, 0], [1, -1.2, 0.36], atol=0.05) and allclose(m.A[1, 1], [1, -0.5], atol=0.05)
+    assert allclose(m.A[0, 1], [0]) and allclose(m.B[0, 1], [0, 0, 0.4], atol=0.05)
+    assert allclose(m.B[1, 1], [0, 1.0], atol=0.05)
+    # The rank check does not change the estimate
+    assert allclose(iv(na, nb, nk, u, y, y0, check=False).parameters, m.parameters)
+    with pytest.raises(ValueError):
+        iv(na, nb, nk, u, y, zeros((4000, 2)))
+    with pytest.raises(ValueError):
+        iv(na, nb, nk, u, y)
+
+# ----------------- riv -----------------
+def test_riv_miso():
+    # Output error model with a different denominator for each input
+    seed(7)
+    N = 3000
+    u = -1 + 2*rand(N, 2)
+    y = lfilter([0, 0.5, 0.3], [1, -1.5, 0.7], u[:, 0]) + lfilter([0, 0, 1.0], [1, -0.6], u[:, 1])
+    y += 0.1*randn(N)
+    m = riv([[1, 0]], [[2, 1]], [[1, 2]], u, y)
+    assert m.name == 'riv' and m.D is None and m.nparam == 6 and m.P.shape == (6, 6)
+    assert allclose(m.B[0, 0], [0, 0.5, 0.3], atol=0.02) and allclose(m.F[0, 0], [1, -1.5, 0.7], atol=0.02)
+    assert allclose(m.B[0, 1], [0, 0, 1.0], atol=0.02) and allclose(m.F[0, 1], [1, -0.6], atol=0.02)
+    # Parameters ordered as [b, f]
+    assert allclose(m.parameters, [m.B[0, 0][1], m.B[0, 0][2], m.B[0, 1][2], m.F[0, 0][1], m.F[0, 0][2], m.F[0, 1][1]])
+
+def test_riv_ar_noise():
+    # Box-Jenkins model with an AR(1) noise model
+    seed(3)
+    N = 4000
+    u = -1 + 2*rand(N, 1)
+    y0 = lfilter([0, 0.5, 0.2], [1, -1.2, 0.36], u[:, 0])
+    y = y0 + lfilter([1], [1, -0.8], 0.3*randn(N))
+    m = riv(1, 2, 1, u, y, nd=1)
+    assert m.D.shape == (1, 1) and m.nparam == 2 + 2 + 1 and m.P.shape == (5, 5)
+    assert allclose(m.F[0, 0], [1, -1.2, 0.36], atol=0.05) and allclose(m.B[0, 0], [0, 0.5, 0.2], atol=0.05)
+    assert allclose(m.D[0, 0], [1, -0.8], atol=0.05)
+    # The prefiltering with D reduces the variance of the estimates
+    m0 = riv(1, 2, 1, u, y)
+    assert m0.D is None and m.P[2, 2] < m0.P[2, 2]
@@ -0,0 +1,223 @@
+"""
+    Testing modules for models.py using pytest
+"""
+import pytest
+from numpy import allclose, array, array_equal, diag, empty, exp, ndindex, ones, pi, polyval,\
+    stack, vstack, zeros
+from numpy.linalg import solve
+from numpy.random import randn
+from scipy.signal import lfilter
+from pysid.identification.pemethod import arx, armax
+from pysid.identification.models import polymodel, ssmodel
+from pysid.identification.store import load_model, modelstore, save_store
+
+# ----------------- Fixtures -----------------
+def random_polys(shape, n, lead):
+    P = empty(shape, dtype=object)
+    for i in ndindex(shape):
+        P[i] = 0.2*randn(n)
+        P[i][0] = lead(i)
+    return P
+
+@pytest.fixture
+def test_model_mimo():
+    # Box-Jenkins like MIMO model with a non-diagonal A(q)
+    A = random_polys((2, 2), 3, lambda i: float(i[0] == i[1]))
+    B = random_polys((2, 2), 3, lambda i: 0.)
+    C = random_polys((2, 1), 2, lambda i: 1.)
+    D = random_polys((2, 1), 2, lambda i: 1.)
+    F = random_polys((2, 2), 2, lambda i: 1.)
+    return polymodel('pem', A, B, C, D, F, ones((2, 2)), 0, None, 2, 2, 1)
+
+def same_polys(m, c):
+    for P, Q in zip(m, c):
+        if (P is None) != (Q is None):
+            return False
+        if P is not None and (P.shape != Q.shape or
+                              not all(array_equal(p, q) for p, q in zip(P.flat, Q.flat))):
+            return False
+    return True
+
+def simulate_loop(m, u, e):
+    # Reference simulation, solving A(q) y(t) = B/F u(t) + C/D e(t) sample by sample
+    N = u.shape[0]
+    w = zeros((N, m.ny))
+    for i in range(m.ny):
+        for j in range(m.nu):
+            w[:, i] += lfilter(m.B[i, j], m.F[i, j], u[:, j])
+        w[:, i] += lfilter(m.C[i, 0], m.D[i, 0], e[:, i])
+    y = zeros((N, m.ny))
+    for t in range(N):
+        y[t] = w[t]
+        for l in range(1, min(t, 2) + 1):
+            y[t] -= [sum(m.A[i, j][l]*y[t-l, j] for j in range(m.ny)) for i in range(m.ny)]
+    return y
+
+# ----------------- compactmodel -----------------
+def test_compact_model(test_signals_siso):
+    u, y = test_signals_siso
+    m = armax(2, 1, 1, 1, u, y)
+    m.setaicn()
+    c = m.compact()
+    assert not hasattr(c, '__dict__') and c.data is None
+    assert c.N == m.N == 500
+    # Same polynomials, stored as views of the flat coefficient vector
+    for P, Q in zip(m, c):
+        assert (P is None) == (Q is None)
+        if P is not None:
+            assert P.shape == Q.shape
+            assert all(array_equal(p, q) for p, q in zip(P.flat, Q.flat))
+            assert all(q.base is c.coef for q in Q.flat)
+    assert c.coef.size == 3 + 3 + 2
+    # The information criteria do not need the data
+    c.setaicn()
+    assert c.Jaicn == m.Jaicn
+    assert m.compact(keepdata=True).data is m.data
+
+def test_compact_model_mimo(test_signals_siso):
+    u, y = test_signals_siso
+    u = u.repeat(2, axis=1) + 0.1*randn(500, 2)
+    y = y.repeat(2, axis=1) + 0.1*randn(500, 2)
+    m = arx([[2, 1], [1, 2]], [[1, 0], [0, 1]], [[1, 1], [1, 1]], u, y).compact()
+    assert m.A.shape == (2, 2) and m.B.shape == (2, 2) and m.C is None
+    assert m.A[1, 1].size == 3 and m.B[0, 1].size == 2
+    with pytest.raises(AttributeError):
+        m.residuals = None
+
+# ----------------- simulate and predict -----------------
+def test_simulate_siso(test_signals_siso):
+    u, y = test_signals_siso
+    m = arx(2, 1, 1, u, y)
+    ys = m.simulate(u)
+    assert ys.shape == (500, 1)
+    assert allclose(ys[:, 0], lfilter(m.B[0, 0], m.A[0, 0], u[:, 0]))
+    # Compact models simulate the same way
+    assert allclose(m.compact().simulate(u), ys)
+
+def test_simulate_mimo(test_model_mimo):
+    m = test_model_mimo
+    u, e = randn(200, 2), randn(200, 2)
+    y = simulate_loop(m, u, e)
+    assert allclose(m.simulate(u, e), y)
+    # Carried over state
+    zi = m.initstate()
+    y1, zi = m.simulate(u[0:80], e[0:80], zi)
+    y2, zi = m.simulate(u[80:], e[80:], zi)
+    assert allclose(vstack((y1, y2)), y)
+    # Batch of trajectories
+    yb = m.simulate(stack((u, -u, 2*u), axis=2), stack((e, -e, 0*e), axis=2))
+    assert yb.shape == (200, 2, 3)
+    assert allclose(yb[:, :, 1], -y) and allclose(yb[:, :, 2], m.simulate(2*u))
+
+def test_predict_mimo(test_model_mimo):
+    m = test_model_mimo
+    u, e = randn(200, 2), randn(200, 2)
+    y = m.simulate(u, e)
+    # The one step ahead prediction error is the innovation
+    assert allclose(y - m.predict(u, y), e)
+    # k-step ahead: the error is the sum of the last k innovations through H
+    k = 3
+    h = m.filters().markov(k)
+    assert allclose(h[0], [[1, 0], [0, 1]])
+    err = zeros((200, 2))
+    for l in range(k):
+        err[l:] += e[0:200-l] @ h[l].T
+    yp = m.predict(u, y, k)
+    assert allclose(y - yp, err)
+    zi = m.initstate(k)
+    p1, zi = m.predict(u[0:50], y[0:50], k, zi)
+    p2, zi = m.predict(u[50:], y[50:], k, zi)
+    assert allclose(vstack((p1, p2)), yp)
+
+def test_predictor(test_model_mimo):
+    m = test_model_mimo
+    u, e = randn(200, 2), randn(200, 2)
+    y = m.simulate(u, e)
+    for k in (1, 4):
+        p = m.predictor(k)
+        yp = m.predict(u, y, k)
+        # Sample by sample, the forecast does not use the current output
+        for t in range(100):
+            assert allclose(p.forecast(u[t]), yp[t])
+            p.update(y[t])
+        # Small blocks
+        assert allclose(p(u[100:150], y[100:150]), yp[100:150])
+        p.reset()
+        assert allclose(p(u, y), yp)
+
+def test_ssmodel():
+    A = array([[0.5, 0.2, 0.], [-0.3, 0.6, 0.1], [0., 0.2, -0.4]])
+    B = randn(3, 2)
+    C = randn(2, 3)
+    D = randn(2, 2)
+    K = 0.1*randn(3, 2)
+    m = ssmodel(A, B, C, D, K)
+    u, e = randn(300, 2), randn(300, 2)
+    # Reference loop
+    y = zeros((300, 2))
+    x = zeros(3)
+    for t in range(300):
+        y[t] = C @ x + D @ u[t] + e[t]
+        x = A @ x + B @ u[t] + K @ e[t]
+    assert allclose(m.simulate(u, e), y)
+    # The one step ahead prediction error is the innovation
+    assert allclose(y - m.predict(u, y), e)
+    zi = m.initstate()
+    y1, zi = m.simulate(u[0:100], e[0:100], zi)
+    y2, zi = m.simulate(u[100:], e[100:], zi)
+    assert allclose(vstack((y1, y2)), y) and allclose(zi[:, 0], x)
+    yb = m.simulate(stack((u, 2*u), axis=2))
+    assert yb.shape == (300, 2, 2) and allclose(yb[:, :, 1], 2*yb[:, :, 0])
+    # Time series
+    ts = ssmodel(A, None, C, K=K)
+    assert ts.nu == 0 and allclose(y - ts.predict(None, ts.simulate(None, e)) - m.simulate(u), e)
+
+# ----------------- Frequency response -----------------
+def test_freqresp(test_model_mimo):
+    m = test_model_mimo
+    w, G, H = m.freqresp(nw=128)
+    assert w.shape == (128,) and G.shape == (128, 2, 2) and H.shape == (128, 2, 2)
+    assert allclose(w[1], pi/128)
+    # Entry by entry evaluation at a few frequencies
+    val = lambda p, wi: polyval(p[::-1], exp(-1j*wi))
+    for i in (0, 17, 127):
+        Aw = array([[val(m.A[r, c], w[i]) for c in range(2)] for r in range(2)])
+        BFw = array([[val(m.B[r, c], w[i])/val(m.F[r, c], w[i]) for c in range(2)] for r in range(2)])
+        CDw = diag([val(m.C[r, 0], w[i])/val(m.D[r, 0], w[i]) for r in range(2)])
+        assert allclose(G[i], solve(Aw, BFw)) and allclose(H[i], solve(Aw, CDw))
+    # Arbitrary grids give the same values
+    w2, G2, H2 = m.freqresp(w[0:20])
+    assert allclose(G2, G[0:20]) and allclose(H2, H[0:20])
+    _, mag, phase = m.bode(nw=128)
+    assert allclose(mag*exp(1j*phase), G)
+
+# ----------------- Serialization -----------------
+def test_save_model(test_signals_siso, tmp_path):
+    u, y = test_signals_siso
+    m = armax(2, 1, 1, 1, u, y)
+    m.setaicn()
+    m.save(str(tmp_path / 'model.npz'))
+    c = load_model(str(tmp_path / 'model.npz'))
+    assert same_polys(m, c) and c.data is None
+    assert c.nu == 1 and c.ny == 1 and c.N == 500 and c.nparam == m.nparam
+    assert array_equal(c.delay, m.delay) and allclose(c.P, m.P) and c.Jaicn == m.Jaicn
+    assert allclose(c.predict(u, y), m.predict(u, y))
+
+def test_model_store(test_signals_siso, test_model_mimo, tmp_path):
+    u, y = test_signals_siso
+    models = [arx(2, 1, 1, u, y), armax(2, 1, 1, 1, u, y), test_model_mimo]
+    save_store(models, str(tmp_path / 'models.pmd'), keys=['arx', 'armax', 'bj'])
+    s = modelstore(str(tmp_path / 'models.pmd'))
+    assert len(s) == 3 and 'armax' in s and s.index('bj') == 2
+    for m, c in zip(models, s):
+        assert same_polys(m, c) and c.name == m.name
+        assert (c.nu, c.ny, c.ts, c.N) == (m.nu, m.ny, m.ts, m.N)
+        assert array_equal(c.delay, m.delay)
+    # The coefficients are views of the mapped file
+    assert not s['bj'].coef.flags.writeable
+    u2 = randn(100, 2)
+    assert allclose(s[-1].simulate(u2), test_model_mimo.simulate(u2))
+    with pytest.raises(KeyError):
+        s['oe']
+    with pytest.raises(ValueError):
+        save_store(models, str(tmp_path / 'models.pmd'), keys=['a', 'a', 'b'])
@@ -0,0 +1,70 @@
+"""
+    Testing modules for montecarlo.py using pytest
+"""
+import pytest
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from numpy import allclose, diag, sqrt
+from numpy.random import randn, seed
+from scipy.signal import lfilter
+from pysid.identification.montecarlo import montecarlo
+from pysid.identification.pemethod import arx, fir, oe
+
+# ----------------- Fixtures -----------------
+@pytest.fixture
+def test_data():
+    # Second order system with white output noise
+    seed(3)
+    N = 2000
+    u = randn(N, 1)
+    x = lfilter([0, 0.5, 0.3], [1, -1.2, 0.5], u, axis=0)
+    return u, x, 0.1*randn(N, 1)
+
+# ----------------- Tests -----------------
+@pytest.mark.parametrize("method", ['bootstrap', 'simulate'])
+def test_montecarlo(test_data, method):
+    u, x, e = test_data
+    m = arx(2, 1, 1, u, x + lfilter([1], [1, -1.2, 0.5], e, axis=0))
+    r = montecarlo(m, replicates=200, method=method)
+    assert r.theta.shape == (200, 4)
+    # The empirical spread agrees with the asymptotic covariance
+    assert allclose(r.std, sqrt(diag(m.P)), rtol=0.25)
+    assert allclose(r.mean, m.parameters, atol=3*max(r.std)/sqrt(200))
+    lo, hi = r.interval(0.95).T
+    assert all(lo < m.parameters) and all(m.parameters < hi)
+    # The replicates only depend on the seed
+    assert allclose(montecarlo(m, replicates=5, method=method).theta, r.theta[0:5])
+
+
+def test_montecarlo_workers(test_data):
+    u, x, e = test_data
+    m = oe(1, 2, 1, u, x + e)
+    r = montecarlo(m, replicates=12)
+    assert allclose(montecarlo(m, replicates=12, workers=2, batch=5).theta, r.theta)
+    with ProcessPoolExecutor(2) as pool:
+        assert allclose(montecarlo(m, u, x + e, replicates=12, workers=pool).theta, r.theta)
+
+
+def test_montecarlo_errors(test_data):
+    u, x, e = test_data
+    m = fir(4, 1, u, x + e)
+    assert m.parameters.size == 5 and m.data[1].shape == (2000, 1)
+    with pytest.raises(ValueError):
+        montecarlo(m, method='jackknife')
+    for replicates in (0, 1):
+        with pytest.raises(ValueError):
+            montecarlo(m, replicates=replicates)
+        with pytest.raises(ValueError):
+            montecarlo(m, replicates=replicates, workers=2)
+    with pytest.raises(ValueError):
+        montecarlo(m.compact(), replicates=2)
+    m.name = 'pem'
+    with pytest.raises(ValueError):
+        montecarlo(m, replicates=2)
+
+
+def test_montecarlo_import():
+    # The process pool and shared memory are only imported when used
+    code = "import sys, pysid; assert 'multiprocessing' not in sys.modules"
+    subprocess.run([sys.executable, '-c', code], check=True)
@@ -3,12 +3,18 @@
     Testing modules for pemethod.py using pytest
 """
 import pytest
+from threading import Event, Thread
 from numpy import array, ndarray, convolve, cos, sin, concatenate, zeros, dot, \
-    sqrt, pi, roots, abs, ones, amax, dot, append, reshape
-from numpy.random import rand, randn, randint
+    sqrt, pi, roots, abs, ones, amax, dot, append, reshape, arange
+from numpy.random import rand, randn, randint, seed
 from numpy.linalg import inv, cond
 from scipy.signal import lfilter
-from pysid.identification.pemethod import arx, armax, bj, oe
+from numpy import allclose, array_equal, empty, float32, ndindex
+from pysid.identification import pemethod
+from pysid.identification.pemethod import arx, armax, bj, fir, oe, pem
+from pysid.identification.models import polymodel
+from pysid.identification.structure import polystruct
+from pysid.identification.trace import trace
 from pysid.identification.recursive import rls
 from pysid.io.print import print_model
 from scipy.stats import chi2
@@ -976,6 +982,256 @@ def test_data_type(test_signals_arx_siso):
     # Checks the consistency of y(t)
     assert isinstance(y, ndarray) or isinstance(y, list)
 
+# -----------------Pem-----------------
+
+def obj_polys(polys, shape):
+    P = empty(shape, dtype=object)
+    for k, i in enumerate(ndindex(shape)):
+        P[i] = array(polys[k], dtype=float)
+    return P
+
+def test_polystruct():
+    A = [1, -0.5]
+    B = [[0, 0, 0.5, 0.1], [0, 0.3]]
+    F = [[1, -0.6], [1]]
+    mu = [[0, 1], [[0, 0, 1, 0], [0, 0]], [0], [0, 0], [[0, 0], [0]]]
+    s = polystruct(A, B, [1], [1, -0.7], F, 1, 2, mu)
+    # Delays from the leading zeros of B, known coefficients are not free
+    assert array_equal(s.nk, [[2, 1]])
+    assert s.nparam == 4 and s.rows == [slice(0, 4)]
+    assert allclose(s.theta, [0.1, 0.3, -0.7, -0.6])
+    # The polynomials are views of one buffer
+    s.scatter(array([1, 2, 3, 4]))
+    assert allclose(s.B[0, 0], [0, 0, 0.5, 1]) and allclose(s.D[0, 0], [1, 3])
+    assert allclose(s.A[0, 0], [1, -0.5]) and allclose(s.F[0, 0], [1, 4])
+    # Copies have their own buffer, polynomials are written in place
+    c = s.copy()
+    c.setpolys(D=[1, 0.2], F=[[1, 0.3], [1]])
+    assert allclose(c.theta, [1, 2, 0.2, 0.3]) and allclose(s.theta, [1, 2, 3, 4])
+    assert c.D[0, 0].base is c.coef
+    with pytest.raises(ValueError):
+        polystruct(A, B, [1], [1], [1, -0.6], 1, 2)
+    with pytest.raises(ValueError):
+        c.setpolys(D=[1, 0.2, 0.1])
+
+def test_polystruct_jacobian():
+    seed(13)
+    A = obj_polys([[1, 0.3, -0.1], [0, 0.2], [0, 0.1, 0.05], [1, -0.4]], (2, 2))
+    B = obj_polys([[0, 0.5, 0.2], [0, 0, 1.0], [0, 0.8], [0, 0.3, -0.2]], (2, 2))
+    C = obj_polys([[1, 0.4], [1, -0.3, 0.1]], (2, 1))
+    D = obj_polys([[1, -0.8], [1, 0.5]], (2, 1))
+    F = obj_polys([[1, -0.7], [1, 0.2], [1, 0.1, 0.1], [1, -0.4]], (2, 2))
+    s = polystruct(A, B, C, D, F, 2, 2)
+    u, y = randn(2, 200), randn(2, 200)
+    theta = s.theta
+    # Finite differences
+    for i in range(2):
+        t = theta[s.rows[i]]
+        e = s.residuals(t, i, u, y)
+        J = zeros((200, t.size))
+        for k in range(t.size):
+            dt = t.copy()
+            dt[k] += 1e-7
+            J[:, k] = (s.residuals(dt, i, u, y) - e)/1e-7
+        assert allclose(s.jacobian(t, i, u, y), J, atol=1e-5)
+    # Stacked residuals and block diagonal Jacobian
+    e = s.stacked(theta, u, y)
+    assert e.shape == (400,) and allclose(e[200:], s.residuals(theta[s.rows[1]], 1, u, y))
+    J = s.stacked_jacobian(theta, u, y)
+    x = randn(s.nparam)
+    assert allclose(J.matvec(x)[0:200], s.jacobian(theta[s.rows[0]], 0, u, y) @ x[s.rows[0]])
+    assert allclose(J.rmatvec(e)[s.rows[1]], s.jacobian(theta[s.rows[1]], 1, u, y).T @ e[200:])
+
+def test_pem_siso():
+    seed(11)
+    N = 2000
+    Ao, Bo, Co, Do, Fo = [1, -0.5], [0, 0.5, 0.1], [1, 0.3], [1, -0.7], [1, -0.6]
+    u = -1 + 2*rand(N, 1)
+    e = 0.05*randn(N, 1)
+    # Box-Jenkins structure (A = 1)
+    y = lfilter(Bo, Fo, u, axis=0) + lfilter(Co, Do, e, axis=0)
+    A, B, C, D, F = pem([1], [0, 0.4, 0.2], [1, 0.2], [1, -0.6], [1, -0.5], u, y)
+    assert array_equal(A, [1])
+    for P, Po in zip((B, C, D, F), (Bo, Co, Do, Fo)):
+        assert allclose(P, Po, atol=0.05)
+    # Known a1
+    y = lfilter(Bo, convolve(Ao, Fo), u, axis=0) + lfilter(Co, convolve(Ao, Do), e, axis=0)
+    mu = [[0, 1], [0, 0, 0], [0, 0], [0, 0], [0, 0]]
+    A, B, C, D, F = pem([1, -0.5], [0, 0.4, 0.2], [1, 0.2], [1, -0.6], [1, -0.5], u, y, mu)
+    assert array_equal(A, Ao)
+    for P, Po in zip((B, C, D, F), (Bo, Co, Do, Fo)):
+        assert allclose(P, Po, atol=0.05)
+
+def test_pem_mimo():
+    seed(12)
+    A = obj_polys([[1, -0.5], [0, 0.2], [0, -0.1], [1, -0.6]], (2, 2))
+    B = obj_polys([[0, 0.5, 0.2], [0, 0, 1.0], [0, 0.8], [0, 0.3, -0.2]], (2, 2))
+    C = obj_polys([[1, 0.4], [1, -0.3]], (2, 1))
+    D = obj_polys([[1, -0.8], [1, 0.5]], (2, 1))
+    F = obj_polys([[1, -0.7], [1], [1], [1, -0.4]], (2, 2))
+    m = polymodel('pem', A, B, C, D, F, ones((2, 2)), 0, None, 2, 2, 1)
+    N = 3000
+    u = -1 + 2*rand(N, 2)
+    y = m.simulate(u, 0.1*randn(N, 2))
+    guess = [obj_polys([p + 0.05*(p != 0)*(arange(p.size) > 0) for p in X.flat], X.shape)
+             for X in (A, B, C, D, F)]
+    Ah, Bh, Ch, Dh, Fh = pem(*guess, u, y)
+    assert Ah.shape == (2, 2) and Bh.shape == (2, 2) and Ch.shape == (2, 1) and Fh.shape == (2, 2)
+    for X, Xh in zip((A, B, C, D, F), (Ah, Bh, Ch, Dh, Fh)):
+        for p, ph in zip(X.flat, Xh.flat):
+            assert allclose(p, ph, atol=0.06)
+    # One joint problem for both outputs reaches the same minimum
+    joint = pem(*guess, u, y, joint=True)
+    for X, Xh in zip(joint, (Ah, Bh, Ch, Dh, Fh)):
+        for p, ph in zip(X.flat, Xh.flat):
+            assert allclose(p, ph, atol=1e-4)
+
+@pytest.fixture
+def test_signals_mimo():
+    # Two inputs and two outputs, first order paths with ARMA noise:
+    #   y_i(t) = sum_j (0.5 q^-1 + 0.2 j q^-2)/(1 - (0.6 + 0.1 i) q^-1) u_j(t)
+    #            + (1 + 0.3 q^-1)/(1 - 0.7 q^-1) e_i(t)
+    # and the orders of the paths (one) and of the noise polynomials (n)
+    seed(16)
+    N = 3000
+    u = -1 + 2*rand(N, 2)
+    y = zeros((N, 2))
+    for i in range(2):
+        for j in range(2):
+            y[:, i] += lfilter([0, 0.5, 0.2*j], [1, -0.6 - 0.1*i], u[:, j])
+        y[:, i] += lfilter([1, 0.3], [1, -0.7], 0.1*randn(N))
+    one = ones((2, 2), dtype=int)
+    n = ones((2, 1), dtype=int)
+    return [u, y, one, n]
+
+def test_oe_workers(test_signals_mimo):
+    u, y, one, n = test_signals_mimo
+    m = oe(one, one, one, u, y)
+    # The outputs solved by a pool of threads give the same model
+    mp = oe(one, one, one, u, y, workers=2)
+    for X, Xp in zip((m.B, m.F), (mp.B, mp.F)):
+        for p, pp in zip(X.flat, Xp.flat):
+            assert array_equal(p, pp)
+    assert allclose(m.F[1, 1], [1, -0.7], atol=0.05)
+
+def test_warm_start(test_signals_mimo):
+    u, y, one, n = test_signals_mimo
+    # Refits on a sliding window from the previous model reach the same minimum
+    for fit, orders in ((oe, (one, one, one)), (bj, (one, n, n, one, one)),
+                        (armax, ([[1, 0], [0, 1]], one, n, one))):
+        m = fit(*orders, u[0:2500], y[0:2500])
+        cold = fit(*orders, u[500:], y[500:])
+        for init in (m, m.parameters, m.compact()):
+            warm = fit(*orders, u[500:], y[500:], init=init)
+            assert allclose(warm.parameters, cold.parameters, atol=1e-4)
+    with pytest.raises(ValueError):
+        oe(one, 2*one, one, u, y, init=m)
+    with pytest.raises(ValueError):
+        oe(one, one, one, u, y, init=zeros(5))
+
+def test_float32(test_signals_mimo):
+    u, y, one, n = test_signals_mimo
+    # float32 regressors: the parameter error is far below their standard deviation
+    for fit, orders in ((arx, ([[2, 0], [0, 2]], one, one)), (fir, (3*one, one))):
+        m = fit(*orders, u, y)
+        m32 = fit(*orders, u, y, dtype=float32)
+        sd = sqrt(m.P.diagonal())
+        assert allclose(m32.parameters, m.parameters, rtol=0, atol=1e-4*sd.min())
+        assert allclose(m32.P, m.P, rtol=0, atol=1e-6*abs(m.P).max())
+        assert allclose(m32.ecov, m.ecov, rtol=1e-6)
+    # float32 gradient of oe and bj: only the covariance of the parameters
+    # is computed in float32
+    for fit, orders in ((oe, (one, one, one)), (bj, (one, n, n, one, one))):
+        m = fit(*orders, u, y)
+        m32 = fit(*orders, u, y, dtype=float32)
+        assert allclose(m32.P, m.P, rtol=0, atol=1e-6*abs(m.P).max())
+        assert allclose(m32.ecov, m.ecov, rtol=1e-6)
+
+def resonance(r, w):
+    return array([1, -2*r*cos(w), r**2])
+
+def test_pem_multistart():
+    # Second order output error fit of a system with two resonances: the
+    # guess close to the second resonance converges to a local minimum
+    seed(14)
+    N = 1000
+    u = randn(N)
+    y = lfilter([0, 1, 0.5], resonance(0.95, 0.5), u) + lfilter([0, 1, -0.5], resonance(0.95, 2.2), u)
+    y += 0.1*randn(N)
+    B0, F0 = array([0, 0.1, 0.1]), resonance(0.8, 2.2)
+    cost = lambda B, F: sum((y - lfilter(B, F, u))**2)
+    _, B, _, _, F = pem([1], B0, [1], [1], F0, u, y)
+    _, Bm, _, _, Fm = pem([1], B0, [1], [1], F0, u, y, starts=8)
+    assert cost(Bm, Fm) < 0.5*cost(B, F)
+    assert allclose(Fm, resonance(0.95, 0.5), atol=0.1)
+    # Deterministic, whatever the number of workers
+    _, Bw, _, _, Fw = pem([1], B0, [1], [1], F0, u, y, starts=8, workers=3)
+    assert array_equal(Bw, Bm) and array_equal(Fw, Fm)
+    with pytest.raises(ValueError):
+        pem([1], B0, [1], [1], F0, u, y, starts=8, joint=True)
+    # Candidates of oe: least squares, SRIV, ARX reduction and perturbations
+    m = oe(1, 2, 1, u.reshape((-1, 1)), y.reshape((-1, 1)), starts=6)
+    assert m.costfunction <= oe(1, 2, 1, u.reshape((-1, 1)), y.reshape((-1, 1))).costfunction + 1e-8
+
+def test_multistart_guesses(test_signals_mimo, monkeypatch):
+    # With starts=2 the ARX reduction (third candidate) is not computed
+    u, y, one, n = test_signals_mimo
+    m = oe(one, one, one, u, y, starts=2)
+    mb = bj(one, n, n, one, one, u, y, starts=2)
+    def reduced(*args):
+        raise AssertionError('_reduced is not used with starts=2')
+    monkeypatch.setattr(pemethod, '_reduced', reduced)
+    assert allclose(oe(one, one, one, u, y, starts=2).parameters, m.parameters)
+    assert allclose(bj(one, n, n, one, one, u, y, starts=2).parameters, mb.parameters)
+    with pytest.raises(AssertionError):
+        oe(one, one, one, u, y, starts=3)
+
+def test_trace(test_signals_mimo):
+    u, y, one, n = test_signals_mimo
+    events = []
+    t = trace(lambda event, info: events.append(event))
+    m = bj(one, n, n, one, one, u, y, trace=t)
+    assert m.trace is t
+    assert [s[0] for s in t.stages] == ['initialization', 'minimization', 'covariance']
+    assert [s['output'] for s in t.solves] == [0, 1]
+    assert sum(s['cost'] for s in t.solves) == m.costfunction
+    assert all(s['nfev'] > 0 for s in t.solves)
+    assert len(t.costs) >= sum(s['nfev'] for s in t.solves)
+    assert t.calls['lfilter'] > 0 and t.calls['qr'] > 0
+    assert set(events) == {'stage', 'cost', 'solve'}
+    # The trace is only active during the estimation
+    calls = dict(t.calls)
+    bj(one, n, n, one, one, u, y)
+    assert t.calls == calls
+    assert bj(one, n, n, one, one, u, y).trace is None
+    # Only the calls of the estimation and of its own worker threads are
+    # counted, not the ones of concurrent untraced estimations
+    calls = oe(one, one, one, u, y, trace=trace()).trace.calls
+    assert oe(one, one, one, u, y, workers=2, trace=trace()).trace.calls == calls
+    stop = Event()
+    def untraced():
+        while not stop.is_set():
+            oe(one, one, one, u, y)
+    thread = Thread(target=untraced)
+    thread.start()
+    try:
+        for _ in range(3):
+            assert oe(one, one, one, u, y, trace=trace()).trace.calls == calls
+    finally:
+        stop.set()
+        thread.join()
+    # Joint problem of pem, which returns the polynomials: the trace is only
+    # reachable through the caller's reference
+    t = trace()
+    out = pem(obj_polys([[1], [0], [0], [1]], (2, 2)), obj_polys([[0, 0.5]]*4, (2, 2)),
+              obj_polys([[1]]*2, (2, 1)), obj_polys([[1]]*2, (2, 1)),
+              obj_polys([[1, -0.5]]*4, (2, 2)), u, y, joint=True, trace=t)
+    assert isinstance(out, list) and not hasattr(out, 'trace')
+    assert [s[0] for s in t.stages] == ['initialization', 'minimization']
+    assert [s['output'] for s in t.solves] == [None]
+    assert t.costs[-1][0] is None
+    assert t.calls['lfilter'] > 0
+
 # #@pytest.mark.xfail
 # def test_arx(test_signals_arx_siso):
 #     # Signals
@@ -0,0 +1,63 @@
+"""
+    Testing modules for subspace.py using pytest
+"""
+import pytest
+from numpy import allclose, array, eye, ones, sort, var
+from numpy.linalg import eigvals
+from numpy.random import randn, seed
+from pysid.identification.models import polymodel, ssmodel
+from pysid.identification.pemethod import pem
+from pysid.identification.subspace import n4sid
+
+# ----------------- Fixtures -----------------
+@pytest.fixture
+def test_system():
+    # Third order innovations model with 2 inputs and 2 outputs
+    seed(5)
+    A = array([[0.8, 0.2, 0], [-0.2, 0.8, 0], [0, 0, 0.5]])
+    B = array([[1, 0], [0, 1], [1, 1.]])
+    C = array([[1, 0, 1], [0, 1, 0.5]])
+    K = array([[0.3, 0], [0, 0.2], [0.1, 0.1]])
+    m = ssmodel(A, B, C, K=K)
+    N = 5000
+    u = randn(N, 2)
+    y = m.simulate(u, 0.1*randn(N, 2))
+    return m, u, y
+
+# ----------------- Tests -----------------
+@pytest.mark.parametrize("weight", ['moesp', 'n4sid'])
+def test_n4sid(test_system, weight):
+    m0, u, y = test_system
+    m = n4sid(None, u, y, weight=weight)
+    # The order is found at the gap of the singular values
+    assert m.nx == 3
+    assert allclose(sort(abs(eigvals(m.A))), sort(abs(eigvals(m0.A))), atol=0.02)
+    # The innovations are the prediction errors, with variance 0.01
+    e = y - m.predict(u, y)
+    assert allclose(var(e[100:], axis=0), 0.01, rtol=0.1)
+    assert allclose(m.Re.diagonal(), 0.01, rtol=0.1)
+    # The factorization accumulated in chunks gives the same model
+    mc = n4sid(3, u, y, weight=weight, chunk=700)
+    assert allclose(mc.sv, m.sv)
+    assert allclose(mc.predict(u, y), m.predict(u, y))
+    with pytest.raises(ValueError):
+        n4sid(20, u, y, f=10)
+    with pytest.raises(ValueError):
+        n4sid(3, u[0:50], y[0:50])
+
+def test_n4sid_pem():
+    # SISO subspace estimate in the polynomial form, refined by pem
+    seed(6)
+    m0 = ssmodel([[0.9, 0.3], [-0.3, 0.9]], [[1], [0]], [[1, 0.5]], K=[[0.4], [0.1]])
+    N = 5000
+    u = randn(N, 1)
+    y = m0.simulate(u, 0.1*randn(N, 1))
+    m = n4sid(2, u, y)
+    P = m.polys()
+    pm = polymodel('pem', *P, ones((1, 1)), 0, None, 1, 1, 1)
+    assert allclose(pm.simulate(u), m.simulate(u))
+    assert allclose(pm.predict(u, y), m.predict(u, y))
+    A, B, C, D, F = pem(*P, u, y)
+    assert B[0] == 0
+    assert allclose(F, P[4][0, 0], atol=0.01)
+    assert allclose(B, P[1][0, 0], atol=0.05)